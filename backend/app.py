@@ -7,20 +7,43 @@ Main application entry point
 import os
 import sys
 from flask import Flask, jsonify
-from app import create_app, socketio
+from flask_jwt_extended import jwt_required
+from app import create_app, start_node, socketio, metrics, drain
+from app.users.routes import require_admin
 
 # Create Flask application
 app = create_app()
+start_node(app)
+
+# Move clients off this node before it stops
+drain.install_signal_handler(app)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (fails while draining so no new clients are routed here)"""
+    if drain.draining():
+        return jsonify(dict(drain.status(), status='draining', service='ptt-backend')), 503
     return jsonify({
         'status': 'healthy',
         'service': 'ptt-backend',
         'version': '1.0.0'
     }), 200
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Metrics in Prometheus text format"""
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+@app.route('/api/drain', methods=['POST'])
+@jwt_required()
+def drain_endpoint():
+    """Start draining this node (admin only)"""
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    drain.start(app, 'requested through /api/drain')
+    return jsonify(drain.status()), 202
+
 @app.route('/api', methods=['GET'])
 def api_info():
     """API information endpoint"""
@@ -31,6 +54,7 @@ def api_info():
             'auth': '/api/auth',
             'users': '/api/users',
             'channels': '/api/channels',
+            'activity': '/api/activity',
             'websocket': '/api/ws'
         }
     }), 200
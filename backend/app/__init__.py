@@ -4,15 +4,19 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from flask_socketio import SocketIO
-from flask_migrate import Migrate
-import redis
 from config import config
+from app.database import RoutingSession
+
+if os.environ.get('FAST_START', 'false').lower() == 'true':
+    # eventlet's green DNS imports all of dnspython; names are only
+    # resolved when DB and Redis connections are opened
+    os.environ.setdefault('EVENTLET_NO_GREENDNS', 'yes')
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
 socketio = SocketIO()
-migrate = Migrate()
+migrate = None
 redis_client = None
 
 def create_app(config_name=None):
@@ -22,10 +26,27 @@ def create_app(config_name=None):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # orjson-backed JSON for REST responses and Socket.IO packets
+    from app import serialization
+    app.json = serialization.JSONProvider(app)
+    serialization.configure(app)
+    
+    # Tune the engine before Flask-SQLAlchemy creates it
+    from app.database import build_engine_options, instrument_engine
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = build_engine_options(app.config)
+    if app.config.get('DATABASE_REPLICA_URL'):
+        app.config['SQLALCHEMY_BINDS'] = dict(app.config.get('SQLALCHEMY_BINDS') or {},
+                                              replica=app.config['DATABASE_REPLICA_URL'])
+    
     # Initialize extensions
     db.init_app(app)
     jwt.init_app(app)
-    migrate.init_app(app, db)
+    
+    # Alembic is slow to import and only needed by the `flask db` commands
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        from flask_migrate import Migrate
+        global migrate
+        migrate = Migrate(app, db)
     
     # Initialize CORS
     CORS(app, origins=app.config['CORS_ORIGINS'])
@@ -35,24 +56,24 @@ def create_app(config_name=None):
         app,
         cors_allowed_origins=app.config['SOCKETIO_CORS_ALLOWED_ORIGINS'],
         async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+        json=serialization,
         logger=True,
         engineio_logger=True
     )
     
     # Initialize Redis (optional for development)
-    global redis_client
-    try:
-        if app.config.get('REDIS_URL'):
-            redis_client = redis.from_url(app.config['REDIS_URL'])
-            # Test connection
-            redis_client.ping()
-            app.logger.info("Redis connected successfully")
-        else:
-            redis_client = None
-            app.logger.info("Redis disabled for development")
-    except Exception as e:
-        app.logger.warning(f"Redis connection failed: {e}. Running without Redis.")
-        redis_client = None
+    if not app.config.get('REDIS_URL'):
+        app.logger.info("Redis disabled for development")
+    elif app.config['FAST_START']:
+        # Serve straight away; Redis features switch on once it answers
+        socketio.start_background_task(connect_redis, app, True)
+    else:
+        connect_redis(app)
+    
+    if app.config.get('AUDIO_TRANSCODE'):
+        from app import codec
+        if not codec.available():
+            app.logger.warning("AUDIO_TRANSCODE is enabled but opuslib/libopus is missing. Relaying audio as is.")
     
     # Register blueprints
     from app.auth import bp as auth_bp
@@ -64,14 +85,82 @@ def create_app(config_name=None):
     from app.channels import bp as channels_bp
     app.register_blueprint(channels_bp, url_prefix='/api/channels')
     
+    from app.activity import bp as activity_bp
+    app.register_blueprint(activity_bp, url_prefix='/api/activity')
+    
+    # Register CLI commands
+    from app import cli
+    cli.register(app)
+    
     # Register WebSocket events
-    from app import websocket_events
+    from app import websocket_events, admin_events
+    
+    # Query counts and DB time per request and socket event
+    from app import querystats
+    querystats.install(app)
     
-    # Create database tables
+    # Create database tables (in fast-start mode `flask init-db` does this)
     with app.app_context():
-        db.create_all()
+        for engine in db.engines.values():
+            instrument_engine(engine)
+            querystats.instrument(engine, app)
+        if not app.config['FAST_START']:
+            # Only the primary; a replica is read-only and may be down
+            db.create_all(bind_key=None)
     
     return app
 
+def start_node(app):
+    """Start the background work of a serving node.
+
+    Called by the server entry points only, so `flask` CLI commands run
+    against a live deployment leave that node's presence, channel ring
+    and capture file alone.
+    """
+    app.extensions['ptt_node'] = True
+    
+    # Record incoming socket events for benchmarks/replay.py
+    if app.config['SOCKET_CAPTURE_PATH']:
+        from app import capture
+        capture.install(app)
+    
+    # Expire presence left by dead sockets and nodes
+    from app.presence import start_reaper
+    start_reaper(app)
+    
+    # Take part in the channel ownership ring when Redis is available (in
+    # fast-start mode connect_redis does this once Redis answers)
+    if redis_client is not None:
+        from app import sharding
+        sharding.start(app)
+
+def connect_redis(app, retry=False):
+    """Connect to Redis, optionally retrying in the background until it answers"""
+    import redis
+    global redis_client
+    
+    delay = 1
+    while True:
+        try:
+            client = redis.from_url(app.config['REDIS_URL'],
+                                    socket_connect_timeout=app.config['REDIS_CONNECT_TIMEOUT'])
+            client.ping()
+            redis_client = client
+            app.logger.info("Redis connected successfully")
+            break
+        except Exception as e:
+            if not retry:
+                app.logger.warning(f"Redis connection failed: {e}. Running without Redis.")
+                return
+            app.logger.warning(f"Redis connection failed: {e}. Retrying in {delay}s.")
+            socketio.sleep(delay)
+            delay = min(delay * 2, 30)
+    
+    if retry and app.extensions.get('ptt_node'):
+        # Serving already: advertise this node before peers next reap
+        from app import sharding, presence
+        presence.write_heartbeat(app)
+        sharding.start(app)
+
 def get_redis_client():
     return redis_client
@@ -0,0 +1,37 @@
+from flask import request, jsonify, Response, stream_with_context
+from flask_jwt_extended import jwt_required
+from app.activity import bp
+from app.database import read_replica
+from app.users.routes import require_admin
+from app import bulk
+
+@bp.route('/export', methods=['GET'])
+@jwt_required()
+@read_replica
+def export_activity():
+    """Stream activity logs as CSV or NDJSON (admin only)
+
+    Filters: channel_id, user_id, action (comma separated), since and until
+    (ISO timestamps, until exclusive). Pass gzip=1 for a compressed download.
+    """
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    try:
+        filters = bulk.activity_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid filter value'}), 400
+    
+    fmt = 'csv' if request.args.get('format') == 'csv' else 'ndjson'
+    filename = f'activity.{fmt}'
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    rows = bulk.serialize(bulk.export_activity(**filters), fmt, bulk.ACTIVITY_EXPORT_FIELDS)
+    
+    if request.args.get('gzip', '').lower() in ('1', 'true', 'yes'):
+        rows = bulk.gzip_stream(rows)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    return Response(stream_with_context(rows), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
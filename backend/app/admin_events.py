@@ -0,0 +1,117 @@
+"""Admin-only Socket.IO namespace pushing live dashboard stats.
+
+One snapshot is computed per ADMIN_STATS_INTERVAL and shared by every
+subscribed admin, so the cost stays flat as admin seats are added.
+"""
+import time
+from flask import current_app
+from flask_socketio import emit, join_room, disconnect
+from sqlalchemy import func
+from app import socketio, db, metrics, serialization
+from app.models import User, Channel, OnlineUser, ActivityLog
+from app.database import release_connection
+
+ADMIN_NAMESPACE = '/admin'
+STATS_ROOM = 'stats'
+
+# Subscribed admin sockets and the broadcaster state
+admin_subscribers = set()
+stats_state = {'running': False, 'snapshot': None}
+
+@socketio.on('connect', namespace=ADMIN_NAMESPACE)
+def handle_admin_connect(auth):
+    """Handle admin dashboard connection"""
+    try:
+        from flask import request
+        from app.websocket_events import authenticate_socket
+
+        token = auth.get('token') if auth else None
+        user = authenticate_socket(token) if token else None
+        if not user or not user.is_admin:
+            current_app.logger.warning("Admin stats connection rejected")
+            disconnect()
+            return False
+
+        admin_subscribers.add(request.sid)
+        join_room(STATS_ROOM)
+
+        if not stats_state['running']:
+            stats_state['running'] = True
+            socketio.start_background_task(run_stats_broadcaster, current_app._get_current_object())
+
+        # New subscribers get the last shared snapshot straight away
+        snapshot = stats_state['snapshot'] or build_snapshot(0.0)
+        release_connection()
+        emit('stats', snapshot)
+        return True
+
+    except Exception as e:
+        current_app.logger.error(f"Admin connection error: {str(e)}")
+        disconnect()
+        return False
+
+@socketio.on('disconnect', namespace=ADMIN_NAMESPACE)
+def handle_admin_disconnect():
+    """Handle admin dashboard disconnection"""
+    from flask import request
+    admin_subscribers.discard(request.sid)
+
+def run_stats_broadcaster(app):
+    """Compute and push one stats snapshot per interval while admins are subscribed"""
+    interval = app.config['ADMIN_STATS_INTERVAL']
+    last_frames = metrics.get_counter('audio_frames_relayed')
+    last_time = time.monotonic()
+
+    while admin_subscribers:
+        socketio.sleep(interval)
+
+        now = time.monotonic()
+        frames = metrics.get_counter('audio_frames_relayed')
+        frames_per_sec = (frames - last_frames) / (now - last_time) if now > last_time else 0.0
+        last_frames, last_time = frames, now
+
+        with app.app_context():
+            try:
+                snapshot = build_snapshot(frames_per_sec)
+                release_connection()
+            except Exception as e:
+                app.logger.error(f"Admin stats error: {str(e)}")
+                db.session.rollback()
+                continue
+
+        stats_state['snapshot'] = snapshot
+        socketio.emit('stats', snapshot, namespace=ADMIN_NAMESPACE, to=STATS_ROOM)
+
+    stats_state['running'] = False
+
+def build_snapshot(frames_per_sec):
+    """Aggregate dashboard stats with a fixed number of queries"""
+    online_by_channel = db.session.query(OnlineUser.channel_id, func.count(OnlineUser.id))\
+        .filter(OnlineUser.channel_id.isnot(None))\
+        .group_by(OnlineUser.channel_id).all()
+
+    speakers = db.session.query(OnlineUser.user_id, OnlineUser.channel_id, User.username)\
+        .join(User, User.id == OnlineUser.user_id)\
+        .filter(OnlineUser.is_speaking.is_(True)).all()
+
+    recent = db.session.query(ActivityLog, User.username)\
+        .join(User, User.id == ActivityLog.user_id)\
+        .order_by(ActivityLog.timestamp.desc())\
+        .limit(current_app.config['ADMIN_STATS_RECENT_EVENTS']).all()
+
+    return {
+        'generated_at': serialization.now(),
+        'total_users': User.query.count(),
+        'total_channels': Channel.query.filter_by(is_active=True).count(),
+        'online_users': sum(count for _, count in online_by_channel),
+        'online_by_channel': {str(channel_id): count for channel_id, count in online_by_channel},
+        'active_speakers': [
+            {'user_id': user_id, 'channel_id': channel_id, 'username': username}
+            for user_id, channel_id, username in speakers
+        ],
+        # Relay rate is measured on this node
+        'frames_per_sec': round(frames_per_sec, 1),
+        'recent_events': [
+            dict(log.to_dict(), username=username) for log, username in recent
+        ]
+    }
@@ -0,0 +1,143 @@
+"""Thread-pool ASGI mode: the app behind python-socketio's AsyncServer.
+
+The Socket.IO transport (connections, framing, fan-out of emits) runs on
+an asyncio event loop instead of the eventlet hub, with no monkey
+patching. The handlers are not coroutines: the existing Flask-SocketIO
+handlers run unchanged in a thread pool with the usual Flask request
+context, using the same sync SQLAlchemy and Redis clients as the eventlet
+mode. Blocking calls (psycopg2, password hashing, Redis) therefore hold
+a pool thread, never the loop, and concurrency is bounded by
+ASGI_HANDLER_THREADS rather than by the number of sockets. Events from
+one socket are handled in order. REST requests reach the Flask app
+through a WSGI-to-ASGI bridge with its own thread pool.
+
+Handlers for different sockets run at the same time, so the per-process
+state (listener counts, the Redis outbox, rate limit buckets, sub-rooms,
+held broadcasts, codec and scan listeners) is updated under each
+module's lock, and entries such as a held session or a live connection
+are claimed with a single ``pop``. The locks only cover dict and list
+updates, never an emit or a database call, so they are also safe under
+eventlet.
+
+Flask-SocketIO must be initialised in 'threading' mode for this. Its
+server object is then replaced by ``AsyncServerBridge``, which forwards
+emits and room changes from handler and background threads to the event
+loop, so code calling ``socketio.emit`` or ``join_room`` works unchanged.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class AsyncServerBridge:
+    """Stands in for Flask-SocketIO's server, forwarding to an AsyncServer"""
+
+    def __init__(self, app, sync_server, async_server):
+        self.app = app
+        self.sync_server = sync_server
+        self.async_server = async_server
+        self.eio = async_server.eio
+        self.manager = async_server.manager
+        self.loop = None
+        self.loop_thread = None
+
+    def __getattr__(self, name):
+        # sleep, start_background_task and the like stay thread based
+        return getattr(self.sync_server, name)
+
+    def attach(self, loop):
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+
+    def _call(self, fn, *args, **kwargs):
+        if self.loop is None or threading.get_ident() == self.loop_thread:
+            fn(*args, **kwargs)
+        else:
+            self.loop.call_soon_threadsafe(lambda: fn(*args, **kwargs))
+
+    def _schedule(self, coro):
+        if self.loop is None:
+            coro.close()
+        elif threading.get_ident() == self.loop_thread:
+            self.loop.create_task(coro)
+        else:
+            asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def emit(self, event, *args, namespace=None, to=None, room=None, skip_sid=None,
+             callback=None, ignore_queue=False, **kwargs):
+        data = args[0] if len(args) == 1 else (args or None)
+        self._schedule(self.async_server.emit(event, data, to=to or room, skip_sid=skip_sid,
+                                              namespace=namespace, callback=callback,
+                                              ignore_queue=ignore_queue))
+
+    def enter_room(self, sid, room, namespace=None):
+        self._call(self.async_server.enter_room, sid, room, namespace=namespace)
+
+    def leave_room(self, sid, room, namespace=None):
+        self._call(self.async_server.leave_room, sid, room, namespace=namespace)
+
+    def close_room(self, room, namespace=None):
+        self._schedule(self.async_server.close_room(room, namespace=namespace))
+
+    def rooms(self, sid, namespace=None):
+        return self.async_server.rooms(sid, namespace=namespace)
+
+    def disconnect(self, sid, namespace=None, ignore_queue=False):
+        self._schedule(self.async_server.disconnect(sid, namespace=namespace,
+                                                    ignore_queue=ignore_queue))
+
+    def send_packet_many(self, eio_sids, pkt):
+        """Queue one prebuilt Engine.IO packet on several sockets"""
+        async def send():
+            for eio_sid in eio_sids:
+                await self.eio.send_packet(eio_sid, pkt)
+        self._schedule(send())
+
+    def get_environ(self, sid, namespace=None):
+        environ = self.async_server.get_environ(sid, namespace=namespace)
+        if environ is not None:
+            # Flask-SocketIO's WSGI middleware normally adds this
+            environ.setdefault('flask.app', self.app)
+        return environ
+
+def _threaded(handler, executor):
+    async def run(sid, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, handler, sid, *args)
+    return run
+
+def build_asgi_app(app):
+    """Wrap a Flask app created in 'threading' Socket.IO mode as an ASGI app"""
+    import socketio as python_socketio
+    from a2wsgi import WSGIMiddleware
+    from app import socketio, serialization, drain
+
+    if socketio.async_mode != 'threading':
+        raise RuntimeError("ASGI mode needs SOCKETIO_ASYNC_MODE=threading")
+
+    sync_server = socketio.server
+    async_server = python_socketio.AsyncServer(
+        async_mode='asgi',
+        cors_allowed_origins=app.config['SOCKETIO_CORS_ALLOWED_ORIGINS'],
+        json=serialization,
+        # Await each handler inline so one socket's events stay in order
+        async_handlers=False
+    )
+
+    executor = ThreadPoolExecutor(max_workers=app.config['ASGI_HANDLER_THREADS'],
+                                  thread_name_prefix='socketio-handler')
+    for namespace, handlers in sync_server.handlers.items():
+        for event, handler in handlers.items():
+            async_server.on(event, _threaded(handler, executor), namespace=namespace)
+
+    bridge = AsyncServerBridge(app, sync_server, async_server)
+    socketio.server = bridge
+
+    async def on_startup():
+        bridge.attach(asyncio.get_running_loop())
+        # uvicorn has just replaced the drain handler with its own, which
+        # would close every socket at once; drain first, then hand it on
+        drain.install_signal_handler(app)
+        app.logger.info("ASGI Socket.IO server ready")
+
+    rest_app = WSGIMiddleware(app, workers=app.config['ASGI_REST_THREADS'])
+    return python_socketio.ASGIApp(async_server, other_asgi_app=rest_app, on_startup=on_startup)
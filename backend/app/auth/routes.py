@@ -4,6 +4,7 @@ from datetime import datetime
 from app.auth import bp
 from app.models import User
 from app import db
+from app.database import read_replica
 
 @bp.route('/login', methods=['POST'])
 def login():
@@ -64,6 +65,7 @@ def refresh():
 
 @bp.route('/me', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_current_user():
     """Get current user information"""
     try:
@@ -0,0 +1,170 @@
+"""Broadcast channels: listen-only fan-out to very large audiences.
+
+On a channel with ``channel_type = 'broadcast'`` only the creator and
+admins may talk. They join the channel room as usual, while every other
+connection is a listener placed in a sub-room of at most
+BROADCAST_SUBROOM_SIZE sockets instead.
+
+Events for listeners are serialized once into a single Engine.IO packet
+that is queued on every listener socket as is, rather than encoded per
+recipient. Each channel has one sender task that drains its packet
+queue one sub-room at a time, yielding between sub-rooms, so the
+senders of busy channels take turns on the hub instead of one emit loop
+holding it for thousands of sockets. A queue that falls more than
+BROADCAST_QUEUE_LIMIT packets behind drops its oldest packets.
+
+Listeners get no join, leave or other presence events; they are sent a
+``listener_count`` for the channel at most every BROADCAST_COUNT_INTERVAL
+seconds while it changes.
+"""
+import threading
+from collections import deque
+from engineio import packet as eio_packet
+from socketio import packet as sio_packet
+from app import socketio, metrics, sharding
+from app.models import OnlineUser
+
+# Broadcast channel ids, recorded as channels are joined
+broadcast_channels = set()
+
+# Listener count of each sub-room, per channel id
+subroom_sizes = {}
+
+# Encoded packets waiting to be sent, per channel id
+send_queues = {}
+
+# Channels with a listener count update scheduled
+_count_pending = set()
+
+# Guards subroom_sizes, send_queues and _count_pending
+_lock = threading.Lock()
+
+def is_broadcast(channel_id):
+    return channel_id in broadcast_channels
+
+def can_speak(channel, user):
+    """Whether a user talks on a broadcast channel rather than only listening"""
+    return user.is_admin or channel.created_by == user.id
+
+def subroom(channel_id, index):
+    return f"channel_{channel_id}_b{index}"
+
+def add_listener(channel_id, socket_id, subroom_size):
+    """Put a listener in the first sub-room with space, returning its index"""
+    with _lock:
+        sizes = subroom_sizes.setdefault(channel_id, [])
+        for index, size in enumerate(sizes):
+            if size < subroom_size:
+                sizes[index] += 1
+                break
+        else:
+            index = len(sizes)
+            sizes.append(1)
+        listeners = sum(sizes)
+    socketio.server.enter_room(socket_id, subroom(channel_id, index), namespace='/')
+    metrics.set_gauge('broadcast_listeners', listeners, channel=channel_id)
+    return index
+
+def remove_listener(channel_id, socket_id, index):
+    """Take a listener out of its sub-room (socket_id is None once disconnected)"""
+    if socket_id is not None:
+        socketio.server.leave_room(socket_id, subroom(channel_id, index), namespace='/')
+    with _lock:
+        sizes = subroom_sizes.get(channel_id)
+        if not sizes:
+            return
+        sizes[index] = max(0, sizes[index] - 1)
+        while sizes and sizes[-1] == 0:
+            sizes.pop()
+        listeners = sum(sizes)
+        if not sizes:
+            del subroom_sizes[channel_id]
+    metrics.set_gauge('broadcast_listeners', listeners, channel=channel_id)
+
+def encode(event, payload):
+    """Serialize an event once into an Engine.IO packet shareable by all sockets"""
+    encoded = sio_packet.Packet(sio_packet.EVENT, data=[event, payload], namespace='/').encode()
+    return eio_packet.Packet(eio_packet.MESSAGE, data=encoded)
+
+def publish(app, channel_id, event, payload):
+    """Queue an event for a broadcast channel's listeners on this node"""
+    if channel_id not in broadcast_channels or not subroom_sizes.get(channel_id):
+        return
+
+    pkt = encode(event, payload)
+    with _lock:
+        queue = send_queues.get(channel_id)
+        start = queue is None
+        dropped = not start and len(queue) >= app.config['BROADCAST_QUEUE_LIMIT']
+        if start:
+            queue = send_queues[channel_id] = deque()
+        elif dropped:
+            queue.popleft()
+        queue.append(pkt)
+
+    if dropped:
+        metrics.inc('broadcast_packets_dropped')
+    if start:
+        socketio.start_background_task(run_sender, app, channel_id, queue)
+
+def run_sender(app, channel_id, queue):
+    """Send a channel's queued packets sub-room by sub-room until the queue is empty"""
+    server = socketio.server
+    try:
+        while True:
+            with _lock:
+                if not queue:
+                    # Done; a packet queued after this starts a new sender
+                    _forget_queue(channel_id, queue)
+                    return
+                pkt = queue.popleft()
+            for index in range(len(subroom_sizes.get(channel_id, ()))):
+                eio_sids = [eio_sid for _, eio_sid in
+                            server.manager.get_participants('/', subroom(channel_id, index))]
+                send(server, eio_sids, pkt)
+                # Let other channels' senders and socket writers run
+                socketio.sleep(0)
+            metrics.inc('broadcast_packets_sent')
+    except Exception as e:
+        app.logger.error(f"Broadcast sender error on channel {channel_id}: {str(e)}")
+        with _lock:
+            _forget_queue(channel_id, queue)
+
+def _forget_queue(channel_id, queue):
+    """Drop a finished sender's queue (called with the lock held)"""
+    if send_queues.get(channel_id) is queue:
+        del send_queues[channel_id]
+
+def send(server, eio_sids, pkt):
+    """Queue one prebuilt packet on each socket"""
+    send_many = getattr(server, 'send_packet_many', None)
+    if send_many is not None:
+        # ASGI mode hands the packet to the event loop in one call
+        send_many(eio_sids, pkt)
+        return
+    for eio_sid in eio_sids:
+        server.eio.send_packet(eio_sid, pkt)
+
+def listeners_changed(app, channel_id):
+    """Schedule a listener count update for a broadcast channel"""
+    with _lock:
+        if channel_id in _count_pending:
+            return
+        _count_pending.add(channel_id)
+    socketio.start_background_task(send_count, app, channel_id)
+
+def send_count(app, channel_id):
+    """Send the channel's listener count, at most once per interval"""
+    socketio.sleep(app.config['BROADCAST_COUNT_INTERVAL'])
+    with _lock:
+        _count_pending.discard(channel_id)
+    with app.app_context():
+        try:
+            # Counted from OnlineUser so listeners on every node are included
+            count = OnlineUser.query.filter_by(channel_id=channel_id).count()
+            payload = {'channel_id': channel_id, 'listener_count': count}
+            socketio.emit('listener_count', payload, room=f"channel_{channel_id}")
+            publish(app, channel_id, 'listener_count', payload)
+            sharding.forward(channel_id, 'listener_count', payload)
+        except Exception as e:
+            app.logger.error(f"Listener count error on channel {channel_id}: {str(e)}")
@@ -0,0 +1,391 @@
+"""Bulk import of users and channel memberships, and streamed exports.
+
+Imports read CSV or NDJSON a row at a time and insert in batches of
+BULK_BATCH_SIZE, one transaction per batch. Rows that conflict with an
+existing username, email or membership are skipped by the database
+(``ON CONFLICT DO NOTHING``) rather than checked one by one. Password
+hashing, the slow part of a user import, is spread over worker processes
+from the CLI and over native threads inside the server. Every
+function yields a result per row so callers can stream progress back.
+"""
+import csv
+import io
+import json
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app, has_request_context
+from sqlalchemy import select
+from werkzeug.security import generate_password_hash
+from app import db, cache, socketio, membership
+from app.models import User, Channel, ActivityLog, user_channels
+from app.database import insert_ignore
+
+USER_EXPORT_FIELDS = ['id', 'username', 'email', 'is_admin', 'is_active', 'created_at', 'last_seen']
+MEMBERSHIP_EXPORT_FIELDS = ['user_id', 'username', 'channel_id', 'channel', 'joined_at']
+ACTIVITY_EXPORT_FIELDS = ['id', 'timestamp', 'user_id', 'channel_id', 'action', 'duration', 'extra_data']
+
+def parse_rows(stream, fmt):
+    """Yield (row number, record, error) from a CSV or NDJSON text stream"""
+    if fmt == 'csv':
+        for number, record in enumerate(csv.DictReader(stream), 1):
+            yield number, record, None
+        return
+
+    number = 0
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, None, 'Invalid JSON'
+            continue
+        if not isinstance(record, dict):
+            yield number, None, 'Expected a JSON object'
+            continue
+        yield number, record, None
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'y')
+
+def _hash_chunk(passwords):
+    return [generate_password_hash(p) for p in passwords]
+
+def _green_threads():
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('thread')
+
+class PasswordHasher:
+    """Hashes batches of passwords in parallel.
+
+    Worker processes cannot be forked safely from a running server, so
+    during a request the work goes to native threads instead (eventlet's
+    thread pool under eventlet), where the key derivation runs without
+    holding the GIL.
+    """
+
+    def __init__(self, workers):
+        self.workers = max(1, workers)
+        self.executor = None
+
+    def __enter__(self):
+        if self.workers > 1 and not _green_threads():
+            pool = ThreadPoolExecutor if has_request_context() else ProcessPoolExecutor
+            self.executor = pool(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc):
+        if self.executor:
+            self.executor.shutdown()
+
+    def hash(self, passwords):
+        size = -(-len(passwords) // self.workers)
+        chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+        if self.executor:
+            results = self.executor.map(_hash_chunk, chunks)
+        elif self.workers > 1 and len(chunks) > 1 and _green_threads():
+            import eventlet
+            from eventlet import tpool
+            pool = eventlet.GreenPool(self.workers)
+            results = pool.imap(lambda chunk: tpool.execute(_hash_chunk, chunk), chunks)
+        else:
+            results = [_hash_chunk(passwords)]
+        return [h for chunk in results for h in chunk]
+
+def _user_fields(record):
+    username = str(record.get('username') or '').strip()
+    password = record.get('password')
+    if not username or not password:
+        return None, 'Username and password are required'
+    if len(username) > 80:
+        return None, 'Username is too long'
+    return {
+        'username': username,
+        'password': str(password),
+        'email': str(record.get('email') or '').strip() or None,
+        'is_admin': _flag(record.get('is_admin')),
+        'is_active': _flag(record.get('is_active', True))
+    }, None
+
+def import_users(rows):
+    """Create users from parsed rows, yielding a result per row and a summary"""
+    batch_size = current_app.config['BULK_BATCH_SIZE']
+    stats = Counter()
+    with PasswordHasher(current_app.config['BULK_HASH_WORKERS']) as hasher:
+        for batch in _batches(rows, batch_size):
+            yield from _import_user_batch(batch, hasher, stats)
+    yield {'summary': dict(stats)}
+
+def _import_user_batch(batch, hasher, stats):
+    valid = []
+    seen = set()
+    for number, record, error in batch:
+        fields = None
+        if error is None:
+            fields, error = _user_fields(record)
+        if error:
+            stats['error'] += 1
+            yield {'row': number, 'status': 'error', 'error': error}
+        elif fields['username'] in seen:
+            stats['exists'] += 1
+            yield {'row': number, 'status': 'exists', 'username': fields['username']}
+        else:
+            seen.add(fields['username'])
+            valid.append((number, fields))
+    if not valid:
+        return
+
+    hashes = hasher.hash([fields['password'] for _, fields in valid])
+    now = datetime.utcnow()
+    values = [{
+        'username': fields['username'],
+        'email': fields['email'],
+        'password_hash': password_hash,
+        'is_admin': fields['is_admin'],
+        'is_active': fields['is_active'],
+        'created_at': now,
+        'last_seen': now
+    } for (_, fields), password_hash in zip(valid, hashes)]
+
+    table = User.__table__
+    try:
+        statement = insert_ignore(table, db.engine.dialect.name).returning(table.c.username, table.c.id)
+        created = dict(db.session.execute(statement, values).all())
+        db.session.commit()
+    except Exception as e:
+        current_app.logger.error(f"Bulk user import batch failed: {str(e)}")
+        db.session.rollback()
+        stats['error'] += len(valid)
+        for number, _ in valid:
+            yield {'row': number, 'status': 'error', 'error': 'Batch failed'}
+        return
+
+    if created:
+        cache.bump('users', 'user:*', 'user_profiles')
+    for number, fields in valid:
+        username = fields['username']
+        if username in created:
+            stats['created'] += 1
+            yield {'row': number, 'status': 'created', 'id': created[username], 'username': username}
+        else:
+            # Username or email already taken
+            stats['exists'] += 1
+            yield {'row': number, 'status': 'exists', 'username': username}
+
+def import_memberships(rows):
+    """Add channel memberships from parsed rows, yielding a result per row and a summary"""
+    batch_size = current_app.config['BULK_BATCH_SIZE']
+    stats = Counter()
+    for batch in _batches(rows, batch_size):
+        yield from _import_membership_batch(batch, stats)
+    yield {'summary': dict(stats)}
+
+def _lookup_ids(model, name_column, id_field, name_field, records):
+    """Resolve a batch's user or channel references to existing ids.
+
+    Rows may give either the id or the name; both are checked against
+    the table with one query each, and anything unresolved maps to None.
+    """
+    names, ids = set(), set()
+    for _, record in records:
+        value = record.get(id_field)
+        if value not in (None, ''):
+            try:
+                ids.add(int(value))
+            except (TypeError, ValueError):
+                pass
+        elif record.get(name_field):
+            names.add(str(record[name_field]).strip())
+
+    found = {}
+    if names:
+        found.update(db.session.query(name_column, model.id).filter(name_column.in_(names)).all())
+    if ids:
+        found.update((i, i) for i, in db.session.query(model.id).filter(model.id.in_(ids)).all())
+    return found
+
+def _reference(record, id_field, name_field, found):
+    value = record.get(id_field)
+    if value not in (None, ''):
+        try:
+            return found.get(int(value))
+        except (TypeError, ValueError):
+            return None
+    return found.get(str(record.get(name_field) or '').strip())
+
+def _import_membership_batch(batch, stats):
+    records = [(number, record) for number, record, error in batch if error is None]
+    user_ids = _lookup_ids(User, User.username, 'user_id', 'username', records)
+    channel_ids = _lookup_ids(Channel, Channel.name, 'channel_id', 'channel', records)
+    errors = {number: error for number, _, error in batch if error}
+
+    valid = []
+    seen = set()
+    for number, record in records:
+        user_id = _reference(record, 'user_id', 'username', user_ids)
+        channel_id = _reference(record, 'channel_id', 'channel', channel_ids)
+        if not user_id:
+            errors[number] = 'Unknown user'
+        elif not channel_id:
+            errors[number] = 'Unknown channel'
+        elif (user_id, channel_id) not in seen:
+            seen.add((user_id, channel_id))
+            valid.append((number, user_id, channel_id))
+        else:
+            stats['exists'] += 1
+            yield {'row': number, 'status': 'exists', 'user_id': user_id, 'channel_id': channel_id}
+
+    for number, error in sorted(errors.items()):
+        stats['error'] += 1
+        yield {'row': number, 'status': 'error', 'error': error}
+    if not valid:
+        return
+
+    now = datetime.utcnow()
+    values = [{'user_id': user_id, 'channel_id': channel_id, 'joined_at': now}
+              for _, user_id, channel_id in valid]
+    try:
+        statement = insert_ignore(user_channels, db.engine.dialect.name)\
+            .returning(user_channels.c.user_id, user_channels.c.channel_id)
+        created = set(db.session.execute(statement, values).all())
+        # Imports are admin actions and are not held to max_users
+        membership.added_members(Counter(channel_id for _, channel_id in created))
+        db.session.commit()
+    except Exception as e:
+        current_app.logger.error(f"Bulk membership import batch failed: {str(e)}")
+        db.session.rollback()
+        stats['error'] += len(valid)
+        for number, _, _ in valid:
+            yield {'row': number, 'status': 'error', 'error': 'Batch failed'}
+        return
+
+    for number, user_id, channel_id in valid:
+        status = 'created' if (user_id, channel_id) in created else 'exists'
+        stats[status] += 1
+        yield {'row': number, 'status': status, 'user_id': user_id, 'channel_id': channel_id}
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def export_users():
+    """Yield every user as a dict, in id order, without loading them all"""
+    columns = [getattr(User, field) for field in USER_EXPORT_FIELDS]
+    query = select(*columns).order_by(User.id)\
+        .execution_options(yield_per=current_app.config['EXPORT_YIELD_PER'])
+    for row in db.session.execute(query):
+        yield {field: _export_value(value) for field, value in zip(USER_EXPORT_FIELDS, row)}
+
+def export_memberships():
+    """Yield every channel membership as a dict, without loading them all"""
+    query = select(user_channels.c.user_id, User.username, user_channels.c.channel_id,
+                   Channel.name, user_channels.c.joined_at)\
+        .join(User, User.id == user_channels.c.user_id)\
+        .join(Channel, Channel.id == user_channels.c.channel_id)\
+        .order_by(user_channels.c.channel_id, user_channels.c.user_id)\
+        .execution_options(yield_per=current_app.config['EXPORT_YIELD_PER'])
+    for row in db.session.execute(query):
+        yield {field: _export_value(value) for field, value in zip(MEMBERSHIP_EXPORT_FIELDS, row)}
+
+def activity_filters(args):
+    """Activity export filters from request args or CLI options.
+
+    Raises ValueError for malformed ids or timestamps.
+    """
+    filters = {}
+    for key in ('channel_id', 'user_id'):
+        if args.get(key) not in (None, ''):
+            filters[key] = int(args[key])
+    if args.get('action'):
+        filters['actions'] = [a.strip() for a in str(args['action']).split(',') if a.strip()]
+    for key in ('since', 'until'):
+        if args.get(key):
+            filters[key] = datetime.fromisoformat(str(args[key]))
+    return filters
+
+def export_activity(channel_id=None, user_id=None, actions=None, since=None, until=None):
+    """Yield activity log entries as dicts in time order, in constant memory.
+
+    Rows are fetched yield_per at a time from a server-side cursor, and the
+    generator hands control back to the event loop between fetches so a
+    long export does not hold up socket handlers.
+    """
+    batch = current_app.config['EXPORT_YIELD_PER']
+    query = select(*[getattr(ActivityLog, field) for field in ACTIVITY_EXPORT_FIELDS])
+    if channel_id is not None:
+        query = query.where(ActivityLog.channel_id == channel_id)
+    if user_id is not None:
+        query = query.where(ActivityLog.user_id == user_id)
+    if actions:
+        query = query.where(ActivityLog.action.in_(actions))
+    if since is not None:
+        query = query.where(ActivityLog.timestamp >= since)
+    if until is not None:
+        query = query.where(ActivityLog.timestamp < until)
+    query = query.order_by(ActivityLog.timestamp, ActivityLog.id).execution_options(yield_per=batch)
+
+    for count, row in enumerate(db.session.execute(query), 1):
+        yield {field: _export_value(value) for field, value in zip(ACTIVITY_EXPORT_FIELDS, row)}
+        if count % batch == 0:
+            socketio.sleep(0)
+
+def gzip_stream(chunks, level=6):
+    """Gzip text chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def serialize(records, fmt, fields):
+    """Render dicts as CSV or NDJSON text, one chunk per record"""
+    if fmt != 'csv':
+        for record in records:
+            yield json.dumps(record) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for record in records:
+        # Nested values such as extra_data go into a single JSON cell
+        writer.writerow({k: json.dumps(v) if isinstance(v, (dict, list)) else v
+                         for k, v in record.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def upload_format(mimetype, requested=None):
+    """'csv' or 'ndjson' from an explicit format or the upload's content type"""
+    if requested in ('csv', 'ndjson'):
+        return requested
+    return 'csv' if mimetype in ('text/csv', 'application/csv') else 'ndjson'
+
+def guarded(results):
+    """Turn an error in the middle of a streamed import into a final result line"""
+    try:
+        yield from results
+    except Exception as e:
+        current_app.logger.error(f"Bulk import aborted: {str(e)}")
+        db.session.rollback()
+        yield {'error': 'Import aborted', 'detail': str(e)}
@@ -0,0 +1,218 @@
+"""HTTP response caching with ETags driven by per-resource version counters.
+
+Every committed write bumps the version of the resources it touches
+(``users``, ``user:<id>``, ``user_profiles``, ``channels``,
+``channel:<id>``), and only of responses that show what it changed:
+presence changes bump ``channels`` (online counts) only when a row enters
+or leaves a channel, activity never does, and heartbeat columns
+(``OnlineUser.last_activity``, ``User.last_seen``) are left out of the
+channel views. Bulk statements bump the wildcard keys of their model
+unless they pass the exact keys as the ``cache_keys`` execution option.
+A cached view's ETag is a hash of the request and the versions it depends on, so a
+conditional request is answered with a 304 after a single version lookup,
+without running the view. With Redis available, versions are shared by
+all nodes and rendered bodies are kept in Redis for RESPONSE_CACHE_TTL
+seconds.
+"""
+import hashlib
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, request, make_response
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import get_redis_client, metrics
+
+VERSION_PREFIX = 'ptt:version:'
+BODY_PREFIX = 'ptt:response:'
+
+# Local fallback when Redis is not available: key -> (version, bumped_at)
+_local_versions = {}
+_local_lock = threading.Lock()
+
+def bump(*keys):
+    """Invalidate cached responses depending on the given resources"""
+    if not keys:
+        return
+
+    now = time.time()
+    redis_client = get_redis_client()
+    if redis_client:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipe.incr(VERSION_PREFIX + key)
+                pipe.hset(VERSION_PREFIX + 'bumped_at', key, now)
+            pipe.execute()
+            return
+        except Exception as e:
+            current_app.logger.warning(f"Redis version bump failed: {e}")
+
+    with _local_lock:
+        for key in keys:
+            version = _local_versions.get(key, (0, 0))[0]
+            _local_versions[key] = (version + 1, now)
+
+def get_versions(keys):
+    """Current (version, bumped_at) for each key"""
+    redis_client = get_redis_client()
+    if redis_client:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.mget([VERSION_PREFIX + key for key in keys])
+            pipe.hmget(VERSION_PREFIX + 'bumped_at', keys)
+            versions, bumped = pipe.execute()
+            return [(int(v or 0), float(b or 0)) for v, b in zip(versions, bumped)]
+        except Exception as e:
+            current_app.logger.warning(f"Redis version lookup failed: {e}")
+
+    with _local_lock:
+        return [_local_versions.get(key, (0, 0)) for key in keys]
+
+def cached_response(*resources):
+    """Decorator adding ETag/304 handling and shared caching to a GET view.
+
+    ``resources`` are the version keys the response depends on; they may
+    reference the view's arguments, e.g. ``'channel:{channel_id}'``. Detail
+    views should also list the matching wildcard key (``'channel:*'``),
+    which bulk updates and deletes bump.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            keys = [r.format(**kwargs) for r in resources]
+            versions = get_versions(keys)
+
+            # Responses vary by caller since admins see more fields
+            etag_source = '|'.join([request.full_path, str(get_jwt_identity())] +
+                                   [f"{k}={v}" for k, (v, _) in zip(keys, versions)])
+            etag = hashlib.sha1(etag_source.encode()).hexdigest()
+
+            if etag in request.if_none_match:
+                metrics.inc('http_cache', result='not_modified')
+                return _with_cache_headers(make_response('', 304), etag)
+
+            redis_client = get_redis_client()
+            if redis_client:
+                try:
+                    body = redis_client.get(BODY_PREFIX + etag)
+                except Exception:
+                    body = None
+                if body is not None:
+                    metrics.inc('http_cache', result='shared_hit')
+                    response = make_response(body, 200)
+                    response.mimetype = 'application/json'
+                    return _with_cache_headers(response, etag)
+
+            metrics.inc('http_cache', result='miss')
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200 or not _fresh_enough(versions):
+                return response
+
+            if redis_client:
+                try:
+                    redis_client.set(BODY_PREFIX + etag, response.get_data(),
+                                     ex=current_app.config['RESPONSE_CACHE_TTL'])
+                except Exception as e:
+                    current_app.logger.warning(f"Redis response cache store failed: {e}")
+            return _with_cache_headers(response, etag)
+        return decorated
+    return decorator
+
+def _fresh_enough(versions):
+    """Replica reads may miss writes bumped within the allowed replica lag"""
+    if not g.get('db_replica_used'):
+        return True
+    window = current_app.config['DB_REPLICA_MAX_LAG_SECONDS']
+    return all(time.time() - bumped_at > window for _, bumped_at in versions)
+
+def _with_cache_headers(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _changed(obj):
+    """Names of the loaded attributes changed on a dirty instance"""
+    return {attr.key for attr in inspect(obj).attrs if attr.history.has_changes()}
+
+def _resource_keys(obj, changed=None):
+    """Version keys affected by a change to a model instance.
+
+    ``changed`` holds the changed attribute names of an updated instance,
+    and is None for an inserted or deleted one.
+    """
+    from app.models import User, Channel, OnlineUser, ActivityLog
+
+    if isinstance(obj, User):
+        keys = {'users', f'user:{obj.id}'}
+        # Channel views show online users, which a new user is not yet
+        if inspect(obj).was_deleted or (changed and changed - {'last_seen'}):
+            keys.add('user_profiles')
+        return keys
+    if isinstance(obj, Channel):
+        return {'channels', f'channel:{obj.id}'}
+    if isinstance(obj, OnlineUser):
+        if changed is None:
+            return {'channels', f'channel:{obj.channel_id}'}
+        if 'channel_id' in changed:
+            old = inspect(obj).attrs.channel_id.history.deleted
+            return {'channels', f'channel:{obj.channel_id}'} | {f'channel:{c}' for c in old}
+        if changed - {'last_activity'}:
+            return {f'channel:{obj.channel_id}'}
+        return set()
+    if isinstance(obj, ActivityLog):
+        keys = {f'channel:{obj.channel_id}'}
+        if obj.action == 'speak_end':
+            keys.add(f'user:{obj.user_id}')
+        return keys
+    return set()
+
+@event.listens_for(Session, 'before_flush')
+def _collect_dirty(session, flush_context, instances):
+    # Attribute history is gone after the flush, so updates are read here
+    keys = session.info.setdefault('cache_keys', set())
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            keys |= _resource_keys(obj, _changed(obj))
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed(session, flush_context):
+    keys = session.info.setdefault('cache_keys', set())
+    for obj in list(session.new) + list(session.deleted):
+        keys |= _resource_keys(obj)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk(orm_execute_state):
+    # Bulk query.update()/delete() calls bypass the flush
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    # Per-item keys cannot be derived from a bulk statement, so unless the
+    # caller names them, the wildcard key every detail view depends on is
+    # bumped
+    keys = orm_execute_state.execution_options.get('cache_keys')
+    if keys is None:
+        keys = {
+            'User': ('users', 'user:*', 'user_profiles'),
+            'Channel': ('channels', 'channel:*'),
+            'OnlineUser': ('channels', 'channel:*'),
+        }.get(mapper.class_.__name__)
+    if keys:
+        orm_execute_state.session.info.setdefault('cache_keys', set()).update(keys)
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed(session):
+    keys = session.info.pop('cache_keys', None)
+    if not keys:
+        return
+    try:
+        bump(*keys)
+    except Exception as e:
+        current_app.logger.warning(f"Cache invalidation failed: {e}")
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('cache_keys', None)
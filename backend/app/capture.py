@@ -0,0 +1,126 @@
+"""Recording of incoming socket events for the replay benchmark.
+
+With SOCKET_CAPTURE_PATH set, every Socket.IO handler on the default
+namespace is wrapped to append one line per event to that file: the
+time since capture start, a client number standing in for the socket
+id, the event name, the payload size, the handler's duration and the
+payload itself. Access and resume tokens are never written; a connect
+records the authenticated user id instead. With SOCKET_CAPTURE_ZERO_AUDIO
+(the default) audio is replaced by silence of the same length, so
+captures hold no speech and compress well. A path ending in ``.gz`` is
+written gzip-compressed. The file is flushed on each disconnect and
+closed at exit; a capture cut off by a killed server reads up to its
+last flush.
+
+``benchmarks/replay.py`` plays a capture back against the handlers.
+"""
+import atexit
+import gzip
+import threading
+import time
+from app import socketio, serialization
+
+FORMAT_VERSION = 1
+FIELDS = ['t', 'client', 'event', 'bytes', 'handler_ms', 'data']
+
+# Open capture, if any: file, start time, lock and client numbers by sid
+_capture = {}
+
+def open_capture(path):
+    """Open a capture file for writing"""
+    return gzip.open(path, 'wt', encoding='utf-8') if path.endswith('.gz') \
+        else open(path, 'w', encoding='utf-8')
+
+def read_capture(path):
+    """Yield the header, then each record of a capture file as a dict"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        header = serialization.loads(f.readline())
+        if header.get('capture') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported capture format: {header.get('capture')}")
+        yield header
+        try:
+            for line in f:
+                if line.strip():
+                    yield dict(zip(header['fields'], serialization.loads(line)))
+        except (EOFError, ValueError):
+            # A server stopped without closing the file leaves a partial
+            # last line or gzip member; everything flushed before is kept
+            return
+
+def zero_audio(data):
+    """A copy of an audio_data payload with its audio replaced by silence"""
+    audio = data.get('audio')
+    if not isinstance(audio, str):
+        return data
+    stripped = audio.rstrip('=')
+    # Base64 'A' is six zero bits, so the decoded length is unchanged
+    return dict(data, audio='A' * len(stripped) + '=' * (len(audio) - len(stripped)))
+
+def install(app):
+    """Start recording the default namespace's socket events"""
+    path = app.config['SOCKET_CAPTURE_PATH']
+    f = open_capture(path)
+    f.write(serialization.dumps({
+        'capture': FORMAT_VERSION,
+        'fields': FIELDS,
+        'started_at': serialization.now(),
+        'zero_audio': app.config['SOCKET_CAPTURE_ZERO_AUDIO']
+    }) + '\n')
+    _capture.update(file=f, started=time.perf_counter(), lock=threading.Lock(),
+                    clients={}, next_client=0, zero_audio=app.config['SOCKET_CAPTURE_ZERO_AUDIO'])
+    atexit.register(close)
+
+    handlers = socketio.server.handlers.get('/', {})
+    for event, handler in list(handlers.items()):
+        handlers[event] = _recorded(event, handler)
+    app.logger.info(f"Capturing socket events to {path}")
+
+def close():
+    f = _capture.pop('file', None)
+    if f is not None:
+        f.close()
+
+def _recorded(event, handler):
+    def run(sid, *args):
+        received = time.perf_counter()
+        try:
+            return handler(sid, *args)
+        finally:
+            record(sid, event, args, received)
+    return run
+
+def record(sid, event, args, received):
+    """Append one event to the capture"""
+    from app.websocket_events import active_connections
+
+    handler_ms = (time.perf_counter() - received) * 1000
+    if event == 'connect':
+        # args are the WSGI environ and the auth payload
+        auth = args[1] if len(args) > 1 and isinstance(args[1], dict) else {}
+        connection = active_connections.get(sid)
+        data = {
+            'user_id': connection['user_id'] if connection else None,
+            'resume': bool(auth.get('resume_token'))
+        }
+    else:
+        data = args[0] if args else None
+        if event == 'audio_data' and isinstance(data, dict) and _capture['zero_audio']:
+            data = zero_audio(data)
+    size = len(serialization.dumps(list(args))) if event != 'connect' else 0
+
+    with _capture['lock']:
+        f = _capture.get('file')
+        if f is None:
+            return
+        clients = _capture['clients']
+        client = clients.get(sid)
+        if client is None:
+            client = clients[sid] = _capture['next_client']
+            _capture['next_client'] += 1
+        f.write(serialization.dumps([round(received - _capture['started'], 4), client, event,
+                                     size, round(handler_ms, 3), data]) + '\n')
+        if event == 'disconnect':
+            del clients[sid]
+            # Keep the file readable while the server is still running
+            f.flush()
@@ -1,12 +1,21 @@
-from flask import request, jsonify, current_app
+import io
+from flask import request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 from app.channels import bp
 from app.models import Channel, User, ActivityLog, OnlineUser
 from app import db
+from app.database import read_replica
+from app.cache import cached_response
+from app.querystats import query_budget
+from app.users.routes import require_admin
+from app import codec, coalesce, bulk, membership, presence
 
 @bp.route('', methods=['GET'])
 @jwt_required()
+@read_replica
+@cached_response('channels')
 def get_channels():
     """Get list of all channels"""
     try:
@@ -23,12 +32,15 @@ def get_channels():
             page=page, per_page=per_page, error_out=False
         )
         
+        # Online user counts for the whole page in one query
+        online_counts = dict(db.session.query(OnlineUser.channel_id, db.func.count(OnlineUser.id))
+                             .filter(OnlineUser.channel_id.in_([c.id for c in channels.items]))
+                             .group_by(OnlineUser.channel_id).all())
+        
         channel_list = []
         for channel in channels.items:
             channel_data = channel.to_dict()
-            # Add online users count
-            online_count = OnlineUser.query.filter_by(channel_id=channel.id).count()
-            channel_data['online_users'] = online_count
+            channel_data['online_users'] = online_counts.get(channel.id, 0)
             channel_list.append(channel_data)
         
         return jsonify({
@@ -44,6 +56,9 @@ def get_channels():
 
 @bp.route('/<int:channel_id>', methods=['GET'])
 @jwt_required()
+@read_replica
+@cached_response('channel:{channel_id}', 'channel:*', 'user_profiles')
+@query_budget(4)
 def get_channel(channel_id):
     """Get specific channel details"""
     try:
@@ -54,8 +69,7 @@ def get_channel(channel_id):
         channel_data = channel.to_dict()
         
         # Add online users
-        online_users = OnlineUser.query.filter_by(channel_id=channel_id).all()
-        channel_data['online_users'] = [ou.to_dict() for ou in online_users]
+        channel_data['online_users'] = presence.channel_presence(channel_id)
         
         # Add recent activity
         recent_activity = ActivityLog.query.filter_by(channel_id=channel_id)\
@@ -75,7 +89,6 @@ def create_channel():
     """Create a new channel"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
         
         data = request.get_json()
         
@@ -85,6 +98,14 @@ def create_channel():
         name = data['name'].strip()
         description = data.get('description', '').strip()
         max_users = data.get('max_users', 50)
+        channel_type = data.get('channel_type', 'standard')
+        
+        if channel_type not in ('standard', 'broadcast'):
+            return jsonify({'error': 'Invalid channel type'}), 400
+        
+        # Broadcast channels have no member limit, so only admins create them
+        if channel_type == 'broadcast' and not User.query.get(current_user_id).is_admin:
+            return jsonify({'error': 'Admin access required'}), 403
         
         # Check if channel name already exists
         if Channel.query.filter_by(name=name).first():
@@ -95,14 +116,15 @@ def create_channel():
             name=name,
             description=description,
             max_users=max_users,
+            channel_type=channel_type,
             created_by=current_user_id
         )
         
         db.session.add(channel)
-        db.session.commit()
+        db.session.flush()
         
         # Add creator to channel members
-        channel.members.append(current_user)
+        membership.add_member(channel.id, current_user_id, enforce_capacity=False)
         db.session.commit()
         
         return jsonify({
@@ -149,11 +171,21 @@ def update_channel(channel_id):
         if 'max_users' in data:
             channel.max_users = max(1, int(data['max_users']))
         
+        if 'audio_bitrate' in data:
+            bitrate = data['audio_bitrate']
+            channel.audio_bitrate = min(max(6000, int(bitrate)), 128000) if bitrate else None
+        
+        if 'coalesce_ms' in data:
+            interval = data['coalesce_ms']
+            channel.coalesce_ms = min(max(0, int(interval)), 500) if interval else None
+        
         # Only admins can change active status
         if current_user.is_admin and 'is_active' in data:
             channel.is_active = bool(data['is_active'])
         
         db.session.commit()
+        codec.channel_bitrates[channel.id] = channel.audio_bitrate
+        coalesce.channel_intervals[channel.id] = channel.coalesce_ms
         
         return jsonify({
             'message': 'Channel updated successfully',
@@ -198,23 +230,21 @@ def join_channel(channel_id):
     """Join a channel"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
         
         channel = Channel.query.get(channel_id)
         if not channel or not channel.is_active:
             return jsonify({'error': 'Channel not found'}), 404
         
         # Check if already a member
-        if current_user in channel.members:
+        if membership.is_member(channel_id, current_user_id):
             return jsonify({'message': 'Already a member of this channel'}), 200
         
-        # Check channel capacity
-        if len(channel.members) >= channel.max_users:
+        # Add user to channel, unless it is at capacity (broadcast channels have no limit)
+        if not membership.add_member(channel_id, current_user_id,
+                                     enforce_capacity=channel.channel_type != 'broadcast'):
+            db.session.rollback()
             return jsonify({'error': 'Channel is full'}), 409
         
-        # Add user to channel
-        channel.members.append(current_user)
-        
         # Log activity
         activity = ActivityLog(
             user_id=current_user_id,
@@ -226,6 +256,10 @@ def join_channel(channel_id):
         
         return jsonify({'message': 'Successfully joined channel'}), 200
         
+    except IntegrityError:
+        # A concurrent request added the same membership
+        db.session.rollback()
+        return jsonify({'message': 'Already a member of this channel'}), 200
     except Exception as e:
         current_app.logger.error(f"Join channel error: {str(e)}")
         db.session.rollback()
@@ -237,19 +271,16 @@ def leave_channel(channel_id):
     """Leave a channel"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
         
         channel = Channel.query.get(channel_id)
         if not channel:
             return jsonify({'error': 'Channel not found'}), 404
         
-        # Check if user is a member
-        if current_user not in channel.members:
+        # Remove user from channel, if a member
+        if not membership.remove_member(channel_id, current_user_id):
+            db.session.rollback()
             return jsonify({'message': 'Not a member of this channel'}), 200
         
-        # Remove user from channel
-        channel.members.remove(current_user)
-        
         # Log activity
         activity = ActivityLog(
             user_id=current_user_id,
@@ -265,3 +296,38 @@ def leave_channel(channel_id):
         current_app.logger.error(f"Leave channel error: {str(e)}")
         db.session.rollback()
         return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/memberships/import', methods=['POST'])
+@jwt_required()
+def import_memberships():
+    """Add channel memberships from an uploaded CSV or NDJSON body (admin only)
+
+    Rows name the user by ``user_id`` or ``username`` and the channel by
+    ``channel_id`` or ``channel``. Results are streamed back as NDJSON.
+    """
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    fmt = bulk.upload_format(request.mimetype, request.args.get('format'))
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    results = bulk.guarded(bulk.import_memberships(bulk.parse_rows(stream, fmt)))
+    
+    return Response(stream_with_context(bulk.serialize(results, 'ndjson', None)),
+                    mimetype='application/x-ndjson')
+
+@bp.route('/memberships/export', methods=['GET'])
+@jwt_required()
+@read_replica
+def export_memberships():
+    """Stream all channel memberships as CSV or NDJSON (admin only)"""
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    fmt = 'csv' if request.args.get('format') == 'csv' else 'ndjson'
+    rows = bulk.serialize(bulk.export_memberships(), fmt, bulk.MEMBERSHIP_EXPORT_FIELDS)
+    
+    return Response(stream_with_context(rows),
+                    mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename=memberships.{fmt}'})
@@ -0,0 +1,107 @@
+"""Admin commands, run with ``flask --app app <group> <command>``"""
+import json
+import sys
+import click
+from flask.cli import AppGroup, with_appcontext
+from app import db, bulk, membership
+
+bulk_cli = AppGroup('bulk', help='Bulk import and export of users and memberships')
+activity_cli = AppGroup('activity', help='Activity log tools')
+
+def _echo_results(results, verbose):
+    failed = 0
+    for result in bulk.guarded(results):
+        if result.get('status') == 'error' or ('error' in result and 'row' not in result):
+            failed += 1
+        if verbose or result.get('status') == 'error' or 'row' not in result:
+            click.echo(json.dumps(result))
+    if failed:
+        sys.exit(1)
+
+def _open_input(path):
+    return click.open_file(path, 'r', encoding='utf-8')
+
+def _detect_format(path, fmt):
+    if fmt:
+        return fmt
+    return 'csv' if path.endswith('.csv') else 'ndjson'
+
+@bulk_cli.command('import-users')
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension')
+@click.option('--verbose', is_flag=True, help='Print a result for every row, not just failures')
+def import_users_command(path, fmt, verbose):
+    """Create users from a CSV or NDJSON file ('-' for stdin)"""
+    with _open_input(path) as stream:
+        _echo_results(bulk.import_users(bulk.parse_rows(stream, _detect_format(path, fmt))), verbose)
+
+@bulk_cli.command('import-memberships')
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension')
+@click.option('--verbose', is_flag=True, help='Print a result for every row, not just failures')
+def import_memberships_command(path, fmt, verbose):
+    """Add channel memberships from a CSV or NDJSON file ('-' for stdin)"""
+    with _open_input(path) as stream:
+        _echo_results(bulk.import_memberships(bulk.parse_rows(stream, _detect_format(path, fmt))), verbose)
+
+@bulk_cli.command('export-users')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='ndjson')
+@click.option('--output', '-o', default='-', help='Output file, stdout by default')
+def export_users_command(fmt, output):
+    """Write all users as CSV or NDJSON"""
+    with click.open_file(output, 'w', encoding='utf-8') as out:
+        out.writelines(bulk.serialize(bulk.export_users(), fmt, bulk.USER_EXPORT_FIELDS))
+
+@bulk_cli.command('export-memberships')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='ndjson')
+@click.option('--output', '-o', default='-', help='Output file, stdout by default')
+def export_memberships_command(fmt, output):
+    """Write all channel memberships as CSV or NDJSON"""
+    with click.open_file(output, 'w', encoding='utf-8') as out:
+        out.writelines(bulk.serialize(bulk.export_memberships(), fmt, bulk.MEMBERSHIP_EXPORT_FIELDS))
+
+@bulk_cli.command('recount-members')
+@click.option('--channel-id', type=int, help='Only this channel')
+def recount_members_command(channel_id):
+    """Recompute channel member counts from the membership table"""
+    updated = membership.recount(channel_id)
+    db.session.commit()
+    click.echo(f"Recounted members of {updated} channel(s)")
+
+@activity_cli.command('export')
+@click.option('--channel-id', type=int)
+@click.option('--user-id', type=int)
+@click.option('--action', help='Comma separated actions, e.g. speak_start,speak_end')
+@click.option('--since', help='ISO timestamp, inclusive')
+@click.option('--until', help='ISO timestamp, exclusive')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='ndjson')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output')
+@click.option('--output', '-o', default='-', help='Output file, stdout by default')
+def export_activity_command(channel_id, user_id, action, since, until, fmt, compress, output):
+    """Write activity logs matching the filters as CSV or NDJSON"""
+    try:
+        filters = bulk.activity_filters({'channel_id': channel_id, 'user_id': user_id,
+                                         'action': action, 'since': since, 'until': until})
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    rows = bulk.serialize(bulk.export_activity(**filters), fmt, bulk.ACTIVITY_EXPORT_FIELDS)
+    if compress:
+        with click.open_file(output, 'wb') as out:
+            out.writelines(bulk.gzip_stream(rows))
+    else:
+        with click.open_file(output, 'w', encoding='utf-8') as out:
+            out.writelines(rows)
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create any missing database tables"""
+    db.create_all(bind_key=None)
+    click.echo("Database tables created")
+
+def register(app):
+    """Attach the command groups to the app's ``flask`` CLI"""
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(bulk_cli)
+    app.cli.add_command(activity_cli)
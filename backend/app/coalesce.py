@@ -0,0 +1,58 @@
+"""Opt-in coalescing of a speaker's audio frames into fewer packets.
+
+On channels with a coalescing interval, frames from a speaker are held
+for up to that many milliseconds and relayed as one packet. This trades
+a few ms of latency for far fewer packets and syscalls per listener. A
+batch is flushed early when it reaches COALESCE_MAX_FRAMES, and at once
+when the speaker stops talking.
+"""
+from app import socketio, metrics
+
+# Coalescing interval in ms per channel id (missing or 0 means off)
+channel_intervals = {}
+
+# Open batch per speaker socket id
+pending_batches = {}
+
+def add_frame(app, connection, socket_id, channel_id, audio_data, audio_format, interval_ms):
+    """Queue a frame, starting a flush timer for a new batch"""
+    batch = pending_batches.get(socket_id)
+    if batch is not None and (batch['channel_id'] != channel_id or batch['format'] != audio_format):
+        flush(socket_id)
+        batch = None
+
+    if batch is None:
+        batch = pending_batches[socket_id] = {
+            'connection': connection,
+            'channel_id': channel_id,
+            'format': audio_format,
+            'chunks': []
+        }
+        socketio.start_background_task(flush_later, app, socket_id, batch, interval_ms / 1000.0)
+
+    batch['chunks'].append(audio_data)
+    if len(batch['chunks']) >= app.config['COALESCE_MAX_FRAMES']:
+        flush(socket_id)
+
+def flush_later(app, socket_id, batch, delay):
+    """Flush a batch once its interval has passed, unless already flushed"""
+    socketio.sleep(delay)
+    if pending_batches.get(socket_id) is not batch:
+        return
+    with app.app_context():
+        try:
+            flush(socket_id)
+        except Exception as e:
+            app.logger.error(f"Audio batch flush error: {str(e)}")
+
+def flush(socket_id):
+    """Relay a speaker's pending frames as one packet"""
+    from app.websocket_events import relay_audio
+
+    batch = pending_batches.pop(socket_id, None)
+    if not batch or not batch['chunks']:
+        return
+
+    metrics.inc('audio_batches_sent')
+    metrics.observe('audio_batch_frames', len(batch['chunks']))
+    relay_audio(batch['connection'], socket_id, batch['channel_id'], batch['chunks'], batch['format'])
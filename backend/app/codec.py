@@ -0,0 +1,158 @@
+"""Optional server-side Opus codec stage for relayed audio.
+
+Speakers may send PCM (16-bit mono at AUDIO_SAMPLE_RATE) or Opus frames.
+Listeners that announce Opus support when joining a channel receive the
+audio re-encoded at the channel's target bitrate; listeners whose socket
+send queue is backing up are moved to a lower bitrate until they catch
+up. Everyone else keeps receiving the speaker's original payload.
+
+Under eventlet, encoding runs in eventlet's native thread pool so it never
+blocks the hub; in ASGI mode handlers already run in worker threads.
+"""
+import threading
+import time
+from app import socketio, metrics
+
+try:
+    import opuslib
+except Exception:  # ImportError, or libopus itself is missing
+    opuslib = None
+
+FRAME_MS = 20
+MAX_FRAME_MS = 120
+
+# Listener tiers: sid -> 'normal' or 'low', per channel
+codec_listeners = {}
+
+# Target bitrate per channel id, kept in sync on join and channel update
+channel_bitrates = {}
+
+# Per-speaker transcoder state, keyed by socket id
+transcoders = {}
+
+# Last time each channel's listener tiers were re-evaluated
+_tier_checked_at = {}
+
+# Guards codec_listeners
+_listeners_lock = threading.Lock()
+
+def available():
+    """Whether the Opus library could be loaded"""
+    return opuslib is not None
+
+def opus_room(channel_id, tier):
+    return f"channel_{channel_id}_opus_{tier}"
+
+def run_in_pool(fn, *args):
+    """Run CPU-bound codec work off the eventlet hub when possible"""
+    try:
+        from eventlet import patcher, tpool
+    except ImportError:
+        return fn(*args)
+    if not patcher.is_monkey_patched('thread'):
+        return fn(*args)
+    return tpool.execute(fn, *args)
+
+class SpeakerTranscoder:
+    """Decode/re-encode state for a single speaker"""
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * FRAME_MS // 1000
+        self.pending = b''
+        self.decoder = None
+        self.encoders = {}
+        self.lock = threading.Lock()
+
+    def _encoder(self, bitrate):
+        encoder = self.encoders.get(bitrate)
+        if encoder is None:
+            encoder = opuslib.Encoder(self.sample_rate, 1, opuslib.APPLICATION_VOIP)
+            encoder.bitrate = bitrate
+            self.encoders[bitrate] = encoder
+        return encoder
+
+    def _to_pcm(self, payload, audio_format):
+        if audio_format == 'pcm':
+            return payload
+        if self.decoder is None:
+            self.decoder = opuslib.Decoder(self.sample_rate, 1)
+        return self.decoder.decode(payload, self.sample_rate * MAX_FRAME_MS // 1000)
+
+    def transcode(self, payload, audio_format, bitrates):
+        """Encode whole 20ms frames at each bitrate, buffering the remainder"""
+        pcm = self.pending + self._to_pcm(payload, audio_format)
+        frame_bytes = self.frame_samples * 2
+        count = len(pcm) // frame_bytes
+        self.pending = pcm[count * frame_bytes:]
+
+        frames = [pcm[i * frame_bytes:(i + 1) * frame_bytes] for i in range(count)]
+        return {
+            bitrate: [self._encoder(bitrate).encode(frame, self.frame_samples) for frame in frames]
+            for bitrate in bitrates
+        }
+
+def transcode(socket_id, payload, audio_format, bitrates, sample_rate):
+    """Transcode a speaker's chunk, returning Opus packets per bitrate"""
+    transcoder = transcoders.get(socket_id)
+    if transcoder is None:
+        transcoder = transcoders[socket_id] = SpeakerTranscoder(sample_rate)
+
+    start = time.perf_counter()
+    with transcoder.lock:
+        packets = run_in_pool(transcoder.transcode, payload, audio_format, bitrates)
+    metrics.observe('codec_transcode_seconds', time.perf_counter() - start)
+    return packets
+
+def release_speaker(socket_id):
+    """Drop a speaker's codec state when they stop talking"""
+    transcoders.pop(socket_id, None)
+
+def add_listener(channel_id, socket_id):
+    """Register an Opus-capable listener in a channel"""
+    with _listeners_lock:
+        codec_listeners.setdefault(channel_id, {})[socket_id] = 'normal'
+    socketio.server.enter_room(socket_id, opus_room(channel_id, 'normal'), namespace='/')
+
+def remove_listener(channel_id, socket_id):
+    """Unregister a listener (its codec rooms are left with the socket)"""
+    with _listeners_lock:
+        listeners = codec_listeners.get(channel_id)
+        if not listeners:
+            return
+        tier = listeners.pop(socket_id, None)
+        if not listeners:
+            del codec_listeners[channel_id]
+    if tier:
+        socketio.server.leave_room(socket_id, opus_room(channel_id, tier), namespace='/')
+
+def send_backlog(socket_id):
+    """Number of packets waiting in a socket's engine.io send queue"""
+    server = socketio.server
+    eio_sid = server.manager.eio_sid_from_sid(socket_id, '/')
+    eio_socket = server.eio.sockets.get(eio_sid) if eio_sid else None
+    return eio_socket.queue.qsize() if eio_socket else 0
+
+def refresh_tiers(channel_id, threshold, interval=1.0):
+    """Move listeners between bitrate tiers based on their send backlog"""
+    now = time.monotonic()
+    if now - _tier_checked_at.get(channel_id, 0) < interval:
+        return
+    _tier_checked_at[channel_id] = now
+
+    with _listeners_lock:
+        listeners = list(codec_listeners.get(channel_id, {}).items())
+    for socket_id, tier in listeners:
+        backlog = send_backlog(socket_id)
+        new_tier = 'low' if backlog > threshold else 'normal' if backlog < threshold // 2 else tier
+        if new_tier == tier:
+            continue
+        with _listeners_lock:
+            # Skip listeners that left in the meantime
+            current = codec_listeners.get(channel_id, {})
+            if current.get(socket_id) != tier:
+                continue
+            current[socket_id] = new_tier
+        socketio.server.leave_room(socket_id, opus_room(channel_id, tier), namespace='/')
+        socketio.server.enter_room(socket_id, opus_room(channel_id, new_tier), namespace='/')
+        metrics.inc('codec_tier_changes', tier=new_tier)
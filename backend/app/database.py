@@ -0,0 +1,155 @@
+"""Database engine tuning, read-replica routing and pool instrumentation"""
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.pool import NullPool, QueuePool
+from app import metrics
+
+# Last replica health check, shared by all requests in this process
+_replica_state = {'checked_at': None, 'usable': False}
+
+class RoutingSession(Session):
+    """Session sending reads from replica-enabled views to the replica bind.
+
+    Writes and flushes always go to the primary, as does everything when
+    the replica is unreachable or lagging more than allowed.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() \
+                and g.get('db_read_replica'):
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                if replica_usable(replica):
+                    g.db_replica_used = True
+                    return replica
+                metrics.inc('db_replica_fallbacks')
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def read_replica(f):
+    """Decorator routing a read-only view's queries to the replica"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        g.db_read_replica = True
+        return f(*args, **kwargs)
+    return decorated
+
+def replica_usable(engine):
+    """Whether the replica is reachable and within the allowed lag"""
+    now = time.monotonic()
+    checked_at = _replica_state['checked_at']
+    if checked_at is not None and now - checked_at < current_app.config['DB_REPLICA_CHECK_INTERVAL']:
+        return _replica_state['usable']
+
+    _replica_state['checked_at'] = now
+    try:
+        with engine.connect() as conn:
+            lag = replica_lag(conn)
+        usable = lag <= current_app.config['DB_REPLICA_MAX_LAG_SECONDS']
+        if not usable:
+            current_app.logger.warning(f"Read replica lagging {lag:.1f}s, using primary")
+    except Exception as e:
+        current_app.logger.warning(f"Read replica unavailable: {e}. Using primary.")
+        usable = False
+
+    _replica_state['usable'] = usable
+    metrics.set_gauge('db_replica_usable', int(usable))
+    return usable
+
+def replica_lag(conn):
+    """Replication lag in seconds (always 0 for non-Postgres replicas)"""
+    if conn.dialect.name != 'postgresql':
+        conn.execute(text('SELECT 1'))
+        return 0.0
+
+    # A fully replayed replica reports no lag even if the primary is idle
+    lag = conn.execute(text(
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+    )).scalar()
+    return float(lag or 0)
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that reports how long callers wait for a connection.
+
+    Under eventlet the pool's queue is monkey patched, so a caller waiting
+    for a connection only blocks its own greenlet.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe('db_pool_wait_seconds', time.perf_counter() - start)
+
+def build_engine_options(config):
+    """SQLAlchemy engine options from the DB_* config settings"""
+    uri = config.get('SQLALCHEMY_DATABASE_URI') or ''
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+
+    if uri.startswith('sqlite'):
+        return options
+
+    options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+
+    if config['DB_PGBOUNCER']:
+        # PgBouncer does the pooling; keep no idle connections here and
+        # leave statement_timeout to the PgBouncer role settings, since
+        # startup options are not forwarded in transaction pooling mode
+        options.setdefault('poolclass', NullPool)
+        return options
+
+    options.setdefault('poolclass', InstrumentedQueuePool)
+    options.setdefault('pool_size', config['DB_POOL_SIZE'])
+    options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+    options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+
+    statement_timeout = config['DB_STATEMENT_TIMEOUT_MS']
+    if statement_timeout and uri.startswith('postgres'):
+        connect_args = options.setdefault('connect_args', {})
+        connect_args.setdefault('options', f"-c statement_timeout={statement_timeout}")
+
+    return options
+
+def instrument_engine(engine):
+    """Track checkout duration and pool occupancy for an engine"""
+    pool = engine.pool
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checkout_time'] = time.perf_counter()
+        metrics.inc('db_pool_checkouts')
+        if hasattr(pool, 'checkedout'):
+            metrics.set_gauge('db_pool_checked_out', pool.checkedout())
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop('checkout_time', None)
+        if started is not None:
+            metrics.observe('db_checkout_seconds', time.perf_counter() - started)
+        if hasattr(pool, 'checkedout'):
+            metrics.set_gauge('db_pool_checked_out', pool.checkedout())
+
+def insert_ignore(table, dialect_name):
+    """INSERT that skips rows conflicting with a unique constraint"""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing()
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(table).on_conflict_do_nothing()
+    raise NotImplementedError(f"Bulk insert is not supported on {dialect_name}")
+
+def release_connection():
+    """Return the session's connection to the pool before slow socket I/O.
+
+    Call this after the data for an emit has been serialized: objects
+    already loaded stay usable, and the next query checks out a fresh
+    connection.
+    """
+    from app import db
+    db.session.close()
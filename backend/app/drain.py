@@ -0,0 +1,177 @@
+"""Graceful drain of a node before it is stopped or restarted.
+
+Draining starts on DRAIN_SIGNAL (SIGTERM by default, which is what
+Docker and gunicorn send on stop) or through ``POST /api/drain``. The
+node then fails ``/api/health`` so the load balancer stops routing to
+it, and refuses new sockets with a ``retry_after_ms`` hint.
+
+Connected clients are not all dropped at once, which would have them
+reconnect, authenticate and rejoin elsewhere in the same second. Each
+socket gets a ``server_draining`` event with its own random
+``reconnect_in_ms`` within DRAIN_SPREAD_SECONDS; clients that handle it
+reconnect to another node at that time, and the node disconnects any
+still connected DRAIN_CLIENT_GRACE_SECONDS later. Sessions end at once
+rather than being held for resumption, since they cannot resume here.
+
+Once every socket is gone, or DRAIN_TIMEOUT_SECONDS have passed, held
+stops and audio batches are written out and the node leaves the channel
+ring. A drain started by the signal then exits the process through the
+signal's previous handler. A drain started through the API leaves the
+process running, still failing health checks and refusing sockets:
+exiting there would only have gunicorn's master start a fresh worker in
+its place. The node is stopped with the signal as usual, which then
+exits at once.
+"""
+import os
+import random
+import signal
+import time
+from app import socketio, metrics
+
+# Drain progress: started_at and deadline (time.monotonic) once draining,
+# exit when the process should end afterwards, finished once drained
+drain_state = {}
+
+# Handlers last replaced by install_signal_handler, by signal number
+_previous_handlers = {}
+
+def draining():
+    return 'started_at' in drain_state
+
+def retry_hint(app):
+    """A jittered delay in ms before a client retries against another node"""
+    return int(random.uniform(0, app.config['DRAIN_SPREAD_SECONDS']) * 1000)
+
+def status():
+    if not draining():
+        return {'draining': False}
+    from app.websocket_events import active_connections
+    return {
+        'draining': True,
+        'elapsed_seconds': round(time.monotonic() - drain_state['started_at'], 1),
+        'remaining_seconds': round(max(0.0, drain_state['deadline'] - time.monotonic()), 1),
+        'connections': len(active_connections)
+    }
+
+def start(app, reason, exit_when_done=False):
+    """Begin draining this node, returns False when it already is"""
+    if draining():
+        # A stop signal during an API drain still ends the process
+        if exit_when_done:
+            drain_state['exit'] = True
+        return False
+    now = time.monotonic()
+    drain_state.update(started_at=now, deadline=now + app.config['DRAIN_TIMEOUT_SECONDS'],
+                       exit=exit_when_done)
+    metrics.set_gauge('node_draining', 1)
+    app.logger.warning(f"Draining node {app.config['INSTANCE_ID']} ({reason})")
+    socketio.start_background_task(run_drain, app)
+    return True
+
+def install_signal_handler(app):
+    """Drain on DRAIN_SIGNAL, handing the signal on to the handler it replaced once done.
+
+    Servers that install their own handler when they start serving
+    (uvicorn) need this called again afterwards; each installation hands
+    on to the handler it replaced, so the server's shutdown and whatever
+    it restores on exit still run.
+    """
+    name = app.config['DRAIN_SIGNAL']
+    if not name:
+        return
+    signum = getattr(signal, name)
+    replaced = {}
+
+    def handle(signum, frame):
+        if not drain_state.get('finished'):
+            start(app, f"received {name}", exit_when_done=True)
+            return
+        # Drained: do what the signal would have done without us
+        previous = replaced['handler']
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    try:
+        replaced['handler'] = _previous_handlers[signum] = signal.signal(signum, handle)
+    except ValueError:
+        # Not the main thread, e.g. under a threaded test runner
+        app.logger.warning(f"Cannot install {name} handler, drain only via /api/drain")
+
+def run_drain(app):
+    """Move clients off this node in a spread-out order, then exit if asked to"""
+    from app.websocket_events import active_connections, resumable_sessions, end_session
+
+    with app.app_context():
+        try:
+            # Held sessions cannot be resumed once new sockets are refused
+            for resume_token in list(resumable_sessions):
+                connection = resumable_sessions.pop(resume_token, None)
+                if connection is not None:
+                    end_session(connection)
+        except Exception as e:
+            app.logger.error(f"Drain session cleanup error: {str(e)}")
+
+    spread = app.config['DRAIN_SPREAD_SECONDS']
+    schedule = sorted((random.uniform(0, spread), socket_id) for socket_id in list(active_connections))
+    for offset, socket_id in schedule:
+        socketio.emit('server_draining', {
+            'reconnect_in_ms': int(offset * 1000),
+            'deadline_ms': int((drain_state['deadline'] - time.monotonic()) * 1000)
+        }, to=socket_id)
+
+    # Disconnect clients that did not move on their own, in the same order
+    grace = app.config['DRAIN_CLIENT_GRACE_SECONDS']
+    for offset, socket_id in schedule:
+        delay = drain_state['started_at'] + offset + grace - time.monotonic()
+        if time.monotonic() + max(delay, 0) >= drain_state['deadline']:
+            break
+        if delay > 0:
+            socketio.sleep(delay)
+        if socket_id in active_connections:
+            disconnect(app, socket_id)
+
+    while active_connections and time.monotonic() < drain_state['deadline']:
+        socketio.sleep(0.5)
+    for socket_id in list(active_connections):
+        disconnect(app, socket_id)
+
+    finish(app)
+    if not drain_state['exit']:
+        drain_state['finished'] = True
+        app.logger.warning(f"Drain of node {app.config['INSTANCE_ID']} complete, "
+                           f"waiting to be stopped")
+        return
+    app.logger.warning(f"Drain of node {app.config['INSTANCE_ID']} complete, exiting")
+    exit_process()
+
+def disconnect(app, socket_id):
+    try:
+        socketio.server.disconnect(socket_id, namespace='/')
+        metrics.inc('drain_disconnects')
+    except Exception as e:
+        app.logger.error(f"Drain disconnect error: {str(e)}")
+
+def finish(app):
+    """Write out buffered state and leave the channel ring"""
+    from app import coalesce, speaking, sharding, capture, outbox
+
+    with app.app_context():
+        try:
+            for socket_id in list(coalesce.pending_batches):
+                coalesce.flush(socket_id)
+            for session_id in list(speaking.pending_stops):
+                speaking.write_stop(app, speaking.pending_stops.pop(session_id))
+        except Exception as e:
+            app.logger.error(f"Drain flush error: {str(e)}")
+        if outbox.queue:
+            outbox.flush(app)
+        sharding.leave(app)
+    capture.close()
+
+def exit_process():
+    """Re-raise the drain signal, now handled as if no drain was installed"""
+    drain_state['finished'] = True
+    os.kill(os.getpid(), next(iter(_previous_handlers), signal.SIGTERM))
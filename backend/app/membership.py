@@ -0,0 +1,94 @@
+"""Channel membership checks and changes without loading member lists.
+
+Membership is tested with an indexed existence query, or against a
+cached set of member ids per channel that is validated with the
+``members:<channel id>`` cache version. ``Channel.member_count`` is kept
+in step with the ``user_channels`` rows in the same transaction, so the
+capacity check is a single conditional UPDATE. All changes register
+their cache keys on the session, and those keys are bumped only when the
+transaction commits.
+"""
+from datetime import datetime
+from sqlalchemy import delete, exists, func, insert, select, update
+from app import db, cache
+from app.models import Channel, user_channels
+
+channels_table = Channel.__table__
+
+# Member ids per channel id: (version, frozenset of user ids)
+_member_cache = {}
+
+def _touch(channel_id):
+    """Invalidate a channel's cached members and responses on commit"""
+    db.session.info.setdefault('cache_keys', set()).update(
+        ('channels', f'channel:{channel_id}', f'members:{channel_id}'))
+
+def is_member(channel_id, user_id):
+    """Whether a user belongs to a channel, read from the database"""
+    return db.session.query(exists().where(
+        user_channels.c.channel_id == channel_id,
+        user_channels.c.user_id == user_id
+    )).scalar()
+
+def member_ids(channel_id):
+    """Cached set of a channel's member ids"""
+    version = cache.get_versions([f'members:{channel_id}'])[0][0]
+    cached = _member_cache.get(channel_id)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    ids = frozenset(db.session.scalars(
+        select(user_channels.c.user_id).where(user_channels.c.channel_id == channel_id)))
+    _member_cache[channel_id] = (version, ids)
+    return ids
+
+def add_member(channel_id, user_id, enforce_capacity=True):
+    """Add a membership, returning False when the channel is full.
+
+    The caller commits. Checking and incrementing the counter in one
+    UPDATE keeps concurrent joins from overfilling the channel.
+    """
+    statement = update(channels_table).where(channels_table.c.id == channel_id)\
+        .values(member_count=channels_table.c.member_count + 1)
+    if enforce_capacity:
+        statement = statement.where(channels_table.c.member_count < channels_table.c.max_users)
+    if db.session.execute(statement).rowcount == 0:
+        return False
+
+    db.session.execute(insert(user_channels).values(
+        user_id=user_id, channel_id=channel_id, joined_at=datetime.utcnow()))
+    _touch(channel_id)
+    return True
+
+def remove_member(channel_id, user_id):
+    """Remove a membership, returning False if there was none. The caller commits."""
+    result = db.session.execute(delete(user_channels).where(
+        user_channels.c.channel_id == channel_id,
+        user_channels.c.user_id == user_id
+    ))
+    if result.rowcount == 0:
+        return False
+
+    db.session.execute(update(channels_table).where(channels_table.c.id == channel_id)
+                       .values(member_count=channels_table.c.member_count - 1))
+    _touch(channel_id)
+    return True
+
+def added_members(counts):
+    """Account for memberships inserted in bulk, given {channel id: new members}"""
+    for channel_id, count in counts.items():
+        db.session.execute(update(channels_table).where(channels_table.c.id == channel_id)
+                           .values(member_count=channels_table.c.member_count + count))
+        _touch(channel_id)
+
+def recount(channel_id=None):
+    """Recompute member_count from user_channels, for one or all channels. The caller commits."""
+    count = select(func.count()).where(user_channels.c.channel_id == channels_table.c.id)\
+        .scalar_subquery()
+    statement = update(channels_table).values(member_count=count)
+    if channel_id is not None:
+        statement = statement.where(channels_table.c.id == channel_id)
+    updated = db.session.execute(statement).rowcount
+    db.session.info.setdefault('cache_keys', set()).update(('channels', 'channel:*'))
+    _member_cache.clear()
+    return updated
@@ -0,0 +1,141 @@
+"""Audio level metering and per-transmission quality stats.
+
+Every frame a speaker sends is folded into running totals for the
+current transmission: frame and byte counts, the gaps between frame
+arrivals and, for PCM frames, the sum of squares, peak and number of
+clipped samples, computed with numpy over the whole frame. Nothing is
+kept per frame, so memory stays constant however long someone talks.
+
+When the transmission's speak_end row is written, the totals are turned
+into RMS and peak levels in dBFS, a clipping ratio and gap statistics
+and stored in its ``extra_data`` under ``audio_quality``. A transmission
+merged by the speaking debounce is metered as one.
+
+Opus frames are not decoded for metering; they get byte and gap stats
+only. Without numpy, PCM frames are handled the same way.
+"""
+import base64
+import binascii
+import math
+import time
+from app import metrics
+
+FULL_SCALE = 32768.0
+
+# Open meter per session id, created by a speaker's first frame
+meters = {}
+
+# numpy is slow to import and only needed once audio flows
+_numpy = {}
+
+def _np():
+    if 'module' not in _numpy:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy['module'] = numpy
+    return _numpy['module']
+
+class TransmissionMeter:
+    """Running audio stats for one transmission"""
+
+    __slots__ = ('format', 'frames', 'bytes', 'samples', 'sum_squares', 'peak', 'clipped',
+                 'last_frame_at', 'gaps', 'gap_sum', 'gap_sum_squares', 'gap_max')
+
+    def __init__(self, audio_format):
+        self.format = audio_format
+        self.frames = 0
+        self.bytes = 0
+        self.samples = 0
+        self.sum_squares = 0.0
+        self.peak = 0
+        self.clipped = 0
+        self.last_frame_at = None
+        self.gaps = 0
+        self.gap_sum = 0.0
+        self.gap_sum_squares = 0.0
+        self.gap_max = 0.0
+
+    def add_frame(self, data, received_at):
+        self.frames += 1
+        self.bytes += len(data)
+        if self.last_frame_at is not None:
+            gap = (received_at - self.last_frame_at) * 1000
+            self.gaps += 1
+            self.gap_sum += gap
+            self.gap_sum_squares += gap * gap
+            self.gap_max = max(self.gap_max, gap)
+        self.last_frame_at = received_at
+
+    def add_pcm(self, np, pcm, clip_level):
+        """Fold a frame of 16-bit little-endian PCM into the level totals"""
+        samples = np.frombuffer(pcm, dtype='<i2', count=len(pcm) // 2).astype(np.float64)
+        if not samples.size:
+            return
+        magnitudes = np.abs(samples)
+        self.samples += samples.size
+        self.sum_squares += float(np.dot(samples, samples))
+        self.peak = max(self.peak, int(magnitudes.max()))
+        self.clipped += int(np.count_nonzero(magnitudes >= clip_level))
+
+    def summary(self, sample_rate):
+        stats = {'format': self.format, 'frames': self.frames, 'bytes': self.bytes}
+        if self.samples:
+            rms = math.sqrt(self.sum_squares / self.samples)
+            stats.update(
+                audio_seconds=round(self.samples / sample_rate, 3),
+                rms_dbfs=dbfs(rms),
+                peak_dbfs=dbfs(self.peak),
+                clipping_ratio=round(self.clipped / self.samples, 6)
+            )
+        if self.gaps:
+            mean = self.gap_sum / self.gaps
+            variance = max(0.0, self.gap_sum_squares / self.gaps - mean * mean)
+            stats.update(
+                gap_ms_mean=round(mean, 2),
+                gap_ms_max=round(self.gap_max, 2),
+                gap_ms_jitter=round(math.sqrt(variance), 2)
+            )
+        return stats
+
+def dbfs(level):
+    """A sample level in dB relative to full scale, None for silence"""
+    return round(20 * math.log10(level / FULL_SCALE), 2) if level else None
+
+def add(config, session_id, audio_data, audio_format):
+    """Meter one accepted frame from a speaker"""
+    if not config['AUDIO_METERING']:
+        return
+    meter = meters.get(session_id)
+    if meter is None:
+        meter = meters[session_id] = TransmissionMeter(audio_format)
+
+    if isinstance(audio_data, str):
+        try:
+            data = base64.b64decode(audio_data)
+        except (binascii.Error, ValueError):
+            metrics.inc('audio_meter_errors')
+            return
+    else:
+        data = audio_data
+    meter.add_frame(data, time.monotonic())
+
+    if audio_format == 'pcm':
+        np = _np()
+        if np is not None:
+            meter.add_pcm(np, data, config['AUDIO_CLIP_LEVEL'])
+
+def finish(config, session_id):
+    """Close a transmission's meter, returning its extra_data or None"""
+    meter = meters.pop(session_id, None)
+    if meter is None or not meter.frames:
+        return None
+    summary = meter.summary(config['AUDIO_SAMPLE_RATE'])
+    if meter.samples:
+        metrics.observe('audio_clipping_ratio', summary['clipping_ratio'])
+    return {'audio_quality': summary}
+
+def discard(session_id):
+    """Drop a meter whose transmission will not be written"""
+    meters.pop(session_id, None)
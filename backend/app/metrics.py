@@ -0,0 +1,63 @@
+"""In-process metrics registry exported in Prometheus text format"""
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_summaries = {}
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())) if labels else ())
+
+def inc(name, value=1, **labels):
+    """Increment a counter"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to the given value"""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name, value, **labels):
+    """Record an observation (count, sum and max are kept)"""
+    key = _key(name, labels)
+    with _lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            _summaries[key] = [1, value, value]
+        else:
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+def get_counter(name, **labels):
+    """Current value of a counter"""
+    return _counters.get(_key(name, labels), 0)
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+def render():
+    """Render all metrics in Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            lines.append(f"ptt_{name}_total{_format_labels(labels)} {value}")
+        for (name, labels), value in sorted(_gauges.items()):
+            lines.append(f"ptt_{name}{_format_labels(labels)} {value}")
+        for (name, labels), (count, total, peak) in sorted(_summaries.items()):
+            lines.append(f"ptt_{name}_count{_format_labels(labels)} {count}")
+            lines.append(f"ptt_{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"ptt_{name}_max{_format_labels(labels)} {peak}")
+    return '\n'.join(lines) + '\n'
+
+def reset():
+    """Clear all metrics"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _summaries.clear()
@@ -2,12 +2,15 @@ from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from app.serialization import model_serializer
 
 # Association table for many-to-many relationship between users and channels
 user_channels = db.Table('user_channels',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
     db.Column('channel_id', db.Integer, db.ForeignKey('channels.id'), primary_key=True),
-    db.Column('joined_at', db.DateTime, default=datetime.utcnow)
+    db.Column('joined_at', db.DateTime, default=datetime.utcnow),
+    # Channel-first lookups (member lists and membership checks)
+    db.Index('ix_user_channels_channel_user', 'channel_id', 'user_id')
 )
 
 class User(db.Model):
@@ -32,16 +35,9 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'username': self.username,
-            'email': self.email,
-            'is_admin': self.is_admin,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'last_seen': self.last_seen.isoformat() if self.last_seen else None
-        }
+    to_dict = model_serializer(
+        ('id', 'username', 'email', 'is_admin', 'is_active', 'created_at', 'last_seen'),
+        timestamps=('created_at', 'last_seen'))
 
 class Channel(db.Model):
     __tablename__ = 'channels'
@@ -51,6 +47,10 @@ class Channel(db.Model):
     description = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
     max_users = db.Column(db.Integer, default=50)
+    member_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # Kept in step with user_channels
+    audio_bitrate = db.Column(db.Integer)  # Opus target bitrate, None for the server default
+    coalesce_ms = db.Column(db.Integer)  # Audio frame batching interval, None to relay each frame
+    channel_type = db.Column(db.String(20), default='standard', server_default='standard', nullable=False)  # 'standard' or 'broadcast'
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -58,20 +58,18 @@ class Channel(db.Model):
     creator = db.relationship('User', backref='created_channels')
     activity_logs = db.relationship('ActivityLog', backref='channel', lazy='dynamic')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'is_active': self.is_active,
-            'max_users': self.max_users,
-            'created_by': self.created_by,
-            'created_at': self.created_at.isoformat(),
-            'member_count': len(self.members)
-        }
+    to_dict = model_serializer(
+        ('id', 'name', 'description', 'is_active', 'max_users', 'audio_bitrate', 'coalesce_ms',
+         'channel_type', 'created_by', 'created_at', 'member_count'),
+        timestamps=('created_at',))
 
 class ActivityLog(db.Model):
     __tablename__ = 'activity_logs'
+    __table_args__ = (
+        # Time-range reads for one channel or user (exports, talk stats)
+        db.Index('ix_activity_logs_channel_timestamp', 'channel_id', 'timestamp'),
+        db.Index('ix_activity_logs_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -81,16 +79,9 @@ class ActivityLog(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     extra_data = db.Column(db.JSON)  # Additional data like audio quality, etc.
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'channel_id': self.channel_id,
-            'action': self.action,
-            'duration': self.duration,
-            'timestamp': self.timestamp.isoformat(),
-            'extra_data': self.extra_data
-        }
+    to_dict = model_serializer(
+        ('id', 'user_id', 'channel_id', 'action', 'duration', 'timestamp', 'extra_data'),
+        timestamps=('timestamp',))
 
 class OnlineUser(db.Model):
     __tablename__ = 'online_users'
@@ -99,22 +90,20 @@ class OnlineUser(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     channel_id = db.Column(db.Integer, db.ForeignKey('channels.id'), nullable=True)
     socket_id = db.Column(db.String(100), nullable=False, unique=True)
+    instance_id = db.Column(db.String(100), index=True)  # Backend node owning the socket
     is_speaking = db.Column(db.Boolean, default=False)
     joined_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_activity = db.Column(db.DateTime, default=datetime.utcnow)
+    last_activity = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
     user = db.relationship('User', backref='online_sessions')
     channel = db.relationship('Channel', backref='online_users')
     
+    _fields = model_serializer(
+        ('id', 'user_id', 'channel_id', 'socket_id', 'is_speaking', 'joined_at', 'last_activity'),
+        timestamps=('joined_at', 'last_activity'))
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'channel_id': self.channel_id,
-            'socket_id': self.socket_id,
-            'is_speaking': self.is_speaking,
-            'joined_at': self.joined_at.isoformat(),
-            'last_activity': self.last_activity.isoformat(),
-            'user': self.user.to_dict() if self.user else None
-        }
+        data = self._fields()
+        data['user'] = self.user.to_dict() if self.user else None
+        return data
@@ -0,0 +1,91 @@
+"""Outbound Redis batching.
+
+Channel events for other nodes (audio frames, speaking changes) and this
+node's channel registrations are not sent from the handler that produced
+them. They are queued here, and a single flusher task sends them in
+order through one non-transactional pipeline per batch: after
+REDIS_BATCH_INTERVAL_MS, or at once when REDIS_BATCH_MAX_ITEMS are
+waiting. A busy channel then costs one round trip per batch instead of
+one per frame, and handlers never wait on Redis.
+
+The queue holds at most REDIS_BATCH_QUEUE_LIMIT publishes; past that the
+oldest publish is dropped, since late audio is worthless. Registrations
+are never dropped. When a batch fails (e.g. Redis restarted) its
+registrations are requeued, its publishes dropped, and the flusher backs
+off before retrying; the connection pool reconnects on the next batch.
+"""
+import threading
+from collections import deque
+from app import socketio, get_redis_client, metrics
+
+# Queued commands: (method, args, droppable)
+queue = deque()
+
+# Guards the queue and the flusher flag
+_lock = threading.Lock()
+_flusher = {'running': False}
+
+def publish(app, channel, data):
+    """Queue a PUBLISH, dropping the oldest publish if the queue is full"""
+    _enqueue(app, ('publish', (channel, data), True), app.config['REDIS_BATCH_QUEUE_LIMIT'])
+
+def command(app, method, *args):
+    """Queue any other pipeline command; these are never dropped"""
+    _enqueue(app, (method, args, False))
+
+def _enqueue(app, item, limit=None):
+    with _lock:
+        if limit is not None and len(queue) >= limit:
+            metrics.inc('redis_batch_dropped')
+            # Registrations may sit ahead of it; the new publish goes only
+            # if nothing else can
+            oldest = next((queued for queued in queue if queued[2]), None)
+            if oldest is None:
+                return
+            queue.remove(oldest)
+        queue.append(item)
+        if _flusher['running']:
+            return
+        _flusher['running'] = True
+    socketio.start_background_task(run_flusher, app)
+
+def run_flusher(app):
+    """Send queued commands batch by batch until the queue is empty"""
+    interval = app.config['REDIS_BATCH_INTERVAL_MS'] / 1000.0
+    max_items = app.config['REDIS_BATCH_MAX_ITEMS']
+    backoff = 0.0
+    while True:
+        # Let more commands gather unless a full batch is already waiting
+        if len(queue) < max_items:
+            socketio.sleep(max(interval, backoff))
+        with _lock:
+            if not queue:
+                _flusher['running'] = False
+                return
+        backoff = 0.0 if flush(app, max_items) else min(max(backoff * 2, 0.05), 1.0)
+
+def flush(app, max_items=None):
+    """Send up to max_items queued commands (all when None), returns False on failure"""
+    with _lock:
+        count = len(queue) if max_items is None else min(max_items, len(queue))
+        batch = [queue.popleft() for _ in range(count)]
+    if not batch:
+        return True
+
+    redis_client = get_redis_client()
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for method, args, _ in batch:
+            getattr(pipe, method)(*args)
+        pipe.execute()
+        metrics.inc('redis_batches_sent')
+        metrics.observe('redis_batch_size', len(batch))
+        return True
+    except Exception as e:
+        kept = [item for item in batch if not item[2]]
+        with _lock:
+            queue.extendleft(reversed(kept))
+        metrics.inc('redis_batch_errors')
+        metrics.inc('redis_batch_dropped', len(batch) - len(kept))
+        app.logger.warning(f"Redis batch of {len(batch)} failed, {len(kept)} requeued: {e}")
+        return False
@@ -0,0 +1,242 @@
+"""Presence: the online-user view sent to clients, and expiry of dead
+sockets and stale online_users rows.
+
+A channel's online users are read with one joined, column-only query and
+serialized as a presence view: the OnlineUser fields plus the user
+fields clients render, without email or admin flags.
+
+Each node owns the OnlineUser rows it creates (``instance_id``) and keeps
+their ``last_activity`` fresh in batches while the sockets are alive.
+Rows that stop being refreshed - because a node crashed or a disconnect
+handler failed - are expired by whichever node notices first.
+"""
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app import db, socketio, get_redis_client
+from app.models import User, OnlineUser, ActivityLog
+from app.serialization import model_serializer
+
+PRESENCE_COLUMNS = (
+    OnlineUser.id, OnlineUser.user_id, OnlineUser.channel_id, OnlineUser.socket_id,
+    OnlineUser.is_speaking, OnlineUser.joined_at, OnlineUser.last_activity,
+    User.username, User.is_active, User.created_at, User.last_seen
+)
+
+_presence_fields = model_serializer(
+    ('id', 'user_id', 'channel_id', 'socket_id', 'is_speaking', 'joined_at', 'last_activity'),
+    timestamps=('joined_at', 'last_activity'))
+
+_presence_user_fields = model_serializer(
+    ('username', 'is_active', 'created_at', 'last_seen'),
+    timestamps=('created_at', 'last_seen'))
+
+def presence_view(row):
+    """Serialize a row of PRESENCE_COLUMNS"""
+    data = _presence_fields(row)
+    user = _presence_user_fields(row)
+    user['id'] = row.user_id
+    data['user'] = user
+    return data
+
+def channel_presence(channel_id):
+    """Presence views of a channel's online users, in one query"""
+    rows = db.session.execute(
+        select(*PRESENCE_COLUMNS)
+        .join(User, User.id == OnlineUser.user_id)
+        .where(OnlineUser.channel_id == channel_id)
+        .order_by(OnlineUser.id))
+    return [presence_view(row) for row in rows]
+
+def instance_key(instance_id):
+    """Redis key holding a node's liveness heartbeat"""
+    return f"ptt:instance:{instance_id}"
+
+def start_reaper(app):
+    """Advertise this node, clean up after a previous run under a pinned
+    INSTANCE_ID and start the heartbeat and reaper loop"""
+    # Peers expire rows of nodes without a heartbeat, so write it before
+    # this node creates any
+    write_heartbeat(app)
+    with app.app_context():
+        try:
+            release_instance_rows(app.config['INSTANCE_ID'])
+        except Exception as e:
+            app.logger.error(f"Presence startup cleanup error: {str(e)}")
+            db.session.rollback()
+
+    socketio.start_background_task(run_reaper, app)
+
+def run_reaper(app):
+    """Background loop refreshing the heartbeat and, unless disabled, reaping once per interval"""
+    interval = app.config.get('PRESENCE_REAPER_INTERVAL', 0)
+    # The heartbeat must be refreshed well before it expires, whatever the reaper does
+    heartbeat_interval = app.config['PRESENCE_TIMEOUT_SECONDS'] / 3
+    step = min(interval, heartbeat_interval) if interval > 0 else heartbeat_interval
+    next_reap = 0.0
+    while True:
+        with app.app_context():
+            try:
+                if interval > 0 and time.monotonic() >= next_reap:
+                    next_reap = time.monotonic() + interval
+                    reap(app)
+                else:
+                    write_heartbeat(app)
+            except Exception as e:
+                app.logger.error(f"Presence reaper error: {str(e)}")
+                db.session.rollback()
+        socketio.sleep(step)
+
+def reap(app):
+    """Run a single reaper pass"""
+    now = datetime.utcnow()
+    timeout = timedelta(seconds=app.config['PRESENCE_TIMEOUT_SECONDS'])
+
+    reaped = reap_dead_connections(now - timeout)
+    touch_live_sessions(app, now)
+    expired = expire_stale_rows(app, now - timeout)
+
+    if reaped or expired:
+        app.logger.info(f"Presence reaper removed {reaped} connections and {expired} stale rows")
+
+def reap_dead_connections(cutoff):
+    """End sessions whose socket engine.io dropped or whose heartbeats stopped"""
+    from app.websocket_events import active_connections, release_socket, end_session
+
+    reaped = 0
+    for socket_id, connection in list(active_connections.items()):
+        last_heartbeat = connection.get('last_heartbeat')
+        alive = socketio.server.manager.is_connected(socket_id, '/')
+        if alive and (last_heartbeat is None or last_heartbeat >= cutoff):
+            continue
+
+        # handle_disconnect will not find the connection, so clean up for it
+        # (unless it claimed the connection first)
+        if active_connections.pop(socket_id, None) is None:
+            continue
+        release_socket(socket_id, connection)
+        if connection['is_speaking']:
+            socketio.emit('user_speaking', {
+                'user_id': connection['user_id'],
+                'username': connection['user'].username,
+                'is_speaking': False
+            }, room=f"channel_{connection['channel_id']}")
+        end_session(connection)
+        if alive:
+            socketio.server.disconnect(socket_id)
+        reaped += 1
+
+    return reaped
+
+def touch_live_sessions(app, now):
+    """Refresh last_activity of rows for sessions this node still holds"""
+    from app.websocket_events import active_connections, resumable_sessions
+
+    session_ids = [c['session_id'] for c in active_connections.values() if c['channel_id']]
+    session_ids += [c['session_id'] for c in resumable_sessions.values()]
+
+    batch_size = app.config['PRESENCE_BATCH_SIZE']
+    for i in range(0, len(session_ids), batch_size):
+        # A heartbeat only, so no cached response is invalidated
+        OnlineUser.query.filter(OnlineUser.socket_id.in_(session_ids[i:i + batch_size]))\
+            .execution_options(cache_keys=())\
+            .update({'last_activity': now}, synchronize_session=False)
+    db.session.commit()
+    write_heartbeat(app, now)
+
+def write_heartbeat(app, now=None):
+    """Advertise this node as alive to the other nodes"""
+    redis_client = get_redis_client()
+    if not redis_client:
+        return
+    try:
+        redis_client.set(instance_key(app.config['INSTANCE_ID']), (now or datetime.utcnow()).isoformat(),
+                         ex=app.config['PRESENCE_TIMEOUT_SECONDS'])
+    except Exception as e:
+        app.logger.warning(f"Redis instance heartbeat failed: {e}")
+
+def expire_stale_rows(app, cutoff):
+    """Delete rows that were not refreshed in time or belong to dead nodes"""
+    stale = OnlineUser.last_activity < cutoff
+
+    dead_instances = find_dead_instances(app.config['INSTANCE_ID'])
+    if dead_instances:
+        stale = db.or_(stale, OnlineUser.instance_id.in_(dead_instances))
+
+    return remove_rows(OnlineUser.query.filter(stale), app.config['PRESENCE_BATCH_SIZE'])
+
+def find_dead_instances(own_instance_id):
+    """Instance ids owning rows but without a live Redis heartbeat"""
+    redis_client = get_redis_client()
+    if not redis_client:
+        return []
+
+    instance_ids = [row[0] for row in db.session.query(OnlineUser.instance_id).distinct()
+                    if row[0] and row[0] != own_instance_id]
+    if not instance_ids:
+        return []
+
+    try:
+        alive = redis_client.mget([instance_key(i) for i in instance_ids])
+    except Exception:
+        return []
+    return [i for i, heartbeat in zip(instance_ids, alive) if heartbeat is None]
+
+def release_instance_rows(instance_id):
+    """Remove rows left behind by a previous run of this node"""
+    from flask import current_app
+
+    removed = remove_rows(OnlineUser.query.filter_by(instance_id=instance_id),
+                          current_app.config['PRESENCE_BATCH_SIZE'])
+    if removed:
+        current_app.logger.info(f"Released {removed} online users left by instance {instance_id}")
+
+def remove_rows(query, batch_size):
+    """Delete matching OnlineUser rows in batches, logging and announcing each leave"""
+    removed = 0
+    while True:
+        rows = query.order_by(OnlineUser.id).limit(batch_size).all()
+        if not rows:
+            return removed
+
+        leaves = [(r.user_id, r.channel_id, r.is_speaking) for r in rows if r.channel_id]
+        users = {u.id: u.to_dict() for u in User.query.filter(User.id.in_({r.user_id for r in rows}))}
+        for user_id, channel_id, _ in leaves:
+            db.session.add(ActivityLog(
+                user_id=user_id,
+                channel_id=channel_id,
+                action='leave',
+                extra_data={'reason': 'expired'}
+            ))
+
+        channel_keys = {f'channel:{channel_id}' for _, channel_id, _ in leaves}
+        OnlineUser.query.filter(OnlineUser.id.in_([r.id for r in rows]))\
+            .execution_options(cache_keys={'channels'} | channel_keys if leaves else ())\
+            .delete(synchronize_session=False)
+        db.session.commit()
+
+        for user_id, channel_id, is_speaking in leaves:
+            if user_id in users:
+                announce_leave(users[user_id], channel_id, is_speaking)
+
+        removed += len(rows)
+
+def announce_leave(user_data, channel_id, was_speaking):
+    """Tell a channel that a user is gone, releasing any speaking state"""
+    from app import scan
+
+    room = f"channel_{channel_id}"
+    if was_speaking:
+        payload = {
+            'user_id': user_data['id'],
+            'username': user_data['username'],
+            'is_speaking': False
+        }
+        socketio.emit('user_speaking', payload, room=room)
+        scan.deliver(channel_id, 'user_speaking', payload)
+    payload = {
+        'user': user_data,
+        'channel_id': channel_id
+    }
+    socketio.emit('user_left', payload, room=room)
+    scan.deliver(channel_id, 'user_left', payload)
@@ -0,0 +1,127 @@
+"""Query counts and DB time per REST request and Socket.IO event.
+
+Every statement is counted against the greenlet (or thread) running it,
+so a request's or event's share is the difference between two
+snapshots. Totals are exported as ``db_queries`` and ``db_time_seconds``
+summaries labelled with the endpoint or ``socket:<event>``. Statements
+slower than DB_SLOW_QUERY_MS are logged with their parameters and the
+app code that issued them.
+
+Handlers running more than DB_QUERY_BUDGET queries (0 disables the
+check) are logged, and ``@query_budget(n)`` sets a tighter limit for one
+handler. With DB_QUERY_BUDGET_STRICT, as in the testing config, going
+over budget raises QueryBudgetExceeded so tests catch N+1 regressions.
+"""
+import os
+import threading
+import time
+import traceback
+from functools import wraps
+from flask import current_app, g, request
+from sqlalchemy import event
+from app import socketio, metrics
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Running totals for the current greenlet: queries and seconds
+_local = threading.local()
+
+class QueryBudgetExceeded(AssertionError):
+    """A handler ran more queries than its budget allows"""
+
+def snapshot():
+    """Queries run and seconds spent in the DB so far by this greenlet"""
+    return getattr(_local, 'queries', 0), getattr(_local, 'seconds', 0.0)
+
+def since(start):
+    """Queries and seconds since an earlier snapshot"""
+    queries, seconds = snapshot()
+    return queries - start[0], seconds - start[1]
+
+def origin():
+    """The innermost app frame outside this module, as file:line in function"""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if frame.filename.startswith(APP_DIR) and frame.filename != __file__:
+            return f"{os.path.relpath(frame.filename, os.path.dirname(APP_DIR))}:{frame.lineno} in {frame.name}"
+    return 'unknown'
+
+def instrument(engine, app):
+    """Count and time statements on an engine, logging slow ones"""
+    slow_query_ms = app.config['DB_SLOW_QUERY_MS']
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        _local.queries = getattr(_local, 'queries', 0) + 1
+        _local.seconds = getattr(_local, 'seconds', 0.0) + elapsed
+
+        if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+            metrics.inc('db_slow_queries')
+            params = repr(parameters)
+            if len(params) > 500:
+                params = params[:500] + '...'
+            app.logger.warning(f"Slow query ({elapsed * 1000:.0f} ms) from {origin()}: "
+                               f"{' '.join(statement.split())} params={params}")
+
+def check_budget(app, name, queries, budget):
+    """Log, or raise in strict mode, when a handler ran over its query budget"""
+    if not budget or queries <= budget:
+        return
+    metrics.inc('db_query_budget_exceeded', handler=name)
+    message = f"{name} ran {queries} queries (budget {budget})"
+    if app.config['DB_QUERY_BUDGET_STRICT']:
+        raise QueryBudgetExceeded(message)
+    app.logger.warning(message)
+
+def query_budget(limit):
+    """Decorator limiting the queries one REST view or socket handler may run"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            start = snapshot()
+            result = f(*args, **kwargs)
+            check_budget(current_app, f.__name__, since(start)[0], limit)
+            return result
+        return decorated
+    return decorator
+
+def record(app, name, start):
+    """Export a finished handler's query count and DB time, checking the default budget"""
+    queries, seconds = since(start)
+    metrics.observe('db_queries', queries, handler=name)
+    metrics.observe('db_time_seconds', seconds, handler=name)
+    check_budget(app, name, queries, app.config['DB_QUERY_BUDGET'])
+    return queries
+
+def install(app):
+    """Account queries to REST requests and default-namespace socket events"""
+
+    @app.before_request
+    def start_request():
+        g.query_start = snapshot()
+
+    @app.after_request
+    def finish_request(response):
+        start = g.pop('query_start', None)
+        if start is not None:
+            queries = record(app, request.endpoint or 'unmatched', start)
+            if app.debug:
+                response.headers['X-DB-Queries'] = str(queries)
+        return response
+
+    handlers = socketio.server.handlers.get('/', {})
+    for name, handler in list(handlers.items()):
+        handlers[name] = _counted(app, f"socket:{name}", handler)
+
+def _counted(app, name, handler):
+    def run(sid, *args):
+        start = snapshot()
+        try:
+            return handler(sid, *args)
+        finally:
+            record(app, name, start)
+    return run
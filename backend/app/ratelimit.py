@@ -0,0 +1,98 @@
+"""Per-socket token buckets shaping the audio a client may relay.
+
+Each speaking socket gets one bucket for frames per second and one for
+bytes per second. A frame over AUDIO_MAX_FRAME_BYTES, or one arriving
+when either bucket is empty, is dropped before it is decoded, coalesced
+or relayed. Sizes are taken from the base64 payload length, so checking
+a frame never decodes it.
+"""
+import threading
+import time
+from app import metrics
+
+# Audio limiter per socket id
+audio_limiters = {}
+
+# Guards audio_limiters and the buckets in it
+_lock = threading.Lock()
+
+class TokenBucket:
+    """Refills at ``rate`` tokens per second up to ``burst`` tokens"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated_at')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+class AudioLimiter:
+    """Frame and byte buckets for one socket"""
+
+    __slots__ = ('frames', 'bytes', 'rejected_at')
+
+    def __init__(self, config):
+        frame_rate = config['AUDIO_MAX_FRAMES_PER_SEC']
+        byte_rate = config['AUDIO_MAX_BYTES_PER_SEC']
+        burst = config['AUDIO_RATE_BURST_SECONDS']
+        self.frames = TokenBucket(frame_rate, frame_rate * burst)
+        self.bytes = TokenBucket(byte_rate, byte_rate * burst)
+        self.rejected_at = 0.0
+
+    def allow(self, size):
+        now = time.monotonic()
+        self.frames.refill(now)
+        self.bytes.refill(now)
+        if self.frames.tokens < 1 or self.bytes.tokens < size:
+            return False
+        self.frames.tokens -= 1
+        self.bytes.tokens -= size
+        return True
+
+def encoded_size(audio_data):
+    """Decoded size of a base64 payload, without decoding it"""
+    return len(audio_data) * 3 // 4
+
+def check_audio(socket_id, audio_data, config):
+    """Return the reason a frame must be dropped, or None to accept it.
+
+    The first rejection of a throttling episode (rejections less than a
+    second apart) is reported as ``'new'`` so the caller can tell the
+    client once instead of once per frame.
+    """
+    if not isinstance(audio_data, (str, bytes)):
+        metrics.inc('audio_frames_rejected', reason='invalid')
+        return 'invalid'
+
+    size = encoded_size(audio_data) if isinstance(audio_data, str) else len(audio_data)
+    if size > config['AUDIO_MAX_FRAME_BYTES']:
+        metrics.inc('audio_frames_rejected', reason='too_large')
+        return 'too_large'
+
+    with _lock:
+        limiter = audio_limiters.get(socket_id)
+        if limiter is None:
+            limiter = audio_limiters[socket_id] = AudioLimiter(config)
+
+        if limiter.allow(size):
+            return None
+
+        now = time.monotonic()
+        episode_ongoing = now - limiter.rejected_at < 1.0
+        limiter.rejected_at = now
+
+    metrics.inc('audio_frames_rejected', reason='rate')
+    if episode_ongoing:
+        return 'rate'
+    metrics.inc('audio_throttled_clients')
+    return 'new'
+
+def release(socket_id):
+    """Drop a socket's buckets"""
+    with _lock:
+        audio_limiters.pop(socket_id, None)
@@ -0,0 +1,127 @@
+"""Scan mode: one socket monitoring several channels by priority.
+
+A scanning socket subscribes to a set of channels, each with a priority
+(higher wins), without joining their rooms. Of the channels with an
+active transmission it receives audio from one at a time: the channel it
+is already following keeps it until that transmission ends or goes quiet
+for SCAN_IDLE_MS, unless a channel with a higher priority becomes active,
+which takes over at once. Speaking and leave events from every scanned
+channel are passed on, so the client can still show activity.
+
+Which users are transmitting in each channel is tracked from the events
+relayed to the channel, local or forwarded from other nodes, so the
+choice per frame only looks at the scanners of that one channel. Events
+sent to scanners carry a ``channel_id``. Scanners get the speaker's
+original stream, not the server-transcoded one.
+"""
+import threading
+import time
+from app import socketio, metrics, sharding
+
+# Scanner state per socket id
+scanners = {}
+
+# Scanning socket ids per channel id
+channel_scanners = {}
+
+# User ids transmitting per channel id
+channel_speakers = {}
+
+# Guards the three maps above and each Scanner's current channel
+_lock = threading.Lock()
+
+class Scanner:
+    """Channels and the currently followed transmission of one socket"""
+
+    __slots__ = ('connection', 'priorities', 'idle_seconds', 'current', 'heard_at')
+
+    def __init__(self, connection, priorities, idle_seconds):
+        self.connection = connection
+        self.priorities = priorities
+        self.idle_seconds = idle_seconds
+        self.current = None
+        self.heard_at = 0.0
+
+def start(socket_id, connection, priorities, idle_seconds):
+    """Subscribe a socket to {channel id: priority}, replacing any earlier scan"""
+    stop(socket_id)
+    with _lock:
+        scanners[socket_id] = Scanner(connection, priorities, idle_seconds)
+        for channel_id in priorities:
+            channel_scanners.setdefault(channel_id, set()).add(socket_id)
+    for channel_id in priorities:
+        # Remote speakers' traffic must reach this node
+        sharding.listener_joined(channel_id)
+    metrics.set_gauge('scan_sockets', len(scanners))
+
+def stop(socket_id):
+    """Drop a socket's scan subscription, returning its Scanner (None if it had none)"""
+    with _lock:
+        scanner = scanners.pop(socket_id, None)
+        if scanner is None:
+            return None
+        for channel_id in scanner.priorities:
+            sids = channel_scanners.get(channel_id)
+            if sids is not None:
+                sids.discard(socket_id)
+                if not sids:
+                    del channel_scanners[channel_id]
+    for channel_id in scanner.priorities:
+        sharding.listener_left(channel_id)
+    metrics.set_gauge('scan_sockets', len(scanners))
+    return scanner
+
+def active_channels(channel_ids):
+    """The given channels that have a transmission in progress"""
+    return [channel_id for channel_id in channel_ids if channel_speakers.get(channel_id)]
+
+def deliver(channel_id, event, payload):
+    """Track a channel event and pass it on to the channel's scanners"""
+    user_id = payload.get('user_id') or (payload.get('user') or {}).get('id')
+    with _lock:
+        if event == 'audio_data':
+            channel_speakers.setdefault(channel_id, set()).add(user_id)
+        elif event == 'user_speaking' and payload['is_speaking']:
+            channel_speakers.setdefault(channel_id, set()).add(user_id)
+        elif event in ('user_speaking', 'user_left'):
+            speakers = channel_speakers.get(channel_id)
+            if speakers is not None:
+                speakers.discard(user_id)
+                if not speakers:
+                    del channel_speakers[channel_id]
+
+        sids = channel_scanners.get(channel_id)
+        if not sids:
+            return
+
+        if event == 'audio_data':
+            sids = [sid for sid in sids if follow(scanners[sid], channel_id)]
+        else:
+            # A scanner also joined to the channel already gets its events
+            sids = [sid for sid in sids if scanners[sid].connection['channel_id'] != channel_id]
+    if not sids:
+        return
+
+    payload = dict(payload, channel_id=channel_id)
+    for sid in sids:
+        socketio.emit(event, payload, to=sid)
+
+def follow(scanner, channel_id):
+    """Whether a scanner should take a frame from a channel, switching to it if so
+    (called with the lock held)"""
+    if scanner.connection['channel_id'] == channel_id:
+        return False
+
+    now = time.monotonic()
+    current = scanner.current
+    if current != channel_id and current is not None:
+        idle = now - scanner.heard_at > scanner.idle_seconds
+        if not idle and current in channel_speakers and \
+                scanner.priorities[channel_id] <= scanner.priorities[current]:
+            metrics.inc('scan_frames_skipped')
+            return False
+        metrics.inc('scan_switches')
+
+    scanner.current = channel_id
+    scanner.heard_at = now
+    return True
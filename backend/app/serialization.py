@@ -0,0 +1,117 @@
+"""JSON encoding for REST responses and Socket.IO packets.
+
+orjson is used when installed, with the standard library as the fallback.
+The same backend serves Flask's JSON provider and the Socket.IO packet
+codec (this module is passed to the Socket.IO server as its ``json``
+module). Models serialize through model_serializer functions, and
+timestamps are ISO 8601 strings by default or, with
+``JSON_TIMESTAMPS = 'epoch_ms'``, integer milliseconds since the epoch.
+"""
+import json as _stdlib_json
+import time
+from operator import attrgetter
+from datetime import date, datetime, timezone
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Timestamp format for serialized models and event payloads
+_settings = {'epoch_ms': False, 'timestamp': None}
+
+def backend():
+    """Name of the JSON library in use"""
+    return 'orjson' if orjson is not None else 'json'
+
+def configure(app):
+    """Apply the app's timestamp format"""
+    _settings['epoch_ms'] = app.config.get('JSON_TIMESTAMPS') == 'epoch_ms'
+    _settings['timestamp'] = _epoch_ms if _settings['epoch_ms'] else _iso
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj, **kwargs):
+    """Encode to a JSON string; extra stdlib keyword arguments are ignored by orjson"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            # e.g. integers beyond 64 bits
+            pass
+    kwargs.setdefault('separators', (',', ':'))
+    kwargs.setdefault('default', _default)
+    return _stdlib_json.dumps(obj, **kwargs)
+
+def loads(s, **kwargs):
+    if orjson is not None and not kwargs:
+        return orjson.loads(s)
+    return _stdlib_json.loads(s, **kwargs)
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson when available"""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=_default, option=option).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+def _epoch_ms(value):
+    return int(value.replace(tzinfo=timezone.utc).timestamp() * 1000) if value is not None else None
+
+# ISO 8601 until configure() says otherwise
+_settings['timestamp'] = _iso
+
+def timestamp(value):
+    """A naive UTC datetime in the configured format"""
+    return _settings['timestamp'](value)
+
+def now():
+    """The current time in the configured format"""
+    if _settings['epoch_ms']:
+        return int(time.time() * 1000)
+    return datetime.utcnow().isoformat()
+
+def model_serializer(fields, timestamps=()):
+    """Build a to_dict function for the given fields.
+
+    All attributes are read by one attrgetter call; fields listed in
+    ``timestamps`` are formatted with the configured timestamp format.
+    """
+    fields = tuple(fields)
+    # attrgetter returns a bare value, not a tuple, for a single field
+    get_values = attrgetter(*fields) if len(fields) > 1 else (lambda obj: (getattr(obj, fields[0]),))
+    stamped = tuple(field for field in fields if field in timestamps)
+
+    def to_dict(obj):
+        data = dict(zip(fields, get_values(obj)))
+        format_timestamp = _settings['timestamp']
+        for field in stamped:
+            data[field] = format_timestamp(data[field])
+        return data
+    return to_dict
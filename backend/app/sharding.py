@@ -0,0 +1,266 @@
+"""Channel ownership across backend nodes with consistent hashing.
+
+Every node subscribes only to its own Redis inbox (``ptt:node:<id>``).
+Nodes that have listeners in a channel register in that channel's node
+set. When a local speaker's audio or speaking events must reach listeners
+on other nodes, the frame is sent once to the channel's owner, which is
+picked from a consistent-hash ring of the live nodes. The owner then
+forwards it to each node with listeners. No node sees traffic for
+channels it neither owns nor listens to, and when nodes join or leave
+only the channels whose ring segment moved change owner. Publishes and
+registrations go out in pipelined batches through app/outbox.py.
+"""
+import bisect
+import hashlib
+import threading
+import time
+from app import socketio, get_redis_client, metrics, serialization, outbox
+from app.presence import instance_key
+
+NODES_KEY = 'ptt:nodes'
+VIRTUAL_NODES = 64
+
+# Ring of live nodes, refreshed by the membership loop
+ring_state = {'ring': None, 'instance_id': None}
+
+# Local listener count per channel id
+local_listeners = {}
+
+# Guards local_listeners. It is held while a registration is queued, so
+# a channel's sadd and srem go out in the order its count changed.
+_lock = threading.Lock()
+
+# Cached channel node sets: channel id -> (fetched_at, set of node ids)
+_channel_nodes_cache = {}
+
+def _hash(key):
+    return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+def inbox(instance_id):
+    return f"ptt:node:{instance_id}"
+
+def channel_nodes_key(channel_id):
+    return f"ptt:channel_nodes:{channel_id}"
+
+def node_channels_key(instance_id):
+    return f"ptt:node_channels:{instance_id}"
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes"""
+
+    def __init__(self, nodes, vnodes=VIRTUAL_NODES):
+        self.nodes = frozenset(nodes)
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def get(self, key):
+        """Node owning the given key"""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+def start(app):
+    """Join the node ring and start the inbox and membership loops"""
+    redis_client = get_redis_client()
+    if not redis_client or not app.config.get('CHANNEL_SHARDING'):
+        return
+
+    instance_id = app.config['INSTANCE_ID']
+    ring_state['instance_id'] = instance_id
+    try:
+        # Forget channel listener registrations from a previous run
+        stale = redis_client.smembers(node_channels_key(instance_id))
+        pipe = redis_client.pipeline(transaction=False)
+        for channel_id in stale:
+            pipe.srem(channel_nodes_key(channel_id.decode()), instance_id)
+        pipe.delete(node_channels_key(instance_id))
+        pipe.sadd(NODES_KEY, instance_id)
+        pipe.set(instance_key(instance_id), time.time(), ex=app.config['PRESENCE_TIMEOUT_SECONDS'])
+        pipe.execute()
+        refresh_membership(app)
+    except Exception as e:
+        app.logger.warning(f"Channel sharding disabled, Redis setup failed: {e}")
+        ring_state['instance_id'] = None
+        return
+
+    socketio.start_background_task(run_membership, app)
+    socketio.start_background_task(run_inbox, app)
+
+def enabled():
+    return ring_state['instance_id'] is not None
+
+def leave(app):
+    """Leave the ring and drop this node's listener registrations, e.g. on shutdown"""
+    if not enabled():
+        return
+    instance_id = ring_state['instance_id']
+    try:
+        redis_client = get_redis_client()
+        pipe = redis_client.pipeline(transaction=False)
+        for channel_id in redis_client.smembers(node_channels_key(instance_id)):
+            pipe.srem(channel_nodes_key(channel_id.decode()), instance_id)
+        pipe.delete(node_channels_key(instance_id))
+        pipe.srem(NODES_KEY, instance_id)
+        pipe.delete(instance_key(instance_id))
+        pipe.execute()
+    except Exception as e:
+        app.logger.warning(f"Leaving the channel ring failed: {e}")
+
+def refresh_membership(app):
+    """Rebuild the ring from nodes with a live heartbeat"""
+    redis_client = get_redis_client()
+    instance_id = ring_state['instance_id']
+    redis_client.set(instance_key(instance_id), time.time(), ex=app.config['PRESENCE_TIMEOUT_SECONDS'])
+
+    nodes = sorted(n.decode() for n in redis_client.smembers(NODES_KEY))
+    alive = redis_client.mget([instance_key(n) for n in nodes]) if nodes else []
+    live_nodes = {n for n, heartbeat in zip(nodes, alive) if heartbeat is not None}
+    dead_nodes = set(nodes) - live_nodes
+    if dead_nodes:
+        redis_client.srem(NODES_KEY, *dead_nodes)
+
+    live_nodes.add(instance_id)
+    ring = ring_state['ring']
+    if ring is None or ring.nodes != live_nodes:
+        ring_state['ring'] = HashRing(live_nodes)
+        metrics.set_gauge('shard_nodes', len(live_nodes))
+        app.logger.info(f"Channel ring updated: {sorted(live_nodes)}")
+
+def run_membership(app):
+    """Periodically refresh node membership"""
+    while True:
+        socketio.sleep(app.config['SHARD_REFRESH_INTERVAL'])
+        with app.app_context():
+            try:
+                refresh_membership(app)
+            except Exception as e:
+                app.logger.warning(f"Channel ring refresh failed: {e}")
+
+def owner(channel_id):
+    """Node currently owning a channel"""
+    ring = ring_state['ring']
+    return ring.get(f"channel_{channel_id}") if ring else ring_state['instance_id']
+
+def listener_joined(channel_id):
+    """Count a local listener, registering this node for the channel"""
+    with _lock:
+        local_listeners[channel_id] = local_listeners.get(channel_id, 0) + 1
+        if local_listeners[channel_id] == 1 and enabled():
+            _update_registration(channel_id, add=True)
+
+def listener_left(channel_id):
+    """Uncount a local listener, unregistering this node when none remain"""
+    with _lock:
+        count = local_listeners.get(channel_id, 0) - 1
+        if count > 0:
+            local_listeners[channel_id] = count
+            return
+        local_listeners.pop(channel_id, None)
+        if enabled():
+            _update_registration(channel_id, add=False)
+
+def _update_registration(channel_id, add):
+    from flask import current_app
+
+    app = current_app._get_current_object()
+    instance_id = ring_state['instance_id']
+    method = 'sadd' if add else 'srem'
+    outbox.command(app, method, channel_nodes_key(channel_id), instance_id)
+    outbox.command(app, method, node_channels_key(instance_id), channel_id)
+
+def listener_nodes(channel_id, max_age=1.0):
+    """Live nodes with listeners in a channel, cached briefly"""
+    now = time.monotonic()
+    cached = _channel_nodes_cache.get(channel_id)
+    if cached and now - cached[0] < max_age:
+        return cached[1]
+
+    members = {n.decode() for n in get_redis_client().smembers(channel_nodes_key(channel_id))}
+    ring = ring_state['ring']
+    if ring is not None:
+        members &= ring.nodes
+    _channel_nodes_cache[channel_id] = (now, members)
+    return members
+
+def forward(channel_id, event, payload):
+    """Send a locally originated channel event to listeners on other nodes"""
+    if not enabled():
+        return
+
+    from flask import current_app
+    instance_id = ring_state['instance_id']
+    try:
+        remote = listener_nodes(channel_id) - {instance_id}
+        if not remote:
+            return
+
+        message = {'channel_id': channel_id, 'event': event, 'payload': payload, 'origin': instance_id}
+        channel_owner = owner(channel_id)
+        app = current_app._get_current_object()
+        if channel_owner == instance_id or (channel_owner in remote and len(remote) == 1):
+            # Deliver directly when this node owns the channel or the
+            # owner is the only remote listener node
+            data = serialization.dumps(message)
+            for node in remote:
+                outbox.publish(app, inbox(node), data)
+        else:
+            outbox.publish(app, inbox(channel_owner), serialization.dumps(dict(message, fanout=True)))
+        metrics.inc('shard_forwards', event=event)
+    except Exception as e:
+        current_app.logger.warning(f"Channel forward failed: {e}")
+
+def handle_message(message):
+    """Deliver a message from this node's inbox, fanning out if asked to"""
+    channel_id = message['channel_id']
+    instance_id = ring_state['instance_id']
+
+    from flask import current_app
+    app = current_app._get_current_object()
+
+    if message.pop('fanout', False):
+        data = serialization.dumps(message)
+        for node in listener_nodes(channel_id) - {instance_id, message['origin']}:
+            outbox.publish(app, inbox(node), data)
+        metrics.inc('shard_fanouts')
+
+    if local_listeners.get(channel_id):
+        from app import scan, broadcast
+        socketio.emit(message['event'], message['payload'], room=f"channel_{channel_id}")
+        scan.deliver(channel_id, message['event'], message['payload'])
+        broadcast.publish(app, channel_id, message['event'], message['payload'])
+
+def run_inbox(app):
+    """Consume this node's inbox channel"""
+    try:
+        from eventlet import patcher
+        green = patcher.is_monkey_patched('socket')
+    except ImportError:
+        green = False
+    # Real threads (ASGI mode) can always block on the socket
+    blocking = green or socketio.async_mode == 'threading'
+
+    while True:
+        pubsub = None
+        try:
+            pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(inbox(ring_state['instance_id']))
+            while True:
+                # Never block the eventlet hub on an unpatched socket
+                message = pubsub.get_message(timeout=1.0 if blocking else 0)
+                if message is None:
+                    if not blocking:
+                        socketio.sleep(0.005)
+                    continue
+                with app.app_context():
+                    handle_message(serialization.loads(message['data']))
+        except Exception as e:
+            app.logger.warning(f"Node inbox error: {e}. Resubscribing.")
+            socketio.sleep(1)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
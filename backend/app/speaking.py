@@ -0,0 +1,171 @@
+"""Debounced speaking state and rate-limited speaking broadcasts.
+
+A stop_speaking is held for SPEAK_DEBOUNCE_MS before it is written and
+announced. If the same session starts speaking again inside that window
+the two transmissions are merged: no speak_end/speak_start rows, no
+OnlineUser writes and no broadcasts, and the eventual speak_end row
+carries the duration from the first start to the final stop and the
+audio stats of the whole transmission.
+
+user_speaking broadcasts are sent at most once per
+SPEAKING_BROADCAST_INTERVAL_MS per channel. Changes arriving inside the
+interval are held and sent together at its end; a user's change that is
+reversed before then is dropped along with the change it undoes.
+"""
+import threading
+import time
+from datetime import datetime
+from app import socketio, db, metrics, sharding, scan, broadcast, metering
+from app.models import OnlineUser, ActivityLog
+
+# Stops waiting out the debounce window, keyed by session id
+pending_stops = {}
+
+# Broadcast state per channel id: last send time and held payloads by user id
+channel_broadcasts = {}
+
+# Guards pending_stops and channel_broadcasts
+_lock = threading.Lock()
+
+def resume(connection, channel_id):
+    """Merge a start into a stop still inside the debounce window.
+
+    Returns True when the session simply carries on its transmission.
+    """
+    with _lock:
+        pending = pending_stops.get(connection['session_id'])
+        if pending is None or pending['channel_id'] != channel_id:
+            return False
+        del pending_stops[connection['session_id']]
+
+    connection['is_speaking'] = True
+    connection['speak_start_time'] = pending['started_at']
+    metrics.inc('speak_events_merged')
+    return True
+
+def stop(app, connection, channel_id, debounce=True):
+    """Record a stop, at once or after the debounce window"""
+    pending = {
+        'connection': connection,
+        'channel_id': channel_id,
+        'started_at': connection.pop('speak_start_time', None),
+        'stopped_at': datetime.utcnow()
+    }
+    delay = app.config['SPEAK_DEBOUNCE_MS'] / 1000.0 if debounce else 0
+    if delay <= 0:
+        write_stop(app, pending)
+        return
+
+    # A session has at most one stop pending; an older one is finished first
+    finish(connection)
+    pending_stops[connection['session_id']] = pending
+    socketio.start_background_task(stop_later, app, connection['session_id'], pending, delay)
+
+def stop_later(app, session_id, pending, delay):
+    """Write a stop once the debounce window has passed, unless resumed"""
+    socketio.sleep(delay)
+    with _lock:
+        if pending_stops.get(session_id) is not pending:
+            return
+        del pending_stops[session_id]
+    with app.app_context():
+        try:
+            write_stop(app, pending)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Stop speaking error: {str(e)}")
+
+def finish(connection):
+    """Write a session's pending stop now, e.g. before it leaves the channel"""
+    pending = pending_stops.pop(connection['session_id'], None)
+    if pending is not None:
+        from flask import current_app
+        write_stop(current_app._get_current_object(), pending)
+
+def write_stop(app, pending):
+    """Persist and announce the end of a transmission"""
+    connection = pending['connection']
+    user = connection['user']
+    channel_id = pending['channel_id']
+
+    speak_duration = None
+    if pending['started_at']:
+        speak_duration = (pending['stopped_at'] - pending['started_at']).total_seconds()
+
+    online_user = OnlineUser.query.filter_by(socket_id=connection['session_id']).first()
+    if online_user:
+        online_user.is_speaking = False
+        online_user.last_activity = pending['stopped_at']
+
+    db.session.add(ActivityLog(
+        user_id=user.id,
+        channel_id=channel_id,
+        action='speak_end',
+        duration=speak_duration,
+        timestamp=pending['stopped_at'],
+        extra_data=metering.finish(app.config, connection['session_id'])
+    ))
+    db.session.commit()
+
+    announce(app, channel_id, user, False)
+    app.logger.info(f"User {user.username} stopped speaking in channel {channel_id}")
+
+def announce(app, channel_id, user, is_speaking):
+    """Announce a speaking change, holding it if the channel was told recently"""
+    payload = {
+        'user_id': user.id,
+        'username': user.username,
+        'is_speaking': is_speaking
+    }
+    interval = app.config['SPEAKING_BROADCAST_INTERVAL_MS'] / 1000.0
+    with _lock:
+        state = channel_broadcasts.get(channel_id)
+        if state is None:
+            state = channel_broadcasts[channel_id] = {'sent_at': 0.0, 'held': None}
+
+        now = time.monotonic()
+        wait = interval - (now - state['sent_at'])
+        send_now = state['held'] is None and wait <= 0
+        if send_now:
+            state['sent_at'] = now
+        else:
+            hold(app, channel_id, state, payload, wait)
+
+    if send_now:
+        send(app, channel_id, [payload])
+    else:
+        metrics.inc('speaking_broadcasts_held')
+
+def hold(app, channel_id, state, payload, wait):
+    """Keep a change for the end of the interval (called with the lock held)"""
+    if state['held'] is None:
+        state['held'] = {}
+        socketio.start_background_task(send_later, app, channel_id, state, wait)
+
+    held = state['held']
+    previous = held.get(payload['user_id'])
+    if previous is not None and previous['is_speaking'] != payload['is_speaking']:
+        # The channel never saw the previous change, so neither is needed
+        del held[payload['user_id']]
+    else:
+        held[payload['user_id']] = payload
+
+def send_later(app, channel_id, state, delay):
+    """Send a channel's held speaking changes at the end of the interval"""
+    socketio.sleep(delay)
+    with _lock:
+        held, state['held'] = state['held'], None
+        state['sent_at'] = time.monotonic()
+    with app.app_context():
+        try:
+            send(app, channel_id, held.values())
+        except Exception as e:
+            app.logger.error(f"Speaking broadcast error: {str(e)}")
+
+def send(app, channel_id, payloads):
+    """Emit speaking changes to the channel here, on other nodes and to its scanners"""
+    for payload in payloads:
+        socketio.emit('user_speaking', payload, room=f"channel_{channel_id}")
+        sharding.forward(channel_id, 'user_speaking', payload)
+        scan.deliver(channel_id, 'user_speaking', payload)
+        broadcast.publish(app, channel_id, 'user_speaking', payload)
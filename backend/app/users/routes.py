@@ -1,9 +1,13 @@
-from flask import request, jsonify, current_app
+import io
+from flask import request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 from app.users import bp
 from app.models import User, ActivityLog
 from app import db
+from app.database import read_replica
+from app.cache import cached_response
+from app import bulk
 
 def require_admin():
     """Decorator to require admin privileges"""
@@ -15,6 +19,8 @@ def require_admin():
 
 @bp.route('', methods=['GET'])
 @jwt_required()
+@read_replica
+@cached_response('users')
 def get_users():
     """Get list of all users"""
     try:
@@ -54,6 +60,8 @@ def get_users():
 
 @bp.route('/<int:user_id>', methods=['GET'])
 @jwt_required()
+@read_replica
+@cached_response('user:{user_id}', 'user:*')
 def get_user(user_id):
     """Get specific user details"""
     try:
@@ -211,3 +219,38 @@ def delete_user(user_id):
         current_app.logger.error(f"Delete user error: {str(e)}")
         db.session.rollback()
         return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_users():
+    """Create users from an uploaded CSV or NDJSON body (admin only)
+
+    Results are streamed back as NDJSON, one line per input row followed
+    by a summary line.
+    """
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    fmt = bulk.upload_format(request.mimetype, request.args.get('format'))
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    results = bulk.guarded(bulk.import_users(bulk.parse_rows(stream, fmt)))
+    
+    return Response(stream_with_context(bulk.serialize(results, 'ndjson', None)),
+                    mimetype='application/x-ndjson')
+
+@bp.route('/export', methods=['GET'])
+@jwt_required()
+@read_replica
+def export_users():
+    """Stream all users as CSV or NDJSON (admin only)"""
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    fmt = 'csv' if request.args.get('format') == 'csv' else 'ndjson'
+    rows = bulk.serialize(bulk.export_users(), fmt, bulk.USER_EXPORT_FIELDS)
+    
+    return Response(stream_with_context(rows),
+                    mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename=users.{fmt}'})
@@ -1,15 +1,30 @@
 import json
 import base64
-from datetime import datetime
-from flask import current_app
-from flask_socketio import emit, join_room, leave_room, disconnect
+import secrets
+import threading
+from datetime import datetime, timedelta
+from flask import current_app, has_request_context
+from flask_socketio import emit, join_room, leave_room, disconnect, ConnectionRefusedError
 from flask_jwt_extended import decode_token, get_jwt_identity
-from app import socketio, db, get_redis_client
+from app import socketio, db, metrics
 from app.models import User, Channel, OnlineUser, ActivityLog
+from app.database import release_connection
+from app.querystats import query_budget
+from app import codec, coalesce, sharding, ratelimit, membership, serialization, speaking, scan, broadcast, presence, drain, metering
 
 # Store active connections
 active_connections = {}
 
+# Sessions whose socket dropped recently, keyed by resume token. They keep
+# their channel and OnlineUser row until the grace window passes, so a
+# reconnecting client can be reattached without any DB writes. A speaker's
+# transmission is ended when the socket drops.
+resumable_sessions = {}
+
+# Held while a resume or an expiry claims a held session. Connections are
+# claimed with a single pop, so a socket's teardown runs once.
+_sessions_lock = threading.Lock()
+
 def authenticate_socket(token):
     """Authenticate WebSocket connection using JWT token"""
     try:
@@ -26,7 +41,16 @@ def authenticate_socket(token):
 @socketio.on('connect')
 def handle_connect(auth):
     """Handle client connection"""
+    # A draining node takes no new sockets; the client retries elsewhere
+    if drain.draining():
+        metrics.inc('drain_refused_connections')
+        raise ConnectionRefusedError('Server is restarting',
+                                     {'draining': True, 'retry_after_ms': drain.retry_hint(current_app)})
+    
     try:
+        from flask import request
+        socket_id = request.sid
+        
         # Authenticate user
         token = auth.get('token') if auth else None
         if not token:
@@ -34,29 +58,46 @@ def handle_connect(auth):
             disconnect()
             return False
         
+        # Reattach a recently dropped session with a single user lookup
+        resume_token = auth.get('resume_token')
+        if resume_token and resume_session(resume_token, token, socket_id):
+            return True
+        
         user = authenticate_socket(token)
         if not user:
             current_app.logger.warning("Connection attempt with invalid token")
             disconnect()
             return False
         
+        # Update user's last seen
+        user.last_seen = datetime.utcnow()
+        db.session.commit()
+        
+        # Keep a detached copy of the user so later events and resumed
+        # sessions can use it without reloading it from the database
+        user_data = user.to_dict()
+        db.session.expunge(user)
+        release_connection()
+        
         # Store connection info
-        from flask import request
-        socket_id = request.sid
+        resume_token = secrets.token_urlsafe(24)
         active_connections[socket_id] = {
             'user_id': user.id,
             'user': user,
+            'session_id': socket_id,
+            'resume_token': resume_token,
             'channel_id': None,
             'is_speaking': False,
             'connected_at': datetime.utcnow()
         }
         
-        # Update user's last seen
-        user.last_seen = datetime.utcnow()
-        db.session.commit()
-        
         current_app.logger.info(f"User {user.username} connected with socket {socket_id}")
-        emit('connected', {'message': 'Connected successfully', 'user': user.to_dict()})
+        emit('connected', {
+            'message': 'Connected successfully',
+            'user': user_data,
+            'resume_token': resume_token,
+            'resumed': False
+        })
         
         return True
         
@@ -72,28 +113,185 @@ def handle_disconnect():
         from flask import request
         socket_id = request.sid
         
-        if socket_id in active_connections:
-            connection = active_connections[socket_id]
+        # The reaper may have claimed the connection already
+        connection = active_connections.pop(socket_id, None)
+        if connection is not None:
             user = connection['user']
-            channel_id = connection['channel_id']
-            
-            # Leave channel if connected
-            if channel_id:
-                handle_leave_channel_internal(socket_id, channel_id)
+            scanner = release_socket(socket_id, connection)
             
-            # Remove from active connections
-            del active_connections[socket_id]
-            
-            # Remove from online users table
-            OnlineUser.query.filter_by(socket_id=socket_id).delete()
-            db.session.commit()
+            # Hold the channel session open for a while so a client that
+            # reconnects quickly does not cause a leave/join round trip (a
+            # draining node will not see the client again)
+            grace = current_app.config.get('SESSION_RESUME_GRACE_SECONDS', 0)
+            if connection['channel_id'] and grace > 0 and not drain.draining():
+                if scanner is not None:
+                    connection['scan'] = (scanner.priorities, scanner.idle_seconds)
+                suspend_session(connection, grace)
+                current_app.logger.info(f"User {user.username} disconnected, session held for {grace}s")
+                return
             
+            end_session(connection)
             current_app.logger.info(f"User {user.username} disconnected")
         
     except Exception as e:
         current_app.logger.error(f"Disconnect error: {str(e)}")
 
+def release_socket(socket_id, connection):
+    """Drop the state kept for a socket rather than its session (batched
+    audio, codec, rate limits, scan), returning its Scanner if it had one"""
+    coalesce.flush(socket_id)
+    if connection['channel_id']:
+        codec.remove_listener(connection['channel_id'], socket_id)
+    codec.release_speaker(socket_id)
+    ratelimit.release(socket_id)
+    return scan.stop(socket_id)
+
+def end_session(connection):
+    """Leave the current channel and remove the session's online record"""
+    channel_id = connection['channel_id']
+    
+    # Leave channel if connected
+    if channel_id:
+        handle_leave_channel_internal(connection, channel_id)
+    
+    # Remove from online users table (normally gone with the leave above)
+    OnlineUser.query.filter_by(socket_id=connection['session_id'])\
+        .execution_options(cache_keys=('channels', f'channel:{channel_id}') if channel_id else ())\
+        .delete()
+    db.session.commit()
+
+def suspend_session(connection, grace):
+    """Park a dropped session so it can be resumed within the grace window"""
+    # A dropped speaker must not hold the floor through the grace window
+    app = current_app._get_current_object()
+    if connection['is_speaking']:
+        connection['is_speaking'] = False
+        speaking.stop(app, connection, connection['channel_id'], debounce=False)
+    
+    connection['suspended_until'] = datetime.utcnow() + timedelta(seconds=grace)
+    resumable_sessions[connection['resume_token']] = connection
+    socketio.start_background_task(expire_session, app, connection['resume_token'], grace)
+
+def expire_session(app, resume_token, grace):
+    """End a suspended session once its grace window has passed"""
+    socketio.sleep(grace)
+    with app.app_context():
+        try:
+            with _sessions_lock:
+                connection = resumable_sessions.get(resume_token)
+                if not connection or connection['suspended_until'] > datetime.utcnow():
+                    return
+                del resumable_sessions[resume_token]
+            
+            end_session(connection)
+            app.logger.info(f"Session for user {connection['user'].username} expired")
+            
+        except Exception as e:
+            app.logger.error(f"Session expiry error: {str(e)}")
+
+def resume_session(resume_token, token, socket_id):
+    """Reattach a suspended session to a new socket, returns True on success"""
+    # The access token is still required and must belong to the session
+    try:
+        user_id = decode_token(token)['sub']
+    except Exception:
+        return False
+    
+    with _sessions_lock:
+        connection = resumable_sessions.get(resume_token)
+        if not connection or connection['suspended_until'] < datetime.utcnow() \
+                or connection['user_id'] != user_id:
+            return False
+        del resumable_sessions[resume_token]
+    
+    # A user deactivated while the session was held loses it
+    user = User.query.get(user_id)
+    if not user or not user.is_active:
+        end_session(connection)
+        current_app.logger.info(f"Held session for inactive user {user_id} ended on resume")
+        return False
+    
+    del connection['suspended_until']
+    active_connections[socket_id] = connection
+    
+    channel_id = connection['channel_id']
+    channel = Channel.query.get(channel_id) if channel_id else None
+    if channel_id and (channel is None or not channel.is_active):
+        # The channel was deleted while the session was held
+        handle_leave_channel_internal(connection, channel_id, log_activity=channel is not None)
+        emit('left_channel', {'channel_id': channel_id, 'reason': 'channel_deleted'})
+        channel_id = None
+    
+    if channel_id and connection.get('subroom') is not None:
+        socketio.server.enter_room(socket_id, broadcast.subroom(channel_id, connection['subroom']),
+                                   namespace='/')
+    elif channel_id:
+        join_room(f"channel_{channel_id}")
+        if wants_opus(connection):
+            codec.add_listener(channel_id, socket_id)
+    
+    user = connection['user']
+    current_app.logger.info(f"User {user.username} resumed session with socket {socket_id}")
+    emit('connected', {
+        'message': 'Session resumed',
+        'user': user.to_dict(),
+        'resume_token': resume_token,
+        'resumed': True,
+        'channel_id': channel_id,
+        'is_speaking': connection['is_speaking']
+    })
+    
+    # Send current channel state so the client can rebuild its view
+    if channel_id:
+        emit('channel_state', channel_state(channel_id, channel))
+    
+    # Pick the scan back up, without channels the user can no longer hear
+    saved_scan = connection.pop('scan', None)
+    if saved_scan:
+        priorities, idle_seconds = saved_scan
+        denied = scan_denied(user, priorities)
+        priorities = {channel_id: priority for channel_id, priority in priorities.items()
+                      if channel_id not in denied}
+        if priorities:
+            scan.start(socket_id, connection, priorities, idle_seconds)
+            emit('scan_started', dict(scan_summary(priorities), resumed=True))
+        else:
+            emit('scan_stopped', {'reason': 'channels_unavailable', 'channel_ids': denied})
+    
+    return True
+
+def channel_state(channel_id, channel=None):
+    """Serialize a channel and its online users, then release the DB connection"""
+    if channel is None:
+        channel = Channel.query.get(channel_id)
+    if channel.channel_type == 'broadcast':
+        # Broadcast audiences are reported as a count only
+        state = {
+            'channel': channel.to_dict(),
+            'online_users': [],
+            'listener_count': OnlineUser.query.filter_by(channel_id=channel_id).count()
+        }
+        release_connection()
+        return state
+    
+    state = {
+        'channel': channel.to_dict(),
+        'online_users': presence.channel_presence(channel_id)
+    }
+    release_connection()
+    return state
+
+@socketio.on('heartbeat')
+def handle_heartbeat(data=None):
+    """Handle app-level heartbeat used for presence expiry"""
+    from flask import request
+    connection = active_connections.get(request.sid)
+    if connection:
+        connection['last_heartbeat'] = datetime.utcnow()
+    return {'server_time': serialization.now()}
+
 @socketio.on('join_channel')
+@query_budget(8)
 def handle_join_channel(data):
     """Handle user joining a channel"""
     try:
@@ -118,23 +316,39 @@ def handle_join_channel(data):
             return
         
         # Check if user is a member of the channel
-        if user not in channel.members:
+        if user.id not in membership.member_ids(channel_id):
             emit('error', {'message': 'Not a member of this channel'})
             return
         
         # Leave previous channel if any
         if connection['channel_id']:
-            handle_leave_channel_internal(socket_id, connection['channel_id'])
-        
-        # Join new channel
-        join_room(f"channel_{channel_id}")
+            handle_leave_channel_internal(connection, connection['channel_id'])
+        
+        # Join new channel; listeners of broadcast channels go to a sub-room
+        listen_only = channel.channel_type == 'broadcast' and not broadcast.can_speak(channel, user)
+        if channel.channel_type == 'broadcast':
+            broadcast.broadcast_channels.add(channel_id)
+        if listen_only:
+            connection['subroom'] = broadcast.add_listener(
+                channel_id, socket_id, current_app.config['BROADCAST_SUBROOM_SIZE'])
+        else:
+            join_room(f"channel_{channel_id}")
         connection['channel_id'] = channel_id
+        sharding.listener_joined(channel_id)
+        connection['codecs'] = set(data.get('codecs') or [])
+        
+        # Listeners that can decode Opus get the transcoded stream
+        codec.channel_bitrates[channel_id] = channel.audio_bitrate
+        coalesce.channel_intervals[channel_id] = channel.coalesce_ms
+        if wants_opus(connection) and not listen_only:
+            codec.add_listener(channel_id, socket_id)
         
         # Add to online users
         online_user = OnlineUser(
             user_id=user.id,
             channel_id=channel_id,
-            socket_id=socket_id
+            socket_id=connection['session_id'],
+            instance_id=current_app.config['INSTANCE_ID']
         )
         db.session.add(online_user)
         
@@ -147,18 +361,17 @@ def handle_join_channel(data):
         db.session.add(activity)
         db.session.commit()
         
-        # Notify channel members
-        emit('user_joined', {
-            'user': user.to_dict(),
-            'channel_id': channel_id
-        }, room=f"channel_{channel_id}")
+        # Notify channel members (broadcast audiences only see a count)
+        if listen_only:
+            broadcast.listeners_changed(current_app._get_current_object(), channel_id)
+        else:
+            emit('user_joined', {
+                'user': user.to_dict(),
+                'channel_id': channel_id
+            }, room=f"channel_{channel_id}")
         
         # Send current channel state to user
-        online_users = OnlineUser.query.filter_by(channel_id=channel_id).all()
-        emit('channel_state', {
-            'channel': channel.to_dict(),
-            'online_users': [ou.to_dict() for ou in online_users]
-        })
+        emit('channel_state', channel_state(channel_id, channel))
         
         current_app.logger.info(f"User {user.username} joined channel {channel.name}")
         
@@ -184,41 +397,62 @@ def handle_leave_channel(data):
             emit('error', {'message': 'Not in any channel'})
             return
         
-        handle_leave_channel_internal(socket_id, channel_id)
+        handle_leave_channel_internal(connection, channel_id)
         emit('left_channel', {'channel_id': channel_id})
         
     except Exception as e:
         current_app.logger.error(f"Leave channel error: {str(e)}")
         emit('error', {'message': 'Failed to leave channel'})
 
-def handle_leave_channel_internal(socket_id, channel_id):
+def handle_leave_channel_internal(connection, channel_id, log_activity=True):
     """Internal function to handle leaving a channel"""
     try:
-        connection = active_connections[socket_id]
         user = connection['user']
         
-        # Leave room
-        leave_room(f"channel_{channel_id}")
+        # Leave room (expired sessions no longer have a socket to remove)
+        subroom = connection.pop('subroom', None)
+        socket_id = None
+        if has_request_context():
+            from flask import request
+            socket_id = request.sid
+            if subroom is None:
+                leave_room(f"channel_{channel_id}")
+            codec.remove_listener(channel_id, socket_id)
+        if subroom is not None:
+            broadcast.remove_listener(channel_id, socket_id, subroom)
+        if log_activity:
+            speaking.finish(connection)
+        else:
+            speaking.pending_stops.pop(connection['session_id'], None)
+        metering.discard(connection['session_id'])
         connection['channel_id'] = None
         connection['is_speaking'] = False
+        sharding.listener_left(channel_id)
         
         # Remove from online users
-        OnlineUser.query.filter_by(socket_id=socket_id, channel_id=channel_id).delete()
-        
-        # Log activity
-        activity = ActivityLog(
-            user_id=user.id,
-            channel_id=channel_id,
-            action='leave'
-        )
-        db.session.add(activity)
+        OnlineUser.query.filter_by(socket_id=connection['session_id'], channel_id=channel_id)\
+            .execution_options(cache_keys=('channels', f'channel:{channel_id}')).delete()
+        
+        # Log activity (not for a channel row that no longer exists)
+        if log_activity:
+            activity = ActivityLog(
+                user_id=user.id,
+                channel_id=channel_id,
+                action='leave'
+            )
+            db.session.add(activity)
         db.session.commit()
         
-        # Notify channel members
-        emit('user_left', {
+        # Notify channel members (broadcast audiences only see a count)
+        if subroom is not None:
+            broadcast.listeners_changed(current_app._get_current_object(), channel_id)
+            return
+        payload = {
             'user': user.to_dict(),
             'channel_id': channel_id
-        }, room=f"channel_{channel_id}")
+        }
+        socketio.emit('user_left', payload, room=f"channel_{channel_id}")
+        scan.deliver(channel_id, 'user_left', payload)
         
     except Exception as e:
         current_app.logger.error(f"Leave channel internal error: {str(e)}")
@@ -242,12 +476,20 @@ def handle_start_speaking():
             emit('error', {'message': 'Not in any channel'})
             return
         
+        if connection.get('subroom') is not None:
+            emit('error', {'message': 'This channel is listen-only'})
+            return
+        
+        # A restart inside the debounce window carries on the transmission
+        if speaking.resume(connection, channel_id):
+            return
+        
         # Update speaking status
         connection['is_speaking'] = True
         connection['speak_start_time'] = datetime.utcnow()
         
         # Update database
-        online_user = OnlineUser.query.filter_by(socket_id=socket_id).first()
+        online_user = OnlineUser.query.filter_by(socket_id=connection['session_id']).first()
         if online_user:
             online_user.is_speaking = True
             online_user.last_activity = datetime.utcnow()
@@ -261,25 +503,8 @@ def handle_start_speaking():
         db.session.add(activity)
         db.session.commit()
         
-        # Notify channel members
-        emit('user_speaking', {
-            'user_id': user.id,
-            'username': user.username,
-            'is_speaking': True
-        }, room=f"channel_{channel_id}")
-        
-        # Publish to Redis for scaling (if available)
-        redis_client = get_redis_client()
-        if redis_client:
-            try:
-                redis_client.publish(f"channel_{channel_id}_speaking", json.dumps({
-                    'user_id': user.id,
-                    'username': user.username,
-                    'is_speaking': True,
-                    'socket_id': socket_id
-                }))
-            except Exception as e:
-                current_app.logger.warning(f"Redis publish failed: {e}")
+        # Notify channel members here and on other nodes
+        speaking.announce(current_app._get_current_object(), channel_id, user, True)
         
         current_app.logger.info(f"User {user.username} started speaking in channel {channel_id}")
         
@@ -299,64 +524,96 @@ def handle_stop_speaking():
             return
         
         connection = active_connections[socket_id]
-        user = connection['user']
         channel_id = connection['channel_id']
         
         if not channel_id or not connection['is_speaking']:
             return
         
-        # Calculate speak duration
-        speak_duration = None
-        if 'speak_start_time' in connection:
-            speak_duration = (datetime.utcnow() - connection['speak_start_time']).total_seconds()
+        # Relay any coalesced frames before announcing the stop
+        coalesce.flush(socket_id)
         
         # Update speaking status
         connection['is_speaking'] = False
-        if 'speak_start_time' in connection:
-            del connection['speak_start_time']
-        
-        # Update database
-        online_user = OnlineUser.query.filter_by(socket_id=socket_id).first()
-        if online_user:
-            online_user.is_speaking = False
-            online_user.last_activity = datetime.utcnow()
+        codec.release_speaker(socket_id)
         
-        # Log activity
-        activity = ActivityLog(
-            user_id=user.id,
-            channel_id=channel_id,
-            action='speak_end',
-            duration=speak_duration
-        )
-        db.session.add(activity)
-        db.session.commit()
-        
-        # Notify channel members
-        emit('user_speaking', {
-            'user_id': user.id,
-            'username': user.username,
-            'is_speaking': False
-        }, room=f"channel_{channel_id}")
-        
-        # Publish to Redis for scaling (if available)
-        redis_client = get_redis_client()
-        if redis_client:
-            try:
-                redis_client.publish(f"channel_{channel_id}_speaking", json.dumps({
-                    'user_id': user.id,
-                    'username': user.username,
-                    'is_speaking': False,
-                    'socket_id': socket_id
-                }))
-            except Exception as e:
-                current_app.logger.warning(f"Redis publish failed: {e}")
-        
-        current_app.logger.info(f"User {user.username} stopped speaking in channel {channel_id}")
+        # The stop is written and announced once the debounce window passes
+        speaking.stop(current_app._get_current_object(), connection, channel_id)
         
     except Exception as e:
         current_app.logger.error(f"Stop speaking error: {str(e)}")
         emit('error', {'message': 'Failed to stop speaking'})
 
+@socketio.on('start_scan')
+def handle_start_scan(data):
+    """Monitor several channels by priority from this socket"""
+    try:
+        from flask import request
+        socket_id = request.sid
+        
+        if socket_id not in active_connections:
+            emit('error', {'message': 'Not authenticated'})
+            return
+        
+        connection = active_connections[socket_id]
+        user = connection['user']
+        
+        try:
+            priorities = {int(entry['channel_id']): int(entry.get('priority', 0))
+                          for entry in data.get('channels') or []}
+        except (KeyError, TypeError, ValueError, AttributeError):
+            emit('error', {'message': 'Invalid scan list'})
+            return
+        
+        if not priorities:
+            emit('error', {'message': 'Channels required'})
+            return
+        if len(priorities) > current_app.config['SCAN_MAX_CHANNELS']:
+            emit('error', {'message': f"At most {current_app.config['SCAN_MAX_CHANNELS']} channels can be scanned"})
+            return
+        
+        denied = scan_denied(user, priorities)
+        if denied:
+            emit('error', {'message': 'Not a member of these channels', 'channel_ids': denied})
+            return
+        
+        scan.start(socket_id, connection, priorities, current_app.config['SCAN_IDLE_MS'] / 1000.0)
+        emit('scan_started', scan_summary(priorities))
+        
+        current_app.logger.info(f"User {user.username} scanning {len(priorities)} channels")
+        
+    except Exception as e:
+        current_app.logger.error(f"Start scan error: {str(e)}")
+        emit('error', {'message': 'Failed to start scan'})
+
+@socketio.on('stop_scan')
+def handle_stop_scan(data=None):
+    """End this socket's scan subscription"""
+    try:
+        from flask import request
+        scan.stop(request.sid)
+        emit('scan_stopped', {})
+        
+    except Exception as e:
+        current_app.logger.error(f"Stop scan error: {str(e)}")
+        emit('error', {'message': 'Failed to stop scan'})
+
+def scan_denied(user, channel_ids):
+    """Channel ids the user may not scan: missing, inactive or not a member"""
+    found = {channel_id for (channel_id,) in db.session.query(Channel.id).filter(
+        Channel.id.in_(channel_ids), Channel.is_active.is_(True))}
+    denied = [channel_id for channel_id in channel_ids
+              if channel_id not in found or user.id not in membership.member_ids(channel_id)]
+    release_connection()
+    return denied
+
+def scan_summary(priorities):
+    """The scan_started payload for {channel id: priority}"""
+    return {
+        'channels': [{'channel_id': channel_id, 'priority': priority}
+                     for channel_id, priority in priorities.items()],
+        'active_channels': scan.active_channels(priorities)
+    }
+
 @socketio.on('audio_data')
 def handle_audio_data(data):
     """Handle incoming audio data"""
@@ -380,28 +637,107 @@ def handle_audio_data(data):
         if not audio_data:
             return
         
-        # Relay audio to other users in the channel (excluding sender)
-        emit('audio_data', {
-            'user_id': user.id,
-            'username': user.username,
-            'audio': audio_data,
-            'timestamp': datetime.utcnow().isoformat()
-        }, room=f"channel_{channel_id}", include_self=False)
-        
-        # Publish to Redis for scaling across multiple backend instances (if available)
-        redis_client = get_redis_client()
-        if redis_client:
-            try:
-                redis_client.publish(f"channel_{channel_id}_audio", json.dumps({
-                    'user_id': user.id,
-                    'username': user.username,
-                    'audio': audio_data,
-                    'timestamp': datetime.utcnow().isoformat(),
-                    'sender_socket': socket_id
-                }))
-            except Exception as e:
-                current_app.logger.warning(f"Redis publish failed: {e}")
+        # Shape the client's rate before doing any work on the frame
+        rejected = ratelimit.check_audio(socket_id, audio_data, current_app.config)
+        if rejected:
+            if rejected == 'new':
+                current_app.logger.warning(f"Throttling audio from user {user.username}")
+                emit('error', {'message': 'Audio rate limit exceeded'})
+            elif rejected != 'rate':
+                emit('error', {'message': 'Invalid audio frame'})
+            return
+        
+        metrics.inc('audio_frames_relayed')
+        # Frames without a format are in the deployment's configured one
+        audio_format = data.get('format') or current_app.config['AUDIO_FORMAT']
+        
+        # Channels with coalescing enabled relay frames in batches
+        interval = coalesce.channel_intervals.get(channel_id)
+        if interval:
+            coalesce.add_frame(current_app._get_current_object(), connection, socket_id,
+                               channel_id, audio_data, audio_format, interval)
+        else:
+            relay_audio(connection, socket_id, channel_id, [audio_data], audio_format)
+        
+        # Metered once relayed so the analysis never delays the audio
+        metering.add(current_app.config, connection['session_id'], audio_data, audio_format)
         
     except Exception as e:
         current_app.logger.error(f"Audio data error: {str(e)}")
         emit('error', {'message': 'Failed to process audio data'})
+
+def wants_opus(connection):
+    """Whether a connection should receive the server-transcoded stream"""
+    return 'opus' in connection.get('codecs', ()) and \
+        current_app.config['AUDIO_TRANSCODE'] and codec.available()
+
+def audio_payload(user, chunks, audio_format):
+    """Build an audio_data payload for one or more chunks from a speaker"""
+    payload = {
+        'user_id': user.id,
+        'username': user.username,
+        'timestamp': serialization.now()
+    }
+    if len(chunks) == 1:
+        payload['audio'] = chunks[0]
+    elif audio_format == 'pcm':
+        # Raw PCM chunks concatenate into one longer chunk
+        payload['audio'] = base64.b64encode(b''.join(base64.b64decode(c) for c in chunks)).decode('ascii')
+    else:
+        payload['frames'] = chunks
+    return payload
+
+def relay_audio(connection, socket_id, channel_id, chunks, audio_format):
+    """Relay a speaker's audio chunks to the rest of the channel"""
+    user = connection['user']
+    
+    # Opus listeners get a transcoded stream instead of the original
+    skip_sids = [socket_id]
+    opus_listeners = codec.codec_listeners.get(channel_id)
+    if opus_listeners:
+        relay_transcoded(user, socket_id, channel_id, chunks, audio_format)
+        skip_sids += list(opus_listeners)
+    
+    # Relay audio to other users in the channel (excluding sender)
+    payload = audio_payload(user, chunks, audio_format)
+    socketio.emit('audio_data', payload, room=f"channel_{channel_id}", skip_sid=skip_sids)
+    scan.deliver(channel_id, 'audio_data', payload)
+    broadcast.publish(current_app._get_current_object(), channel_id, 'audio_data', payload)
+    
+    # Reach listeners of this channel on other nodes
+    sharding.forward(channel_id, 'audio_data', payload)
+
+def relay_transcoded(user, socket_id, channel_id, chunks, audio_format):
+    """Transcode a speaker's chunks and send them to each Opus listener tier"""
+    config = current_app.config
+    bitrate = codec.channel_bitrates.get(channel_id) or config['AUDIO_OPUS_BITRATE']
+    bitrates = {'normal': bitrate, 'low': min(bitrate, config['AUDIO_OPUS_LOW_BITRATE'])}
+    codec.refresh_tiers(channel_id, config['AUDIO_BACKLOG_THRESHOLD'])
+    
+    try:
+        packets = {rate: [] for rate in bitrates.values()}
+        for chunk in chunks:
+            encoded = codec.transcode(socket_id, base64.b64decode(chunk), audio_format,
+                                      set(bitrates.values()), config['AUDIO_SAMPLE_RATE'])
+            for rate, frames in encoded.items():
+                packets[rate] += frames
+    except Exception as e:
+        current_app.logger.warning(f"Audio transcode failed, relaying original: {e}")
+        metrics.inc('codec_failures')
+        payload = audio_payload(user, chunks, audio_format)
+        for tier in bitrates:
+            socketio.emit('audio_data', payload, room=codec.opus_room(channel_id, tier), skip_sid=socket_id)
+        return
+    
+    for tier, tier_bitrate in bitrates.items():
+        frames = packets[tier_bitrate]
+        if not frames:
+            continue
+        socketio.emit('audio_data', {
+            'user_id': user.id,
+            'username': user.username,
+            'codec': 'opus',
+            'bitrate': tier_bitrate,
+            'frames': [base64.b64encode(frame).decode('ascii') for frame in frames],
+            'timestamp': serialization.now()
+        }, room=codec.opus_room(channel_id, tier), skip_sid=socket_id)
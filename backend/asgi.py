@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Push-to-Talk Backend Server, thread-pool ASGI entry point
+
+Runs the same app on python-socketio's AsyncServer without eventlet; the
+socket handlers and REST views run in thread pools (see app/asgi_bridge.py):
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+
+import os
+import runpy
+
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'threading')
+
+from app.asgi_bridge import build_asgi_app
+
+# Reuse app.py so the extra endpoints (health, metrics) are served too
+flask_app = runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py'),
+                           run_name='ptt_app')['app']
+
+application = build_asgi_app(flask_app)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Audio relay latency and throughput benchmark
+
+Connects one speaker and N listeners (all logged in as the same member of
+the channel) to a running server, sends timestamped PCM frames at a fixed
+rate and reports end-to-end latency percentiles and delivered frames/sec.
+Works against either run mode:
+
+    python app.py                                   # eventlet
+    uvicorn asgi:application --port 5000            # thread-pool ASGI
+    python benchmarks/relay_latency.py --username alice --password secret --channel-id 1
+"""
+
+import argparse
+import base64
+import statistics
+import struct
+import threading
+import time
+import requests
+import socketio
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def connect(url, token, channel_id, on_audio=None):
+    client = socketio.Client(reconnection=False)
+    joined = threading.Event()
+    client.on('channel_state', lambda data: joined.set())
+    if on_audio:
+        client.on('audio_data', on_audio)
+    client.connect(url, auth={'token': token}, transports=['websocket'])
+    client.emit('join_channel', {'channel_id': channel_id})
+    if not joined.wait(10):
+        raise RuntimeError('Timed out joining the channel')
+    return client
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--channel-id', type=int, required=True)
+    parser.add_argument('--listeners', type=int, default=10)
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=40, help='Frames per second (keep under AUDIO_MAX_FRAMES_PER_SEC)')
+    parser.add_argument('--frame-bytes', type=int, default=640, help='Frame size; 640 is 20ms of 16kHz PCM')
+    args = parser.parse_args()
+
+    response = requests.post(f"{args.url}/api/auth/login",
+                             json={'username': args.username, 'password': args.password})
+    response.raise_for_status()
+    token = response.json()['access_token']
+
+    latencies = []
+    lock = threading.Lock()
+
+    def on_audio(data):
+        sent_at, = struct.unpack('!d', base64.b64decode(data['audio'])[:8])
+        with lock:
+            latencies.append(time.time() - sent_at)
+
+    listeners = [connect(args.url, token, args.channel_id, on_audio) for _ in range(args.listeners)]
+    speaker = connect(args.url, token, args.channel_id)
+    speaker.emit('start_speaking')
+    time.sleep(0.5)
+
+    padding = b'\0' * max(0, args.frame_bytes - 8)
+    interval = 1.0 / args.rate
+    started = time.time()
+    for i in range(args.frames):
+        frame = struct.pack('!d', time.time()) + padding
+        speaker.emit('audio_data', {'audio': base64.b64encode(frame).decode('ascii'), 'format': 'pcm'})
+        time.sleep(max(0.0, started + (i + 1) * interval - time.time()))
+    speaker.emit('stop_speaking')
+    time.sleep(2)
+    elapsed = time.time() - started
+
+    for client in listeners + [speaker]:
+        client.disconnect()
+
+    expected = args.frames * args.listeners
+    print(f"frames sent        {args.frames} to {args.listeners} listeners")
+    print(f"frames delivered   {len(latencies)} / {expected} ({100.0 * len(latencies) / expected:.1f}%)")
+    print(f"delivered/sec      {len(latencies) / elapsed:.0f}")
+    if latencies:
+        ms = [l * 1000 for l in latencies]
+        print(f"latency ms         p50 {percentile(ms, 50):.1f}  p95 {percentile(ms, 95):.1f}  "
+              f"p99 {percentile(ms, 99):.1f}  max {max(ms):.1f}  mean {statistics.mean(ms):.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Socket event replay benchmark
+
+Plays back a capture recorded with SOCKET_CAPTURE_PATH (see
+app/capture.py), keeping the recorded timing at 1x or any speed-up, and
+reports per-event handler latency and, in-process, DB queries per event.
+
+In-process (default) the capture drives socketio.test_client clients
+against an app built with the testing config: in-memory SQLite and
+fakeredis (when installed), with the captured users and channels seeded
+and every user a member of every channel. Latency is the time to
+dispatch each event through its handler.
+
+With --url the capture drives real clients against a running server,
+all logged in as --username (who must be a member of the captured
+channels). Latency is then the round trip until the event is
+acknowledged, and query counts are not available.
+
+    SOCKET_CAPTURE_PATH=/tmp/ptt.ndjson.gz python app.py
+    python benchmarks/replay.py /tmp/ptt.ndjson.gz --speed 10 --output base.json
+    # ... change the code ...
+    python benchmarks/replay.py /tmp/ptt.ndjson.gz --speed 10 --output new.json --compare base.json
+
+The comparison exits with status 1 when an event's p95 latency grew by
+more than --threshold percent (and at least 0.5 ms) or it runs more
+queries per call than before.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def load(path):
+    from app.capture import read_capture
+    records = read_capture(path)
+    header = next(records)
+    return header, list(records)
+
+def summarize(samples, elapsed, mode):
+    """Per-event latency and query statistics from (event, seconds, queries) samples"""
+    by_event = {}
+    for event, seconds, queries in samples:
+        by_event.setdefault(event, ([], []))
+        by_event[event][0].append(seconds * 1000)
+        if queries is not None:
+            by_event[event][1].append(queries)
+
+    events = {}
+    for event, (ms, queries) in sorted(by_event.items()):
+        events[event] = {
+            'count': len(ms),
+            'p50_ms': round(percentile(ms, 50), 3),
+            'p95_ms': round(percentile(ms, 95), 3),
+            'p99_ms': round(percentile(ms, 99), 3),
+            'max_ms': round(max(ms), 3),
+            'mean_ms': round(statistics.mean(ms), 3),
+            'queries_per_call': round(statistics.mean(queries), 2) if queries else None
+        }
+    return {'mode': mode, 'elapsed_s': round(elapsed, 3), 'events': events}
+
+def build_app(records):
+    """Create a testing app seeded with the capture's users and channels"""
+    os.environ.setdefault('REDIS_URL', 'redis://127.0.0.1:1/0')
+    import app as app_package
+    from app import create_app, db, membership
+    from app.models import User, Channel
+
+    app = create_app('testing')
+    try:
+        import fakeredis
+        app_package.redis_client = fakeredis.FakeRedis()
+    except ImportError:
+        print("fakeredis is not installed, replaying without Redis", file=sys.stderr)
+
+    user_ids = {r['data']['user_id'] for r in records
+                if r['event'] == 'connect' and r['data'] and r['data'].get('user_id')}
+    channel_ids = set()
+    for r in records:
+        data = r['data'] if isinstance(r['data'], dict) else {}
+        if r['event'] in ('join_channel', 'leave_channel') and data.get('channel_id'):
+            channel_ids.add(int(data['channel_id']))
+        elif r['event'] == 'start_scan':
+            channel_ids.update(int(c['channel_id']) for c in data.get('channels') or [])
+
+    with app.app_context():
+        for user_id in sorted(user_ids):
+            user = User(id=user_id, username=f"replay{user_id}")
+            # Replay users never log in, so skip the slow hash
+            user.password_hash = '!'
+            db.session.add(user)
+        db.session.flush()
+        owner = min(user_ids) if user_ids else None
+        for channel_id in sorted(channel_ids):
+            db.session.add(Channel(id=channel_id, name=f"replay-{channel_id}", created_by=owner,
+                                   max_users=len(user_ids) or 1))
+        db.session.flush()
+        for channel_id in channel_ids:
+            for user_id in user_ids:
+                membership.add_member(channel_id, user_id, enforce_capacity=False)
+        db.session.commit()
+    return app
+
+def replay_in_process(records, speed):
+    from sqlalchemy import event as sa_event
+    from flask_jwt_extended import create_access_token
+    from app import socketio, db
+
+    app = build_app(records)
+    queries = [0]
+
+    def count_query(*args):
+        queries[0] += 1
+
+    with app.app_context():
+        for engine in db.engines.values():
+            sa_event.listen(engine, 'before_cursor_execute', count_query)
+        tokens = {}
+        for r in records:
+            user_id = r['data'].get('user_id') if r['event'] == 'connect' and r['data'] else None
+            if user_id and user_id not in tokens:
+                tokens[user_id] = create_access_token(identity=user_id)
+
+    http = app.test_client()
+    clients = {}
+    samples = []
+    started = time.perf_counter()
+    for n, r in enumerate(records):
+        if speed:
+            # Waiting on the hub lets background tasks (timers, flushes) run
+            delay = started + r['t'] / speed - time.perf_counter()
+            if delay > 0:
+                socketio.sleep(delay)
+
+        client = clients.get(r['client'])
+        event = r['event']
+        before = queries[0]
+        sent = time.perf_counter()
+        if event == 'connect':
+            user_id = r['data'].get('user_id') if r['data'] else None
+            if user_id is None:
+                continue
+            clients[r['client']] = socketio.test_client(app, auth={'token': tokens[user_id]},
+                                                        flask_test_client=http)
+        elif client is None:
+            # The socket connected before the capture started
+            continue
+        elif event == 'disconnect':
+            client.disconnect()
+            del clients[r['client']]
+        else:
+            args = () if r['data'] is None else (r['data'],)
+            client.emit(event, *args)
+        samples.append((event, time.perf_counter() - sent, queries[0] - before))
+
+        if n % 500 == 0:
+            for c in clients.values():
+                c.get_received()
+
+    socketio.sleep(0.5)
+    elapsed = time.perf_counter() - started
+    for client in clients.values():
+        client.disconnect()
+    return summarize(samples, elapsed, 'in-process')
+
+def replay_clients(records, speed, url, username, password):
+    import requests
+    import socketio
+
+    response = requests.post(f"{url}/api/auth/login", json={'username': username, 'password': password})
+    response.raise_for_status()
+    token = response.json()['access_token']
+
+    by_client = {}
+    for r in records:
+        by_client.setdefault(r['client'], []).append(r)
+
+    samples = []
+    lock = threading.Lock()
+    started = time.perf_counter() + 1.0
+
+    def run(client_records):
+        client = None
+        for r in client_records:
+            if speed:
+                time.sleep(max(0.0, started + r['t'] / speed - time.perf_counter()))
+            event = r['event']
+            sent = time.perf_counter()
+            try:
+                if event == 'connect':
+                    client = socketio.Client(reconnection=False)
+                    client.connect(url, auth={'token': token}, transports=['websocket'])
+                elif client is None:
+                    continue
+                elif event == 'disconnect':
+                    client.disconnect()
+                    client = None
+                else:
+                    client.call(event, r['data'], timeout=10)
+            except Exception as e:
+                print(f"{event} failed: {e}", file=sys.stderr)
+                continue
+            with lock:
+                samples.append((event, time.perf_counter() - sent, None))
+        if client is not None:
+            client.disconnect()
+
+    threads = [threading.Thread(target=run, args=(client_records,), daemon=True)
+               for client_records in by_client.values()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, time.perf_counter() - started, 'clients')
+
+def compare(baseline, current, threshold):
+    """Print a per-event comparison, returning the events that regressed"""
+    regressions = []
+    print(f"{'event':<18}{'count':>7}{'p50 ms':>16}{'p95 ms':>16}{'change':>9}{'queries':>14}")
+    for event in sorted(set(baseline['events']) | set(current['events'])):
+        old = baseline['events'].get(event)
+        new = current['events'].get(event)
+        if old is None or new is None:
+            print(f"{event:<18}{'only in ' + ('current' if old is None else 'baseline'):>30}")
+            continue
+
+        change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+        old_q, new_q = old['queries_per_call'], new['queries_per_call']
+        regressed = (change > threshold and new['p95_ms'] - old['p95_ms'] >= 0.5) or \
+            (old_q is not None and new_q is not None and new_q > old_q)
+        if regressed:
+            regressions.append(event)
+        queries = f"{old_q}->{new_q}" if old_q is not None else '-'
+        print(f"{event:<18}{new['count']:>7}{old['p50_ms']:>8.2f}{new['p50_ms']:>8.2f}"
+              f"{old['p95_ms']:>8.2f}{new['p95_ms']:>8.2f}{change:>+8.0f}%{queries:>14}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('capture', help='Capture file written with SOCKET_CAPTURE_PATH')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed-up, 0 for as fast as possible')
+    parser.add_argument('--url', help='Replay with real clients against this server')
+    parser.add_argument('--username', help='Login for --url')
+    parser.add_argument('--password', help='Password for --url')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Results JSON of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=20.0, help='Allowed p95 increase in percent')
+    args = parser.parse_args()
+
+    header, records = load(args.capture)
+    if args.url:
+        if not args.username or not args.password:
+            parser.error('--url needs --username and --password')
+        result = replay_clients(records, args.speed, args.url, args.username, args.password)
+    else:
+        result = replay_in_process(records, args.speed)
+    result['capture'] = {'path': args.capture, 'started_at': header.get('started_at'),
+                         'events': len(records), 'speed': args.speed}
+
+    print(f"replayed {len(records)} events in {result['elapsed_s']:.1f}s ({result['mode']})")
+    for event, stats in result['events'].items():
+        queries = stats['queries_per_call']
+        print(f"  {event:<18}{stats['count']:>7}  p50 {stats['p50_ms']:.2f}  p95 {stats['p95_ms']:.2f}  "
+              f"p99 {stats['p99_ms']:.2f}  max {stats['max_ms']:.2f} ms"
+              + (f"  {queries} queries" if queries is not None else ''))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(baseline, result, args.threshold)
+        if regressions:
+            print(f"\nRegressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Worker startup benchmark
+
+Reports, as the median of several runs in fresh interpreters:
+  import     time to import the app package
+  create     time for create_app()
+  ready      time from spawning a server until /api/health answers
+
+Compare normal and fast-start boots, e.g.:
+
+    python benchmarks/startup.py
+    FAST_START=true python benchmarks/startup.py
+    python benchmarks/startup.py --mode asgi
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE_IMPORT = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+created = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create': created - imported}))
+"""
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def measure_import(env):
+    output = subprocess.run([sys.executable, '-c', MEASURE_IMPORT], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure_ready(env, mode, timeout):
+    port = free_port()
+    env = dict(env, PORT=str(port))
+    if mode == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:application', '--port', str(port),
+                   '--log-level', 'warning']
+    else:
+        command = [sys.executable, 'app.py']
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f'Server did not become ready within {timeout}s')
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure worker startup time')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--mode', choices=['eventlet', 'asgi'], default='eventlet')
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PRESENCE_REAPER_INTERVAL=os.environ.get('PRESENCE_REAPER_INTERVAL', '0'))
+    results = {'import': [], 'create': [], 'ready': []}
+    for _ in range(args.runs):
+        timings = measure_import(env)
+        results['import'].append(timings['import'])
+        results['create'].append(timings['create'])
+        results['ready'].append(measure_ready(env, args.mode, args.timeout))
+
+    print(f"mode {args.mode}, FAST_START={env.get('FAST_START', 'false')}, {args.runs} runs (median / max)")
+    for name, values in results.items():
+        print(f"  {name:<8} {statistics.median(values) * 1000:7.0f} ms  {max(values) * 1000:7.0f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Add online_users.instance_id and presence indexes
+
+Each backend node stamps the rows it creates so rows left by a dead
+node can be found and expired.
+
+Revision ID: 3b7e0d52a9c1
+Revises: 1fcccea36a5c
+Create Date: 2026-10-19 00:30:10.412305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e0d52a9c1'
+down_revision = '1fcccea36a5c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('online_users')}
+    indexes = {index['name'] for index in inspector.get_indexes('online_users')}
+
+    with op.batch_alter_table('online_users', schema=None) as batch_op:
+        if 'instance_id' not in columns:
+            batch_op.add_column(sa.Column('instance_id', sa.String(length=100), nullable=True))
+        if 'ix_online_users_instance_id' not in indexes:
+            batch_op.create_index(batch_op.f('ix_online_users_instance_id'), ['instance_id'], unique=False)
+        if 'ix_online_users_last_activity' not in indexes:
+            batch_op.create_index(batch_op.f('ix_online_users_last_activity'), ['last_activity'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('online_users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_online_users_last_activity'))
+        batch_op.drop_index(batch_op.f('ix_online_users_instance_id'))
+        batch_op.drop_column('instance_id')
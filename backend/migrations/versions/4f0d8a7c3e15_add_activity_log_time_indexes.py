@@ -0,0 +1,33 @@
+"""Add time-range indexes on activity_logs
+
+Exports and talk stats read one channel's or one user's logs by time.
+
+Revision ID: 4f0d8a7c3e15
+Revises: c5a913e7b264
+Create Date: 2026-10-19 00:36:31.415656
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f0d8a7c3e15'
+down_revision = 'c5a913e7b264'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    indexes = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('activity_logs')}
+    with op.batch_alter_table('activity_logs', schema=None) as batch_op:
+        if 'ix_activity_logs_channel_timestamp' not in indexes:
+            batch_op.create_index('ix_activity_logs_channel_timestamp', ['channel_id', 'timestamp'], unique=False)
+        if 'ix_activity_logs_user_timestamp' not in indexes:
+            batch_op.create_index('ix_activity_logs_user_timestamp', ['user_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activity_logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_logs_user_timestamp')
+        batch_op.drop_index('ix_activity_logs_channel_timestamp')
@@ -0,0 +1,30 @@
+"""Add channels.audio_bitrate
+
+Per-channel Opus target bitrate, NULL for the server default.
+
+Revision ID: 8c24f6e1d0b7
+Revises: 3b7e0d52a9c1
+Create Date: 2026-10-19 00:32:17.413422
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c24f6e1d0b7'
+down_revision = '3b7e0d52a9c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('channels')}
+    if 'audio_bitrate' not in columns:
+        with op.batch_alter_table('channels', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('audio_bitrate', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('channels', schema=None) as batch_op:
+        batch_op.drop_column('audio_bitrate')
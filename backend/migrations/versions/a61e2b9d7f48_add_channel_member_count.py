@@ -0,0 +1,46 @@
+"""Add channels.member_count and a channel-first membership index
+
+member_count is backfilled from user_channels; from then on the app
+keeps it in step with every membership change.
+
+Revision ID: a61e2b9d7f48
+Revises: 4f0d8a7c3e15
+Create Date: 2026-10-19 00:38:38.416773
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a61e2b9d7f48'
+down_revision = '4f0d8a7c3e15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('channels')}
+    indexes = {index['name'] for index in inspector.get_indexes('user_channels')}
+
+    if 'member_count' not in columns:
+        with op.batch_alter_table('channels', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('member_count', sa.Integer(), server_default='0', nullable=False))
+    if 'ix_user_channels_channel_user' not in indexes:
+        with op.batch_alter_table('user_channels', schema=None) as batch_op:
+            batch_op.create_index('ix_user_channels_channel_user', ['channel_id', 'user_id'], unique=False)
+
+    # Recount even if the column was already there, so the stored counts
+    # are right whichever way it was created
+    op.execute(
+        "UPDATE channels SET member_count = "
+        "(SELECT COUNT(*) FROM user_channels WHERE user_channels.channel_id = channels.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user_channels', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_channels_channel_user')
+    with op.batch_alter_table('channels', schema=None) as batch_op:
+        batch_op.drop_column('member_count')
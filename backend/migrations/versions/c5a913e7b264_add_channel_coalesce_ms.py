@@ -0,0 +1,30 @@
+"""Add channels.coalesce_ms
+
+Per-channel audio frame batching interval, NULL to relay each frame.
+
+Revision ID: c5a913e7b264
+Revises: 8c24f6e1d0b7
+Create Date: 2026-10-19 00:34:24.414539
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a913e7b264'
+down_revision = '8c24f6e1d0b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('channels')}
+    if 'coalesce_ms' not in columns:
+        with op.batch_alter_table('channels', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('coalesce_ms', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('channels', schema=None) as batch_op:
+        batch_op.drop_column('coalesce_ms')
@@ -0,0 +1,31 @@
+"""Add channels.channel_type
+
+'standard' or 'broadcast'; existing channels become standard.
+
+Revision ID: e3d07c5b8a92
+Revises: a61e2b9d7f48
+Create Date: 2026-10-19 00:40:45.417890
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3d07c5b8a92'
+down_revision = 'a61e2b9d7f48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('channels')}
+    if 'channel_type' not in columns:
+        with op.batch_alter_table('channels', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('channel_type', sa.String(length=20), server_default='standard',
+                                          nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('channels', schema=None) as batch_op:
+        batch_op.drop_column('channel_type')
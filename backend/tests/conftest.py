@@ -0,0 +1,82 @@
+"""Shared fixtures: testing apps on SQLite, without Redis"""
+import os
+import pytest
+
+# Nothing listens on port 1, so apps run without Redis as in development
+os.environ.setdefault('REDIS_URL', 'redis://127.0.0.1:1/0')
+
+from flask_jwt_extended import create_access_token
+from app import create_app, db, cache, drain, membership, speaking, websocket_events
+from app import database
+from app.models import User, Channel
+
+def reset_state():
+    """Forget per-process state kept by a previous test's app"""
+    membership._member_cache.clear()
+    cache._local_versions.clear()
+    websocket_events.active_connections.clear()
+    websocket_events.resumable_sessions.clear()
+    speaking.pending_stops.clear()
+    speaking.channel_broadcasts.clear()
+    drain.drain_state.clear()
+    database._replica_state.update(checked_at=None, usable=False)
+
+@pytest.fixture
+def make_app():
+    """Factory for testing apps; config overrides are applied before create_app"""
+    from config import TestingConfig
+    created = []
+    saved = {}
+
+    def make(**overrides):
+        for key, value in overrides.items():
+            saved.setdefault(key, getattr(TestingConfig, key, None))
+            setattr(TestingConfig, key, value)
+        reset_state()
+        app = create_app('testing')
+        created.append(app)
+        return app
+
+    yield make
+
+    for app in created:
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+    for key, value in saved.items():
+        setattr(TestingConfig, key, value)
+    reset_state()
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    """An in-memory Redis used by the app in place of a real server"""
+    import fakeredis
+    import app as app_package
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(app_package, 'redis_client', client)
+    return client
+
+def add_user(username, is_admin=False):
+    """Create a user that never logs in (skipping the slow password hash)"""
+    user = User(username=username, is_admin=is_admin)
+    user.password_hash = '!'
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+def add_channel(name, owner, members=()):
+    channel = Channel(name=name, created_by=owner.id)
+    db.session.add(channel)
+    db.session.flush()
+    for user in members:
+        membership.add_member(channel.id, user.id)
+    return channel
+
+def auth_headers(app, user_id):
+    with app.app_context():
+        return {'Authorization': f"Bearer {create_access_token(identity=user_id)}"}
@@ -0,0 +1,107 @@
+"""ETag revalidation of cached views and what invalidates them"""
+from datetime import datetime
+import pytest
+from app import db, presence
+from app.models import User, Channel, OnlineUser, ActivityLog
+from conftest import add_user, add_channel, auth_headers
+
+@pytest.fixture
+def client(app):
+    """Test client for a member of two channels, each with one user online"""
+    with app.app_context():
+        owner = add_user('owner')
+        channels = [add_channel(name, owner, [owner]) for name in ('first', 'second')]
+        for channel in channels:
+            db.session.add(OnlineUser(user_id=owner.id, channel_id=channel.id,
+                                      socket_id=f"sid-{channel.id}"))
+        db.session.commit()
+        app.config['TEST_IDS'] = {'owner': owner.id, 'channels': [c.id for c in channels]}
+    return app.test_client()
+
+class Views:
+    """Remembers each view's ETag and reports which ones changed since"""
+
+    def __init__(self, app, client):
+        ids = app.config['TEST_IDS']
+        self.client = client
+        self.headers = auth_headers(app, ids['owner'])
+        self.paths = {'list': '/api/channels', 'users': '/api/users',
+                      **{f"channel {i}": f"/api/channels/{channel_id}"
+                         for i, channel_id in enumerate(ids['channels'])}}
+        self.etags = {name: self.get(path).headers['ETag'] for name, path in self.paths.items()}
+
+    def get(self, path, etag=None):
+        headers = dict(self.headers, **({'If-None-Match': etag} if etag else {}))
+        return self.client.get(path, headers=headers)
+
+    def changed(self):
+        changed = set()
+        for name, path in self.paths.items():
+            response = self.get(path, self.etags[name])
+            if response.status_code != 304:
+                assert response.status_code == 200
+                changed.add(name)
+                self.etags[name] = response.headers['ETag']
+        return changed
+
+@pytest.fixture
+def views(app, client):
+    return Views(app, client)
+
+def write(app, change):
+    with app.app_context():
+        change(app.config['TEST_IDS'])
+        db.session.commit()
+
+def online(ids, index=0):
+    return OnlineUser.query.filter_by(socket_id=f"sid-{ids['channels'][index]}").one()
+
+def test_unchanged_view_is_not_modified(views):
+    response = views.get(views.paths['channel 0'], views.etags['channel 0'])
+    assert response.status_code == 304
+    assert response.data == b''
+    assert views.changed() == set()
+
+def test_channel_update_invalidates_list_and_detail(app, views):
+    write(app, lambda ids: setattr(db.session.get(Channel, ids['channels'][0]), 'description', 'new'))
+    assert views.changed() == {'list', 'channel 0'}
+
+def test_activity_invalidates_its_channel_only(app, views):
+    write(app, lambda ids: db.session.add(ActivityLog(
+        user_id=ids['owner'], channel_id=ids['channels'][1], action='join')))
+    assert views.changed() == {'channel 1'}
+
+def test_speaking_invalidates_its_channel_only(app, views):
+    write(app, lambda ids: setattr(online(ids), 'is_speaking', True))
+    assert views.changed() == {'channel 0'}
+
+def test_presence_refresh_invalidates_nothing(app, views):
+    write(app, lambda ids: setattr(online(ids), 'last_activity', datetime.utcnow()))
+    assert views.changed() == set()
+
+    with app.app_context():
+        presence.touch_live_sessions(app, datetime.utcnow())
+    assert views.changed() == set()
+
+def test_last_seen_invalidates_users_only(app, views):
+    write(app, lambda ids: setattr(db.session.get(User, ids['owner']), 'last_seen', datetime.utcnow()))
+    assert views.changed() == {'users'}
+
+    write(app, lambda ids: setattr(db.session.get(User, ids['owner']), 'username', 'renamed'))
+    assert views.changed() == {'users', 'channel 0', 'channel 1'}
+
+def test_presence_changes_invalidate_counts(app, views):
+    def arrive(ids):
+        user = add_user('arriving')
+        db.session.add(OnlineUser(user_id=user.id, channel_id=ids['channels'][1], socket_id='new'))
+    write(app, arrive)
+    assert views.changed() == {'list', 'users', 'channel 1'}
+
+    # An expired row leaves its own channel only
+    with app.app_context():
+        assert presence.remove_rows(OnlineUser.query.filter_by(socket_id='new'), 10) == 1
+    assert views.changed() == {'list', 'channel 1'}
+
+def test_unkeyed_bulk_delete_invalidates_every_channel(app, views):
+    write(app, lambda ids: OnlineUser.query.filter_by(socket_id='unknown').delete())
+    assert views.changed() == {'list', 'channel 0', 'channel 1'}
@@ -0,0 +1,120 @@
+"""Shared per-process state under concurrent handler threads (ASGI mode)"""
+import sys
+import threading
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db, socketio, sharding, broadcast, codec, outbox, ratelimit, websocket_events
+from app.models import OnlineUser
+from conftest import add_user, add_channel
+
+THREADS = 8
+
+@pytest.fixture(autouse=True)
+def frequent_switches():
+    """Switch threads every few bytecodes so unguarded updates interleave"""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+def in_threads(work, count=THREADS):
+    errors = []
+
+    def run(index):
+        try:
+            work(index)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+def test_listener_counts(app):
+    def work(index):
+        for _ in range(2000):
+            sharding.listener_joined(1)
+            sharding.listener_left(1)
+
+    in_threads(work)
+    assert sharding.local_listeners == {}
+
+@pytest.fixture
+def no_rooms(app, monkeypatch):
+    """Made-up sids have no socket to put in a room; only the counts matter"""
+    monkeypatch.setattr(socketio.server, 'enter_room', lambda *args, **kwargs: None)
+    monkeypatch.setattr(socketio.server, 'leave_room', lambda *args, **kwargs: None)
+
+def test_broadcast_subrooms(app, no_rooms):
+    def work(index):
+        for i in range(300):
+            sid = f"{index}-{i}"
+            subroom = broadcast.add_listener(1, sid, 4)
+            broadcast.remove_listener(1, sid, subroom)
+
+    in_threads(work)
+    assert broadcast.subroom_sizes == {}
+
+def test_codec_listeners(app, no_rooms):
+    def work(index):
+        for i in range(300):
+            codec.add_listener(1, f"{index}-{i}")
+            codec.remove_listener(1, f"{index}-{i}")
+
+    with app.app_context():
+        in_threads(work)
+    assert codec.codec_listeners == {}
+
+def test_outbox_limit(make_app, monkeypatch):
+    app = make_app(REDIS_BATCH_QUEUE_LIMIT=50)
+    monkeypatch.setattr(socketio, 'start_background_task', lambda f, *args: None)
+    try:
+        in_threads(lambda index: [outbox.publish(app, 'inbox', i) for i in range(1000)])
+        assert len(outbox.queue) == 50
+    finally:
+        outbox.queue.clear()
+        outbox._flusher['running'] = False
+
+def test_rate_limit_burst(app, monkeypatch):
+    monkeypatch.setattr(ratelimit.time, 'monotonic', lambda: 1000.0)
+    accepted = []
+    in_threads(lambda index: accepted.extend(
+        ratelimit.check_audio('sid', 'AAAA', app.config) is None for _ in range(100)))
+    ratelimit.release('sid')
+    # One burst in total, however the frames interleave
+    burst = app.config['AUDIO_MAX_FRAMES_PER_SEC'] * app.config['AUDIO_RATE_BURST_SECONDS']
+    assert accepted.count(True) == burst
+
+def test_concurrent_joins_and_leaves(make_app, tmp_path):
+    app = make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'ptt.db'}",
+                   SESSION_RESUME_GRACE_SECONDS=0)
+    with app.app_context():
+        users = [add_user(f"user{i}") for i in range(THREADS)]
+        channel = add_channel('busy', users[0], users)
+        db.session.commit()
+        tokens = [create_access_token(identity=user.id) for user in users]
+        channel_id = channel.id
+
+    def work(index):
+        client = socketio.test_client(app, auth={'token': tokens[index]},
+                                      flask_test_client=app.test_client())
+        for _ in range(10):
+            client.emit('join_channel', {'channel_id': channel_id})
+            client.emit('leave_channel', {})
+        client.emit('join_channel', {'channel_id': channel_id})
+        errors = [packet['args'][0] for packet in client.get_received() if packet['name'] == 'error']
+        assert errors == []
+
+    in_threads(work)
+    assert sharding.local_listeners == {channel_id: THREADS}
+    assert len(websocket_events.active_connections) == THREADS
+    with app.app_context():
+        assert OnlineUser.query.filter_by(channel_id=channel_id).count() == THREADS
+
+    for sid in list(websocket_events.active_connections):
+        socketio.server.disconnect(sid, namespace='/')
+    assert sharding.local_listeners == {}
+    assert not websocket_events.active_connections
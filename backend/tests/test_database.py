@@ -0,0 +1,103 @@
+"""Read-replica routing in RoutingSession"""
+import shutil
+import pytest
+from flask import g
+from sqlalchemy import create_engine, text
+from app import db, metrics
+from app import database
+from app.models import User
+from conftest import add_user, auth_headers
+
+@pytest.fixture
+def primary_path(tmp_path):
+    return tmp_path / 'primary.db'
+
+def make_replica_app(make_app, primary_path, replica_url):
+    app = make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{primary_path}",
+                   DATABASE_REPLICA_URL=replica_url)
+    with app.app_context():
+        admin = add_user('admin', is_admin=True)
+        db.session.commit()
+        app.config['TEST_ADMIN_ID'] = admin.id
+    return app
+
+@pytest.fixture
+def replica_app(make_app, primary_path, tmp_path):
+    """App whose replica is a copy of the primary taken before 'fresh' was added"""
+    replica_path = tmp_path / 'replica.db'
+    app = make_replica_app(make_app, primary_path, f"sqlite:///{replica_path}")
+    shutil.copy(primary_path, replica_path)
+    with app.app_context():
+        add_user('fresh')
+        db.session.commit()
+    return app
+
+def listed_usernames(app):
+    response = app.test_client().get('/api/users',
+                                     headers=auth_headers(app, app.config['TEST_ADMIN_ID']))
+    assert response.status_code == 200
+    return {user['username'] for user in response.get_json()['users']}
+
+def fallbacks():
+    return metrics._counters.get(('db_replica_fallbacks', ()), 0)
+
+def test_replica_views_read_from_replica(replica_app):
+    assert listed_usernames(replica_app) == {'admin'}
+
+def test_other_reads_use_primary(replica_app):
+    with replica_app.test_request_context():
+        assert db.session.get_bind() is db.engines[None]
+    with replica_app.app_context():
+        assert db.session.get_bind() is db.engines[None]
+
+def test_writes_in_replica_views_go_to_primary(replica_app, primary_path, tmp_path):
+    with replica_app.test_request_context():
+        g.db_read_replica = True
+        assert db.session.get_bind() is db.engines['replica']
+        add_user('written')
+        db.session.commit()
+
+    for path in (primary_path, tmp_path / 'replica.db'):
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.connect() as conn:
+            found = conn.execute(text("SELECT COUNT(*) FROM users WHERE username = 'written'")).scalar()
+        engine.dispose()
+        assert found == (1 if path == primary_path else 0)
+
+def test_unreachable_replica_falls_back_to_primary(make_app, primary_path, tmp_path):
+    # SQLite creates a missing database file, but not a missing directory
+    app = make_replica_app(make_app, primary_path, f"sqlite:///{tmp_path / 'gone' / 'replica.db'}")
+    with app.app_context():
+        add_user('fresh')
+        db.session.commit()
+
+    before = fallbacks()
+    assert listed_usernames(app) == {'admin', 'fresh'}
+    assert fallbacks() > before
+    assert database._replica_state['usable'] is False
+
+def test_lagging_replica_falls_back_to_primary(replica_app, monkeypatch):
+    monkeypatch.setattr(database, 'replica_lag',
+                        lambda conn: replica_app.config['DB_REPLICA_MAX_LAG_SECONDS'] + 1)
+    assert listed_usernames(replica_app) == {'admin', 'fresh'}
+    assert database._replica_state['usable'] is False
+
+def test_replica_health_is_checked_once_per_interval(replica_app, monkeypatch):
+    checks = []
+
+    def lag(conn):
+        checks.append(conn)
+        return 0.0
+
+    monkeypatch.setattr(database, 'replica_lag', lag)
+    replica_app.config['DB_REPLICA_CHECK_INTERVAL'] = 60
+    listed_usernames(replica_app)
+    listed_usernames(replica_app)
+    assert len(checks) == 1
+
+    # A replica that failed its last check is used again once a later check passes
+    database._replica_state.update(checked_at=None, usable=False)
+    with replica_app.test_request_context():
+        g.db_read_replica = True
+        assert db.session.get_bind() is db.engines['replica']
+        assert User.query.filter_by(username='fresh').first() is None
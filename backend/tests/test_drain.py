@@ -0,0 +1,65 @@
+"""Draining a node: sockets moved off, then exit only for the stop signal"""
+import signal
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db, socketio, drain, websocket_events
+from app.models import OnlineUser
+from conftest import add_user, add_channel
+
+@pytest.fixture
+def node(make_app, monkeypatch):
+    """A node with two clients in a channel; background tasks and sleeps do nothing"""
+    app = make_app(DRAIN_SPREAD_SECONDS=0, DRAIN_CLIENT_GRACE_SECONDS=0)
+    with app.app_context():
+        users = [add_user('first'), add_user('second')]
+        channel = add_channel('draining', users[0], users)
+        db.session.commit()
+        tokens = [create_access_token(identity=user.id) for user in users]
+        channel_id = channel.id
+    clients = []
+    for token in tokens:
+        client = socketio.test_client(app, auth={'token': token}, flask_test_client=app.test_client())
+        client.emit('join_channel', {'channel_id': channel_id})
+        client.get_received()
+        clients.append(client)
+
+    kills = []
+    monkeypatch.setattr(socketio, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(socketio, 'start_background_task', lambda f, *args: None)
+    monkeypatch.setattr(drain.os, 'kill', lambda pid, signum: kills.append(signum))
+    return app, clients, kills
+
+def test_api_drain_moves_clients_and_keeps_running(node):
+    app, clients, kills = node
+    assert drain.start(app, 'requested through /api/drain')
+
+    # New sockets are refused while draining
+    with app.app_context():
+        token = create_access_token(identity=1)
+    late = socketio.test_client(app, auth={'token': token}, flask_test_client=app.test_client())
+    assert not late.is_connected()
+
+    drain.run_drain(app)
+    for client in clients:
+        assert not client.is_connected()
+    assert not websocket_events.active_connections
+    with app.app_context():
+        assert OnlineUser.query.count() == 0
+
+    # Drained, still draining, and the process was left alone
+    assert drain.drain_state['finished'] and drain.draining()
+    assert kills == []
+
+def test_signal_drain_exits(node):
+    app, clients, kills = node
+    assert drain.start(app, 'received SIGTERM', exit_when_done=True)
+    drain.run_drain(app)
+    assert not websocket_events.active_connections
+    assert kills == [signal.SIGTERM]
+
+def test_signal_during_api_drain_exits(node):
+    app, clients, kills = node
+    drain.start(app, 'requested through /api/drain')
+    assert not drain.start(app, 'received SIGTERM', exit_when_done=True)
+    drain.run_drain(app)
+    assert kills == [signal.SIGTERM]
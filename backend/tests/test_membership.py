@@ -0,0 +1,80 @@
+"""member_count and the capacity check across joins, leaves and disconnects"""
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func, select
+from app import db, socketio, membership
+from app.models import Channel, user_channels
+from conftest import add_user, add_channel, auth_headers
+
+@pytest.fixture
+def small_channel(app):
+    """A channel for two, holding its owner, and two users outside it"""
+    with app.app_context():
+        owner = add_user('owner')
+        channel = add_channel('small', owner, [owner])
+        channel.max_users = 2
+        ids = {'channel': channel.id, 'first': add_user('first').id, 'second': add_user('second').id}
+        db.session.commit()
+    return ids
+
+def counts(app, channel_id):
+    """member_count and the number of membership rows"""
+    with app.app_context():
+        rows = db.session.scalar(select(func.count()).where(user_channels.c.channel_id == channel_id))
+        return db.session.get(Channel, channel_id).member_count, rows
+
+def post(app, ids, user, action):
+    response = app.test_client().post(f"/api/channels/{ids['channel']}/{action}",
+                                      headers=auth_headers(app, ids[user]))
+    return response.status_code, response.get_json()
+
+def test_capacity_follows_joins_and_leaves(app, small_channel):
+    ids = small_channel
+    assert post(app, ids, 'first', 'join')[0] == 200
+    assert counts(app, ids['channel']) == (2, 2)
+
+    # Full, and neither a refused nor a repeated join changes the count
+    assert post(app, ids, 'second', 'join') == (409, {'error': 'Channel is full'})
+    assert post(app, ids, 'first', 'join')[1]['message'] == 'Already a member of this channel'
+    assert counts(app, ids['channel']) == (2, 2)
+
+    assert post(app, ids, 'first', 'leave')[0] == 200
+    assert post(app, ids, 'first', 'leave')[1]['message'] == 'Not a member of this channel'
+    assert counts(app, ids['channel']) == (1, 1)
+
+    assert post(app, ids, 'second', 'join')[0] == 200
+    assert counts(app, ids['channel']) == (2, 2)
+
+def test_socket_sessions_do_not_change_membership(app, small_channel):
+    ids = small_channel
+    post(app, ids, 'first', 'join')
+    with app.app_context():
+        token = create_access_token(identity=ids['first'])
+
+    client = socketio.test_client(app, auth={'token': token}, flask_test_client=app.test_client())
+    client.emit('join_channel', {'channel_id': ids['channel']})
+    assert 'channel_state' in [packet['name'] for packet in client.get_received()]
+    client.emit('leave_channel', {})
+    client.emit('join_channel', {'channel_id': ids['channel']})
+    client.disconnect()
+    assert counts(app, ids['channel']) == (2, 2)
+    assert post(app, ids, 'second', 'join')[0] == 409
+
+    # A user who left the channel can no longer join it over the socket
+    post(app, ids, 'first', 'leave')
+    client = socketio.test_client(app, auth={'token': token}, flask_test_client=app.test_client())
+    client.get_received()
+    client.emit('join_channel', {'channel_id': ids['channel']})
+    assert 'channel_state' not in [packet['name'] for packet in client.get_received()]
+    client.disconnect()
+    assert counts(app, ids['channel']) == (1, 1)
+
+def test_recount_agrees(app, small_channel):
+    ids = small_channel
+    post(app, ids, 'first', 'join')
+    with app.app_context():
+        db.session.get(Channel, ids['channel']).member_count = 7
+        db.session.commit()
+        assert membership.recount(ids['channel']) == 1
+        db.session.commit()
+    assert counts(app, ids['channel']) == (2, 2)
@@ -0,0 +1,51 @@
+"""Audio metering of relayed frames"""
+import base64
+import struct
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db, socketio, metering
+from app.models import ActivityLog
+from conftest import add_user, add_channel
+
+# 20 ms of a constant level at 16 kHz, 16-bit little-endian
+PCM_FRAME = base64.b64encode(struct.pack('<320h', *([8192] * 320))).decode('ascii')
+
+@pytest.fixture
+def speaker(app):
+    with app.app_context():
+        user = add_user('speaker')
+        channel = add_channel('metered', user, [user])
+        db.session.commit()
+        token = create_access_token(identity=user.id)
+        channel_id = channel.id
+    client = socketio.test_client(app, auth={'token': token}, flask_test_client=app.test_client())
+    client.emit('join_channel', {'channel_id': channel_id})
+    yield client
+    metering.meters.clear()
+
+def transmit(app, client, frame):
+    """Send one transmission of three frames, returning its audio_quality stats"""
+    client.emit('start_speaking')
+    for _ in range(3):
+        client.emit('audio_data', frame)
+    client.emit('stop_speaking')
+    # Leaving writes out the stop held back by the speaking debounce
+    client.emit('leave_channel', {})
+    with app.app_context():
+        log = ActivityLog.query.filter_by(action='speak_end').one()
+        return log.extra_data['audio_quality']
+
+def test_pcm_frames_are_metered(app, speaker):
+    stats = transmit(app, speaker, {'audio': PCM_FRAME, 'format': 'pcm'})
+    assert stats['format'] == 'pcm'
+    assert stats['frames'] == 3
+    assert stats['rms_dbfs'] == pytest.approx(-12.04, abs=0.01)
+    assert stats['clipping_ratio'] == 0
+
+def test_frames_without_format_use_configured_format(app, speaker):
+    # The same bytes, sent without a format, are Opus under the default config
+    assert app.config['AUDIO_FORMAT'] == 'opus'
+    stats = transmit(app, speaker, {'audio': PCM_FRAME})
+    assert stats['format'] == 'opus'
+    assert stats['frames'] == 3
+    assert 'rms_dbfs' not in stats
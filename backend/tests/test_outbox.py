@@ -0,0 +1,72 @@
+"""Batched Redis publishes and registrations"""
+import pytest
+from app import socketio, outbox
+
+@pytest.fixture
+def batching(make_app, redis_client, monkeypatch):
+    """App with a five-item queue whose flusher is run by the test"""
+    app = make_app(REDIS_BATCH_QUEUE_LIMIT=5)
+    monkeypatch.setattr(socketio, 'start_background_task', lambda f, *args: None)
+    yield app, redis_client
+    outbox.queue.clear()
+    outbox._flusher['running'] = False
+
+def queued():
+    return [(method, args) for method, args, _ in outbox.queue]
+
+def test_full_queue_drops_oldest_publish(batching):
+    app, _ = batching
+    outbox.command(app, 'sadd', 'nodes', 'a')
+    for i in range(4):
+        outbox.publish(app, 'inbox', f"frame {i}")
+    outbox.publish(app, 'inbox', 'frame 4')
+
+    assert queued() == [('sadd', ('nodes', 'a'))] + \
+        [('publish', ('inbox', f"frame {i}")) for i in range(1, 5)]
+
+def test_registrations_are_never_dropped(batching):
+    app, _ = batching
+    for i in range(5):
+        outbox.command(app, 'sadd', 'nodes', str(i))
+    outbox.publish(app, 'inbox', 'frame')
+    outbox.command(app, 'sadd', 'nodes', 'late')
+
+    assert [args[1] for _, args in queued()] == ['0', '1', '2', '3', '4', 'late']
+
+def test_flush_sends_in_order(batching):
+    app, redis_client = batching
+    outbox.command(app, 'rpush', 'log', 'first')
+    outbox.publish(app, 'inbox', 'frame')
+    outbox.command(app, 'rpush', 'log', 'second')
+
+    assert outbox.flush(app, max_items=2)
+    assert queued() == [('rpush', ('log', 'second'))]
+    assert outbox.flush(app)
+    assert not outbox.queue
+    assert redis_client.lrange('log', 0, -1) == [b'first', b'second']
+
+def test_failed_batch_requeues_registrations(batching, monkeypatch):
+    app, redis_client = batching
+    outbox.command(app, 'sadd', 'nodes', 'a')
+    outbox.publish(app, 'inbox', 'frame')
+    outbox.command(app, 'sadd', 'nodes', 'b')
+    outbox.publish(app, 'inbox', 'late frame')
+
+    class BrokenPipeline:
+        def __getattr__(self, name):
+            return lambda *args: None
+
+        def execute(self):
+            raise ConnectionError('Redis restarted')
+
+    pipeline = redis_client.pipeline
+    monkeypatch.setattr(redis_client, 'pipeline', lambda transaction: BrokenPipeline())
+    assert not outbox.flush(app, max_items=3)
+    # Its registrations go back ahead of what was not in the batch
+    assert queued() == [('sadd', ('nodes', 'a')), ('sadd', ('nodes', 'b')),
+                        ('publish', ('inbox', 'late frame'))]
+
+    # Redis is back
+    monkeypatch.setattr(redis_client, 'pipeline', pipeline)
+    assert outbox.flush(app)
+    assert redis_client.smembers('nodes') == {b'a', b'b'}
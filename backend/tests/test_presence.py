@@ -0,0 +1,82 @@
+"""Node heartbeats and presence expiry"""
+from datetime import datetime, timedelta
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db, socketio, presence, ratelimit, scan
+from app import websocket_events
+from app.models import OnlineUser
+from conftest import add_user, add_channel
+
+class StopLoop(BaseException):
+    """Ends a background loop at its first sleep"""
+
+@pytest.fixture
+def stop_at_sleep(monkeypatch):
+    """Run background loops until their first sleep, recording the delays"""
+    delays = []
+
+    def sleep(seconds):
+        delays.append(seconds)
+        raise StopLoop()
+
+    monkeypatch.setattr(socketio, 'sleep', sleep)
+    monkeypatch.setattr(socketio, 'start_background_task', lambda f, *args: None)
+    return delays
+
+def own_row(app):
+    with app.app_context():
+        user = add_user('online')
+        db.session.add(OnlineUser(user_id=user.id, socket_id='session-1',
+                                  instance_id=app.config['INSTANCE_ID']))
+        db.session.commit()
+
+@pytest.mark.parametrize('interval', [0, 30])
+def test_new_node_is_alive_before_its_first_reap(app, redis_client, stop_at_sleep, interval):
+    app.config['PRESENCE_REAPER_INTERVAL'] = interval
+    presence.start_reaper(app)
+    own_row(app)
+
+    with app.app_context():
+        assert presence.find_dead_instances('peer') == []
+
+def test_node_without_heartbeat_is_dead(app, redis_client):
+    own_row(app)
+    with app.app_context():
+        assert presence.find_dead_instances('peer') == [app.config['INSTANCE_ID']]
+
+@pytest.mark.parametrize('interval', [0, 30])
+def test_reaper_loop_beats_before_sleeping(app, redis_client, stop_at_sleep, interval):
+    app.config['PRESENCE_REAPER_INTERVAL'] = interval
+    with pytest.raises(StopLoop):
+        presence.run_reaper(app)
+
+    assert redis_client.exists(presence.instance_key(app.config['INSTANCE_ID']))
+    # Refreshed well within its expiry even with the reaper disabled
+    assert stop_at_sleep == [min(interval or 30, app.config['PRESENCE_TIMEOUT_SECONDS'] / 3)]
+
+def test_reaped_socket_state_is_released(app):
+    with app.app_context():
+        user = add_user('silent')
+        joined, scanned = (add_channel(name, user, [user]) for name in ('joined', 'scanned'))
+        db.session.commit()
+        token = create_access_token(identity=user.id)
+        joined_id, scanned_id = joined.id, scanned.id
+
+    client = socketio.test_client(app, auth={'token': token}, flask_test_client=app.test_client())
+    client.emit('join_channel', {'channel_id': joined_id})
+    client.emit('start_scan', {'channels': [{'channel_id': scanned_id, 'priority': 1}]})
+    client.emit('start_speaking')
+    client.emit('audio_data', {'audio': 'AAAA', 'format': 'pcm'})
+    [(socket_id, connection)] = websocket_events.active_connections.items()
+    assert socket_id in ratelimit.audio_limiters and socket_id in scan.scanners
+
+    # Heartbeats stopped long ago
+    connection['last_heartbeat'] = datetime.utcnow() - timedelta(hours=1)
+    with app.app_context():
+        assert presence.reap_dead_connections(datetime.utcnow() - timedelta(minutes=1)) == 1
+        assert OnlineUser.query.count() == 0
+
+    assert not websocket_events.active_connections
+    assert socket_id not in ratelimit.audio_limiters
+    assert socket_id not in scan.scanners
+    assert scanned_id not in scan.channel_scanners
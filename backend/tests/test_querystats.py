@@ -0,0 +1,81 @@
+"""Query budgets of the presence-heavy handlers.
+
+The testing config sets DB_QUERY_BUDGET_STRICT, so a handler going over
+its budget raises QueryBudgetExceeded here. Each handler is also run
+against a channel with nobody online and one with ONLINE users online:
+the query count must not depend on how many people are in the channel.
+"""
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db, socketio, querystats
+from app.models import OnlineUser
+from app.querystats import QueryBudgetExceeded
+from conftest import add_user, add_channel, auth_headers
+
+ONLINE = 25
+
+@pytest.fixture
+def channels(app):
+    """Channel ids by online count, all with the same members"""
+    with app.app_context():
+        owner = add_user('owner')
+        members = [add_user(f"member{i}") for i in range(ONLINE)]
+        ids = {}
+        for online in (0, ONLINE):
+            channel = add_channel(f"online-{online}", owner, [owner] + members)
+            for member in members[:online]:
+                db.session.add(OnlineUser(user_id=member.id, channel_id=channel.id,
+                                          socket_id=f"{channel.id}-{member.id}"))
+            ids[online] = channel.id
+        db.session.commit()
+        app.config['TEST_OWNER_ID'] = owner.id
+    return ids
+
+def count_queries(action):
+    start = querystats.snapshot()
+    result = action()
+    return querystats.since(start)[0], result
+
+def join(app, channel_id):
+    """Queries run by join_channel and the channel_state it sent"""
+    with app.app_context():
+        token = create_access_token(identity=app.config['TEST_OWNER_ID'])
+    client = socketio.test_client(app, auth={'token': token}, flask_test_client=app.test_client())
+    assert client.is_connected()
+    client.get_received()
+    try:
+        queries, _ = count_queries(lambda: client.emit('join_channel', {'channel_id': channel_id}))
+        received = client.get_received()
+    finally:
+        client.disconnect()
+    states = [packet['args'][0] for packet in received if packet['name'] == 'channel_state']
+    assert states, [packet['name'] for packet in received]
+    return queries, states[0]
+
+def test_join_channel_queries_do_not_grow_with_presence(app, channels):
+    empty_queries, empty_state = join(app, channels[0])
+    busy_queries, busy_state = join(app, channels[ONLINE])
+
+    assert len(empty_state['online_users']) == 1
+    assert len(busy_state['online_users']) == ONLINE + 1
+    assert busy_queries == empty_queries <= 8
+
+def test_get_channel_queries_do_not_grow_with_presence(app, channels):
+    client = app.test_client()
+    headers = auth_headers(app, app.config['TEST_OWNER_ID'])
+
+    counts = {}
+    for online, channel_id in channels.items():
+        counts[online], response = count_queries(
+            lambda: client.get(f"/api/channels/{channel_id}", headers=headers))
+        assert response.status_code == 200
+        assert len(response.get_json()['channel']['online_users']) == online
+
+    assert counts[ONLINE] == counts[0] <= 4
+
+def test_budget_is_enforced_in_strict_mode(app, channels, monkeypatch):
+    # One query is less than any view needs
+    monkeypatch.setitem(app.config, 'DB_QUERY_BUDGET', 1)
+    with pytest.raises(QueryBudgetExceeded):
+        app.test_client().get(f"/api/channels/{channels[0]}",
+                              headers=auth_headers(app, app.config['TEST_OWNER_ID']))
@@ -0,0 +1,68 @@
+"""Token buckets shaping the audio each socket may relay"""
+import pytest
+from app import ratelimit
+
+CONFIG = {
+    'AUDIO_MAX_FRAME_BYTES': 1000,
+    'AUDIO_MAX_FRAMES_PER_SEC': 10,
+    'AUDIO_MAX_BYTES_PER_SEC': 2000,
+    'AUDIO_RATE_BURST_SECONDS': 2,
+}
+
+# 300 bytes once decoded
+FRAME = 'A' * 400
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand"""
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'monotonic', lambda: now[0])
+    yield now
+    ratelimit.audio_limiters.clear()
+
+def send(count, frame=FRAME, socket_id='sid'):
+    return [ratelimit.check_audio(socket_id, frame, CONFIG) for _ in range(count)]
+
+def test_burst_then_reject(clock):
+    # A full bucket holds two seconds of frames
+    assert send(20, frame='AAAA') == [None] * 20
+    assert send(3, frame='AAAA') == ['new', 'rate', 'rate']
+
+def test_byte_bucket_limits_large_frames(clock):
+    # 4000 bytes of burst hold 13 frames of 300 bytes
+    assert send(14)[-2:] == [None, 'new']
+
+def test_refill_over_time(clock):
+    send(20, frame='AAAA')
+    clock[0] += 0.5
+    # Half a second at 10 frames per second
+    assert send(6, frame='AAAA') == [None] * 5 + ['new']
+    # Refill stops at the burst size
+    clock[0] += 60
+    assert send(21, frame='AAAA').count(None) == 20
+
+def test_new_episode_after_a_quiet_second(clock):
+    send(21, frame='AAAA')
+    clock[0] += 0.05
+    assert send(1, frame='AAAA') == ['rate']
+    clock[0] += 1.5
+    send(15, frame='AAAA')
+    assert send(1, frame='AAAA') == ['new']
+
+def test_invalid_and_oversized_frames(clock):
+    assert send(1, frame={'not': 'audio'}) == ['invalid']
+    assert send(1, frame='A' * 1400) == ['too_large']
+    assert send(1, frame=b'\0' * 1001) == ['too_large']
+    # Neither uses up the socket's buckets
+    assert send(20, frame='AAAA') == [None] * 20
+
+def test_sockets_have_their_own_buckets(clock):
+    send(21, frame='AAAA')
+    assert send(1, frame='AAAA', socket_id='other') == [None]
+
+def test_release_frees_buckets(clock):
+    send(21, frame='AAAA')
+    ratelimit.release('sid')
+    assert 'sid' not in ratelimit.audio_limiters
+    assert send(1, frame='AAAA') == [None]
+    ratelimit.release('unknown')
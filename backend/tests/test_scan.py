@@ -0,0 +1,64 @@
+"""Scan subscriptions across a resumed session"""
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db, socketio, membership, scan
+from conftest import add_user, add_channel
+
+@pytest.fixture
+def scanning(make_app):
+    """A scanner joined to one channel and scanning two others"""
+    app = make_app(SESSION_RESUME_GRACE_SECONDS=30)
+    with app.app_context():
+        user = add_user('scanner')
+        joined, high, low = (add_channel(name, user, [user]) for name in ('joined', 'high', 'low'))
+        db.session.commit()
+        token = create_access_token(identity=user.id)
+        ids = {'user': user.id, 'joined': joined.id, 'high': high.id, 'low': low.id}
+
+    client = socketio.test_client(app, auth={'token': token}, flask_test_client=app.test_client())
+    client.emit('join_channel', {'channel_id': ids['joined']})
+    client.emit('start_scan', {'channels': [{'channel_id': ids['high'], 'priority': 5},
+                                            {'channel_id': ids['low'], 'priority': 1}]})
+    resume_token = client.get_received()[0]['args'][0]['resume_token']
+    client.disconnect()
+    assert not scan.scanners
+    yield app, token, resume_token, ids
+    scan.scanners.clear()
+    scan.channel_scanners.clear()
+
+def resume(app, token, resume_token):
+    client = socketio.test_client(app, auth={'token': token, 'resume_token': resume_token},
+                                  flask_test_client=app.test_client())
+    received = {packet['name']: packet['args'][0] for packet in client.get_received()}
+    assert received['connected']['resumed']
+    return received
+
+def test_resume_restores_scan(scanning):
+    app, token, resume_token, ids = scanning
+    received = resume(app, token, resume_token)
+
+    assert received['scan_started']['resumed']
+    assert {entry['channel_id']: entry['priority'] for entry in received['scan_started']['channels']} \
+        == {ids['high']: 5, ids['low']: 1}
+    assert len(scan.scanners) == 1
+
+def test_resume_drops_channels_left_during_grace(scanning):
+    app, token, resume_token, ids = scanning
+    with app.app_context():
+        membership.remove_member(ids['low'], ids['user'])
+        db.session.commit()
+
+    received = resume(app, token, resume_token)
+    assert [entry['channel_id'] for entry in received['scan_started']['channels']] == [ids['high']]
+
+def test_resume_reports_scan_ended(scanning):
+    app, token, resume_token, ids = scanning
+    with app.app_context():
+        for channel_id in (ids['high'], ids['low']):
+            membership.remove_member(channel_id, ids['user'])
+        db.session.commit()
+
+    received = resume(app, token, resume_token)
+    assert 'scan_started' not in received
+    assert sorted(received['scan_stopped']['channel_ids']) == sorted([ids['high'], ids['low']])
+    assert not scan.scanners
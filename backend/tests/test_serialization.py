@@ -0,0 +1,93 @@
+"""Model serializers against the hand-written to_dict methods they replaced"""
+from datetime import datetime
+import pytest
+from app import db, serialization
+from app.models import User, Channel, ActivityLog, OnlineUser
+from conftest import add_user, add_channel
+
+# The original to_dict bodies, before model_serializer
+def user_dict(self):
+    return {
+        'id': self.id,
+        'username': self.username,
+        'email': self.email,
+        'is_admin': self.is_admin,
+        'is_active': self.is_active,
+        'created_at': self.created_at.isoformat(),
+        'last_seen': self.last_seen.isoformat() if self.last_seen else None
+    }
+
+def channel_dict(self):
+    return {
+        'id': self.id,
+        'name': self.name,
+        'description': self.description,
+        'is_active': self.is_active,
+        'max_users': self.max_users,
+        'created_by': self.created_by,
+        'created_at': self.created_at.isoformat(),
+        'member_count': len(self.members)
+    }
+
+def activity_dict(self):
+    return {
+        'id': self.id,
+        'user_id': self.user_id,
+        'channel_id': self.channel_id,
+        'action': self.action,
+        'duration': self.duration,
+        'timestamp': self.timestamp.isoformat(),
+        'extra_data': self.extra_data
+    }
+
+def online_dict(self):
+    return {
+        'id': self.id,
+        'user_id': self.user_id,
+        'channel_id': self.channel_id,
+        'socket_id': self.socket_id,
+        'is_speaking': self.is_speaking,
+        'joined_at': self.joined_at.isoformat(),
+        'last_activity': self.last_activity.isoformat(),
+        'user': user_dict(self.user) if self.user else None
+    }
+
+# Fields added to the responses since
+ADDED = {Channel: {'audio_bitrate', 'coalesce_ms', 'channel_type'}}
+
+@pytest.fixture
+def rows(app):
+    with app.app_context():
+        owner = add_user('owner')
+        owner.email = 'owner@example.com'
+        owner.last_seen = None
+        channel = add_channel('serialized', owner, [owner, add_user('member')])
+        channel.description = 'Described'
+        db.session.add(ActivityLog(user_id=owner.id, channel_id=channel.id, action='speak_end',
+                                   duration=1.5, extra_data={'audio_quality': {'frames': 3}}))
+        db.session.add(OnlineUser(user_id=owner.id, channel_id=channel.id, socket_id='sid'))
+        db.session.commit()
+        yield [(owner, user_dict), (channel, channel_dict),
+               (ActivityLog.query.one(), activity_dict), (OnlineUser.query.one(), online_dict)]
+
+def test_to_dict_matches_original(rows):
+    for row, original in rows:
+        data = row.to_dict()
+        assert set(data) == set(original(row)) | ADDED.get(type(row), set())
+        assert {key: data[key] for key in original(row)} == original(row)
+
+def test_epoch_ms_timestamps(app, rows, monkeypatch):
+    monkeypatch.setitem(app.config, 'JSON_TIMESTAMPS', 'epoch_ms')
+    serialization.configure(app)
+    try:
+        user = rows[0][0]
+        user.created_at = datetime(2024, 1, 2, 3, 4, 5, 6000)
+        assert user.to_dict()['created_at'] == 1704164645006
+        assert user.to_dict()['last_seen'] is None
+    finally:
+        monkeypatch.undo()
+        serialization.configure(app)
+
+def test_single_field_serializer():
+    to_dict = serialization.model_serializer(('created_at',), timestamps=('created_at',))
+    assert to_dict(User(created_at=datetime(2024, 1, 2))) == {'created_at': '2024-01-02T00:00:00'}
@@ -0,0 +1,93 @@
+"""Sessions held after a dropped socket: resume, expiry and speakers"""
+from datetime import datetime, timedelta
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db, socketio, websocket_events
+from app.models import User, OnlineUser, ActivityLog
+from conftest import add_user, add_channel
+
+@pytest.fixture
+def session_app(make_app):
+    """App with a channel, a talker and a listener, both tokens issued"""
+    app = make_app(SESSION_RESUME_GRACE_SECONDS=30, SPEAKING_BROADCAST_INTERVAL_MS=0)
+    with app.app_context():
+        talker, listener = add_user('talker'), add_user('listener')
+        channel = add_channel('held', talker, [talker, listener])
+        db.session.commit()
+        app.config['TEST_IDS'] = {'talker': talker.id, 'channel': channel.id}
+        app.config['TEST_TOKENS'] = {'talker': create_access_token(identity=talker.id),
+                                     'listener': create_access_token(identity=listener.id)}
+    return app
+
+def connect(app, name, **auth):
+    client = socketio.test_client(app, auth=dict(auth, token=app.config['TEST_TOKENS'][name]),
+                                  flask_test_client=app.test_client())
+    if not client.is_connected():
+        return client, {}
+    return client, {packet['name']: packet['args'][0] for packet in client.get_received()}
+
+def joined(app, name):
+    """A client joined to the channel, and its resume token"""
+    client, received = connect(app, name)
+    client.emit('join_channel', {'channel_id': app.config['TEST_IDS']['channel']})
+    client.get_received()
+    return client, received['connected']['resume_token']
+
+def online_row(app):
+    with app.app_context():
+        return OnlineUser.query.filter_by(user_id=app.config['TEST_IDS']['talker']).one_or_none()
+
+def test_resume_reattaches_held_session(session_app):
+    client, resume_token = joined(session_app, 'talker')
+    client.disconnect()
+    assert resume_token in websocket_events.resumable_sessions
+    assert online_row(session_app) is not None
+
+    _, received = connect(session_app, 'talker', resume_token=resume_token)
+    assert received['connected']['resumed']
+    assert received['connected']['channel_id'] == session_app.config['TEST_IDS']['channel']
+    assert not websocket_events.resumable_sessions
+
+def test_held_session_ends_after_grace(session_app, monkeypatch):
+    client, resume_token = joined(session_app, 'talker')
+    client.disconnect()
+    websocket_events.resumable_sessions[resume_token]['suspended_until'] = \
+        datetime.utcnow() - timedelta(seconds=1)
+
+    monkeypatch.setattr(socketio, 'sleep', lambda seconds: None)
+    websocket_events.expire_session(session_app, resume_token, 30)
+
+    assert not websocket_events.resumable_sessions
+    assert online_row(session_app) is None
+    _, received = connect(session_app, 'talker', resume_token=resume_token)
+    assert not received['connected']['resumed']
+
+def test_dropped_speaker_releases_floor(session_app):
+    listener, _ = joined(session_app, 'listener')
+    talker, resume_token = joined(session_app, 'talker')
+    talker.emit('start_speaking')
+    talker.disconnect()
+
+    speaking = [packet['args'][0]['is_speaking'] for packet in listener.get_received()
+                if packet['name'] == 'user_speaking']
+    assert speaking == [True, False]
+    assert online_row(session_app).is_speaking is False
+    with session_app.app_context():
+        assert ActivityLog.query.filter_by(action='speak_end').count() == 1
+
+    _, received = connect(session_app, 'talker', resume_token=resume_token)
+    assert received['connected']['resumed']
+    assert received['connected']['is_speaking'] is False
+
+def test_resume_rejected_for_deactivated_user(session_app):
+    client, resume_token = joined(session_app, 'talker')
+    client.disconnect()
+    with session_app.app_context():
+        db.session.get(User, session_app.config['TEST_IDS']['talker']).is_active = False
+        db.session.commit()
+
+    client, received = connect(session_app, 'talker', resume_token=resume_token)
+    assert 'connected' not in received
+    assert not client.is_connected()
+    assert not websocket_events.resumable_sessions
+    assert online_row(session_app) is None
@@ -0,0 +1,116 @@
+"""Debounced stops and rate-limited speaking broadcasts"""
+from datetime import datetime, timedelta
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db, socketio, speaking, websocket_events
+from app.models import ActivityLog, OnlineUser
+from conftest import add_user, add_channel
+
+class Clock(datetime):
+    """datetime whose utcnow the test sets"""
+    now = datetime(2024, 1, 1)
+
+    @classmethod
+    def utcnow(cls):
+        return cls.now
+
+@pytest.fixture
+def tasks(monkeypatch):
+    """Background tasks started by the handlers, run when the test says so"""
+    started = []
+    monkeypatch.setattr(socketio, 'start_background_task', lambda f, *args: started.append((f, args)))
+    monkeypatch.setattr(socketio, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(websocket_events, 'datetime', Clock)
+    monkeypatch.setattr(speaking, 'datetime', Clock)
+    return started
+
+def run(tasks):
+    while tasks:
+        task, args = tasks.pop(0)
+        task(*args)
+
+def channel_pair(app):
+    """A talker and a listener joined to one channel"""
+    with app.app_context():
+        talker, listener = add_user('talker'), add_user('listener')
+        channel = add_channel('talk', talker, [talker, listener])
+        db.session.commit()
+        tokens = [create_access_token(identity=user.id) for user in (talker, listener)]
+        channel_id = channel.id
+    clients = []
+    for token in tokens:
+        client = socketio.test_client(app, auth={'token': token}, flask_test_client=app.test_client())
+        client.emit('join_channel', {'channel_id': channel_id})
+        clients.append(client)
+    clients[1].get_received()
+    return clients
+
+def heard(listener):
+    return [packet['args'][0]['is_speaking'] for packet in listener.get_received()
+            if packet['name'] == 'user_speaking']
+
+def at(seconds):
+    Clock.now = datetime(2024, 1, 1) + timedelta(seconds=seconds)
+
+def test_rapid_restarts_merge_into_one_transmission(make_app, tasks):
+    app = make_app(SPEAK_DEBOUNCE_MS=300, SPEAKING_BROADCAST_INTERVAL_MS=0)
+    talker, listener = channel_pair(app)
+
+    at(0)
+    talker.emit('start_speaking')
+    for start in (1, 2):
+        at(start)
+        talker.emit('stop_speaking')
+        # Back on air inside the debounce window
+        at(start + 0.1)
+        talker.emit('start_speaking')
+    at(3)
+    talker.emit('stop_speaking')
+    assert heard(listener) == [True]
+
+    at(3.3)
+    run(tasks)
+    assert heard(listener) == [False]
+    with app.app_context():
+        actions = [log.action for log in ActivityLog.query.order_by(ActivityLog.id)]
+        assert actions.count('speak_start') == 1
+        end = ActivityLog.query.filter_by(action='speak_end').one()
+        # From the first start to the final stop
+        assert end.duration == pytest.approx(3.0)
+        assert OnlineUser.query.filter_by(is_speaking=True).count() == 0
+
+def test_stop_after_window_is_a_new_transmission(make_app, tasks):
+    app = make_app(SPEAK_DEBOUNCE_MS=300, SPEAKING_BROADCAST_INTERVAL_MS=0)
+    talker, listener = channel_pair(app)
+
+    at(0)
+    talker.emit('start_speaking')
+    at(1)
+    talker.emit('stop_speaking')
+    run(tasks)
+    at(2)
+    talker.emit('start_speaking')
+    at(2.5)
+    talker.emit('stop_speaking')
+    run(tasks)
+
+    assert heard(listener) == [True, False, True, False]
+    with app.app_context():
+        durations = [log.duration for log in ActivityLog.query.filter_by(action='speak_end')
+                     .order_by(ActivityLog.id)]
+        assert durations == [pytest.approx(1.0), pytest.approx(0.5)]
+
+def test_reversed_changes_inside_interval_are_not_broadcast(make_app, tasks):
+    app = make_app(SPEAK_DEBOUNCE_MS=0, SPEAKING_BROADCAST_INTERVAL_MS=10000)
+    talker, listener = channel_pair(app)
+
+    talker.emit('start_speaking')
+    for _ in range(3):
+        talker.emit('stop_speaking')
+        talker.emit('start_speaking')
+    talker.emit('stop_speaking')
+    assert heard(listener) == [True]
+
+    # The held changes are sent together at the end of the interval
+    run(tasks)
+    assert heard(listener) == [False]
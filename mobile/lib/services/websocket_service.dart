@@ -1,3 +1,4 @@
+import 'dart:async';
 import 'dart:convert';
 import 'dart:typed_data';
 import 'package:flutter/foundation.dart';
@@ -12,10 +13,14 @@ class WebSocketService extends ChangeNotifier {
   final Logger _logger = Logger();
   
   IO.Socket? _socket;
+  String? _accessToken;
+  String? _resumeToken;
   bool _isConnected = false;
   Channel? _currentChannel;
   List<OnlineUser> _onlineUsers = [];
   Map<int, bool> _speakingUsers = {};
+  Timer? _drainTimer;
+  int? _rejoinChannelId;
 
   // Getters
   bool get isConnected => _isConnected;
@@ -35,6 +40,8 @@ class WebSocketService extends ChangeNotifier {
       return;
     }
 
+    _accessToken = accessToken;
+
     try {
       _socket = IO.io(
         Constants.websocketUrl,
@@ -58,12 +65,16 @@ class WebSocketService extends ChangeNotifier {
 
   // Disconnect from WebSocket
   void disconnect() {
+    _drainTimer?.cancel();
+    _drainTimer = null;
+    _rejoinChannelId = null;
     if (_socket != null) {
       _socket!.disconnect();
       _socket!.dispose();
       _socket = null;
     }
     
+    _resumeToken = null;
     _isConnected = false;
     _currentChannel = null;
     _onlineUsers.clear();
@@ -85,18 +96,45 @@ class WebSocketService extends ChangeNotifier {
     });
 
     _socket!.onDisconnect((_) {
+      // Channel state is kept: the server holds the session for a grace
+      // window and restores it when we reconnect with the resume token
       _isConnected = false;
-      _currentChannel = null;
-      _onlineUsers.clear();
-      _speakingUsers.clear();
       notifyListeners();
       _logger.i('Disconnected from WebSocket');
       onInfo?.call('Disconnected from server');
     });
 
     _socket!.on('connected', (data) {
+      _resumeToken = data['resume_token'];
+      _socket!.auth = {'token': _accessToken, 'resume_token': _resumeToken};
+
+      if (data['resumed'] == true) {
+        _logger.i('WebSocket session resumed');
+        return;
+      }
+
+      // A fresh session means any previous channel state is gone
+      _currentChannel = null;
+      _onlineUsers.clear();
+      _speakingUsers.clear();
+      notifyListeners();
       _logger.i('WebSocket authentication successful');
       onInfo?.call('Authentication successful');
+
+      // Back on another node after a drain: rejoin the channel we were in
+      final rejoinChannelId = _rejoinChannelId;
+      _rejoinChannelId = null;
+      if (rejoinChannelId != null) {
+        joinChannel(rejoinChannelId);
+      }
+    });
+
+    _socket!.on('server_draining', (data) {
+      // The node is shutting down; move at our own time so clients spread out
+      final delay = Duration(milliseconds: data['reconnect_in_ms'] ?? 0);
+      _rejoinChannelId = _currentChannel?.id;
+      _logger.i('Server draining, reconnecting in ${delay.inMilliseconds} ms');
+      _scheduleReconnect(delay);
     });
 
     _socket!.on('error', (data) {
@@ -126,11 +164,31 @@ class WebSocketService extends ChangeNotifier {
     });
 
     _socket!.onConnectError((error) {
+      // A draining node refuses us with a hint of when to try again
+      final data = error is Map ? error['data'] : null;
+      if (data is Map && data['draining'] == true) {
+        _logger.i('Server draining, retrying in ${data['retry_after_ms']} ms');
+        _scheduleReconnect(Duration(milliseconds: data['retry_after_ms'] ?? 0));
+        return;
+      }
       _logger.e('WebSocket connection error: $error');
       onError?.call('Connection failed');
     });
   }
 
+  // Reconnect after a delay, through the load balancer to a live node
+  void _scheduleReconnect(Duration delay) {
+    _drainTimer?.cancel();
+    _drainTimer = Timer(delay, () {
+      _drainTimer = null;
+      if (_socket == null) return;
+      // The resume token is only valid on the node being drained
+      _socket!.disconnect();
+      _socket!.auth = {'token': _accessToken};
+      _socket!.connect();
+    });
+  }
+
   // Join a channel
   void joinChannel(int channelId) {
     if (!_isConnected || _socket == null) {
@@ -182,8 +240,10 @@ class WebSocketService extends ChangeNotifier {
     // Convert audio data to base64 for transmission
     final base64Audio = base64Encode(audioData);
     
+    // The recorder produces 16-bit PCM (see AudioService)
     _socket!.emit('audio_data', {
       'audio': base64Audio,
+      'format': 'pcm',
     });
   }
 
@@ -13,12 +13,14 @@ export const useWebSocket = () => {
 };
 
 export const WebSocketProvider = ({ children }) => {
-  const { accessToken, isAuthenticated } = useAuth();
+  const { accessToken, isAuthenticated, user } = useAuth();
   const [isConnected, setIsConnected] = useState(false);
   const [onlineUsers, setOnlineUsers] = useState([]);
   const [activeChannels, setActiveChannels] = useState([]);
   const [speakingUsers, setSpeakingUsers] = useState({});
+  const [adminStats, setAdminStats] = useState(null);
   const socketRef = useRef(null);
+  const adminSocketRef = useRef(null);
 
   // Connect to WebSocket
   useEffect(() => {
@@ -122,6 +124,39 @@ export const WebSocketProvider = ({ children }) => {
     };
   }, [isAuthenticated, accessToken]);
 
+  // Subscribe admins to the shared live stats feed
+  useEffect(() => {
+    if (!isAuthenticated || !accessToken || !user?.is_admin) {
+      return undefined;
+    }
+
+    const adminUrl = process.env.NODE_ENV === 'production'
+      ? 'wss://yourdomain.com/admin'
+      : 'ws://localhost:5000/admin';
+
+    const adminSocket = io(adminUrl, {
+      auth: {
+        token: accessToken,
+      },
+      transports: ['websocket'],
+    });
+    adminSocketRef.current = adminSocket;
+
+    adminSocket.on('stats', (data) => {
+      setAdminStats(data);
+    });
+
+    adminSocket.on('connect_error', (error) => {
+      console.error('Admin stats connection error:', error);
+    });
+
+    return () => {
+      adminSocket.disconnect();
+      adminSocketRef.current = null;
+      setAdminStats(null);
+    };
+  }, [isAuthenticated, accessToken, user?.is_admin]);
+
   // Cleanup on unmount
   useEffect(() => {
     return () => {
@@ -136,6 +171,7 @@ export const WebSocketProvider = ({ children }) => {
     onlineUsers,
     activeChannels,
     speakingUsers,
+    adminStats,
     socket: socketRef.current,
   };
 
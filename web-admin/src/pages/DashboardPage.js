@@ -27,7 +27,7 @@ import { useWebSocket } from '../hooks/useWebSocket';
 import axios from 'axios';
 
 const DashboardPage = () => {
-  const { isConnected, onlineUsers, activeChannels, speakingUsers } = useWebSocket();
+  const { isConnected, onlineUsers, activeChannels, speakingUsers, adminStats } = useWebSocket();
   const [stats, setStats] = useState({
     totalUsers: 0,
     totalChannels: 0,
@@ -36,8 +36,27 @@ const DashboardPage = () => {
   });
   const [recentActivity, setRecentActivity] = useState([]);
 
-  // Fetch dashboard stats
+  // Use the stats pushed over the admin socket when subscribed
   useEffect(() => {
+    if (!adminStats) {
+      return;
+    }
+
+    setStats({
+      totalUsers: adminStats.total_users,
+      totalChannels: adminStats.total_channels,
+      activeUsers: adminStats.online_users,
+      speakingUsers: adminStats.active_speakers.length,
+    });
+    setRecentActivity(adminStats.recent_events);
+  }, [adminStats]);
+
+  // Without the live feed, fetch totals once from the REST API
+  useEffect(() => {
+    if (adminStats) {
+      return;
+    }
+
     const fetchStats = async () => {
       try {
         const [usersResponse, channelsResponse] = await Promise.all([
@@ -45,34 +64,32 @@ const DashboardPage = () => {
           axios.get('/api/channels'),
         ]);
 
-        const activeUsersCount = onlineUsers.length;
-        const speakingUsersCount = Object.values(speakingUsers).filter(Boolean).length;
-
-        setStats({
+        setStats(prev => ({
+          ...prev,
           totalUsers: usersResponse.data.total || 0,
           totalChannels: channelsResponse.data.total || 0,
-          activeUsers: activeUsersCount,
-          speakingUsers: speakingUsersCount,
-        });
+        }));
       } catch (error) {
         console.error('Failed to fetch stats:', error);
       }
     };
 
     fetchStats();
-    const interval = setInterval(fetchStats, 30000); // Refresh every 30 seconds
-
-    return () => clearInterval(interval);
-  }, [onlineUsers.length, speakingUsers]);
+  }, [adminStats]);
 
-  // Update speaking users count when it changes
+  // Update live counts from channel events when there is no live feed
   useEffect(() => {
+    if (adminStats) {
+      return;
+    }
+
     const speakingUsersCount = Object.values(speakingUsers).filter(Boolean).length;
     setStats(prev => ({
       ...prev,
+      activeUsers: onlineUsers.length,
       speakingUsers: speakingUsersCount,
     }));
-  }, [speakingUsers]);
+  }, [adminStats, onlineUsers.length, speakingUsers]);
 
   const StatCard = ({ title, value, icon, color = 'primary' }) => (
     <Card>